@@ -0,0 +1,301 @@
+"""
+Backups and migrations of ET_HOME as a single compressed archive of git bundles.
+
+Each child repo is bundled in a thread of its own, and bundles are streamed into
+the archive as they finish. A project's bundle only holds the commits made since
+its last export: the branch tips written to an archive are recorded in a marker
+file in the child's git dir, and excluded from the next bundle. Markers are only
+updated once the whole archive is written, so a failed export is simply redone.
+The chunks of large files in the store are archived the same way, by mtime.
+
+Importing applies every bundle to its child repo, creating it when missing,
+fast-forwards the checked out branch, moves or deletes the other branches to
+match the exporting machine and relinks the parent dir.
+
+Archive layout:
+    manifest.json             projects and their branch tips
+    bundles/<name>.bundle     one per project with new commits
+    store/<xx>/<chunk>        chunks written since the last export
+"""
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+import store
+from config import config
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# In the child's git dir, the branch tips of the last export
+MARKER_NAME = 'et-export-marker.json'
+# In the ET_HOME config dir, the mtime of the newest chunk exported
+STORE_MARKER_NAME = 'export-marker.json'
+
+
+def _git(child_dir: Path, *args: str) -> str:
+    """
+    :raises RuntimeError: with git's error message
+    """
+    result = subprocess.run(['git', *args], cwd=str(child_dir),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip() or f'git {args[0]} failed')
+    return result.stdout
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: Path, data: dict):
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with tmp_path.open('w') as f:
+        json.dump(data, f)
+    tmp_path.replace(path)
+
+
+def get_current_branch(child_dir: Path) -> Optional[str]:
+    """
+    :return: the checked out branch ref, None if HEAD is detached
+    """
+    result = subprocess.run(['git', 'symbolic-ref', '-q', 'HEAD'], cwd=str(child_dir),
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    return result.stdout.strip() or None
+
+
+def get_heads(child_dir: Path) -> Dict[str, str]:
+    """
+    :return: branch ref -> commit id
+    """
+    output = _git(child_dir, 'for-each-ref', '--format=%(refname) %(objectname)', 'refs/heads/')
+    return dict(line.split(' ', 1) for line in output.splitlines())
+
+
+def bundle_project(child_dir: Path, bundle_path: Path, full: bool) -> Optional[dict]:
+    """
+    Bundles the commits of a child repo that the last export didn't include
+
+    :return: the manifest entry of the project, or None if nothing changed
+    """
+    heads = get_heads(child_dir)
+    exported = {} if full else _read_json(child_dir / '.git' / MARKER_NAME)
+    if not heads or heads == exported:
+        return None
+
+    # Commits removed since, e.g. by `et compact`, are skipped instead of failing the bundle
+    excluded = [f'^{commit}' for commit in sorted(set(exported.values()))]
+    try:
+        _git(child_dir, 'bundle', 'create', str(bundle_path), '--ignore-missing', *sorted(heads), *excluded)
+    except RuntimeError as e:
+        if 'empty bundle' not in str(e):
+            raise
+        # Only branches moved to commits that were already exported
+        bundle_path = None
+
+    attributes = child_dir / '.git' / 'info' / 'attributes'
+    return {
+        'name': child_dir.name,
+        'parent_dir': os.path.realpath(str(child_dir / config.PARENT_SYMLINK_NAME)),
+        'bundle': f'bundles/{child_dir.name}.bundle' if bundle_path else None,
+        'head': get_current_branch(child_dir),
+        'heads': heads,
+        'attributes': attributes.read_text() if attributes.exists() else None,
+    }
+
+
+def _iter_new_chunks(since_ns: int) -> Iterator[Path]:
+    store_dir = store.store_dir()
+    if not store_dir.is_dir():
+        return
+    for fan_out in os.scandir(str(store_dir)):
+        if fan_out.is_dir():
+            for chunk in os.scandir(fan_out.path):
+                if chunk.stat().st_mtime_ns > since_ns:
+                    yield Path(chunk.path)
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, BytesIO(data))
+
+
+def export_archive(out: BinaryIO, child_dirs: List[Path], jobs: int, full: bool = False) -> Iterator[dict]:
+    """
+    Writes the archive to out, then updates the export markers
+
+    :return: a result per project as it is archived, errors included
+    """
+    store_marker_path = Path(config.ET_HOME) / config.CONFIG_DIR_NAME / STORE_MARKER_NAME
+    since_ns = 0 if full else _read_json(store_marker_path).get('mtime_ns', 0)
+    projects = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(max_workers=jobs) as executor, \
+            tarfile.open(fileobj=out, mode='w|gz') as tar:
+        futures = {executor.submit(bundle_project, child_dir, Path(tmp_dir, f'{child_dir.name}.bundle'), full):
+                   child_dir for child_dir in child_dirs}
+        for future in as_completed(futures):
+            child_dir = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                yield {'name': child_dir.name, 'action': 'error', 'error': str(e)}
+                continue
+
+            if entry is None:
+                yield {'name': child_dir.name, 'action': 'unchanged'}
+                continue
+            if entry['bundle']:
+                bundle_path = Path(tmp_dir, f'{child_dir.name}.bundle')
+                tar.add(str(bundle_path), arcname=entry['bundle'])
+                bundle_path.unlink()
+            projects.append(entry)
+            yield {'name': child_dir.name, 'action': 'exported'}
+
+        newest_ns = since_ns
+        for chunk in _iter_new_chunks(since_ns):
+            newest_ns = max(newest_ns, chunk.stat().st_mtime_ns)
+            tar.add(str(chunk), arcname=f'store/{chunk.parent.name}/{chunk.name}')
+
+        manifest = {'version': ARCHIVE_VERSION, 'projects': projects}
+        _add_bytes(tar, MANIFEST_NAME, json.dumps(manifest, indent=1).encode())
+
+    # The archive is complete, the next export can skip what it holds
+    for entry in projects:
+        _write_json(Path(config.ET_HOME) / entry['name'] / '.git' / MARKER_NAME, entry['heads'])
+    store_marker_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_json(store_marker_path, {'mtime_ns': newest_ns})
+
+
+def _safe_members(tar: tarfile.TarFile) -> Iterator[tarfile.TarInfo]:
+    for member in tar:
+        if not (member.isfile() or member.isdir()) or member.name.startswith('/') or '..' in member.name.split('/'):
+            raise ValueError(f'Unexpected archive member "{member.name}"')
+        yield member
+
+
+def apply_bundle(entry: dict, archive_dir: Path) -> dict:
+    """
+    Fetches a project's bundle into its child repo and moves its branches to the exported tips.
+    A checked out branch is only fast-forwarded, so local changes are never overwritten.
+    """
+    child_dir = Path(config.ET_HOME) / entry['name']
+    created = not (child_dir / '.git').exists()
+    if created:
+        child_dir.mkdir(parents=True, exist_ok=True)
+        _git(child_dir, 'init', '-q')
+
+    try:
+        _update_repo(child_dir, entry, archive_dir, created)
+    except Exception:
+        if created:
+            # Don't leave a half restored project behind for the next import
+            shutil.rmtree(str(child_dir))
+        raise
+    return {'name': entry['name'], 'action': 'created' if created else 'updated',
+            'relinked': relink(child_dir, Path(entry['parent_dir']))}
+
+
+def _update_repo(child_dir: Path, entry: dict, archive_dir: Path, created: bool):
+    if entry['attributes'] is not None:
+        info_dir = child_dir / '.git' / 'info'
+        info_dir.mkdir(exist_ok=True)
+        (info_dir / 'attributes').write_text(entry['attributes'])
+        store.configure_repo(child_dir)
+
+    if entry['bundle']:
+        bundle_path = str(archive_dir / entry['bundle'])
+        # Fetch only the objects, the refs are set from the manifest below.
+        # Fails for an incremental bundle whose base was never imported here.
+        refs = [line.split(' ', 1)[1] for line in _git(child_dir, 'bundle', 'list-heads', bundle_path).splitlines()]
+        _git(child_dir, 'fetch', '-q', bundle_path, *refs)
+
+    current = None if created else get_current_branch(child_dir)
+    if current in entry['heads']:
+        # Before any ref moves, so a branch with local commits fails the project as a whole
+        commit = entry['heads'][current]
+        if subprocess.run(['git', 'merge-base', '--is-ancestor', 'HEAD', commit], cwd=str(child_dir)).returncode:
+            raise RuntimeError(f'{current} has commits that are not in the archive, can not fast-forward')
+        _git(child_dir, 'merge', '-q', '--ff-only', commit)
+
+    for ref, commit in entry['heads'].items():
+        if ref != current:
+            _git(child_dir, 'update-ref', ref, commit)
+    # The manifest lists every branch, others were deleted since the last export
+    for ref in get_heads(child_dir):
+        if ref not in entry['heads'] and ref != current:
+            _git(child_dir, 'update-ref', '-d', ref)
+
+    if created:
+        if entry['head']:
+            _git(child_dir, 'symbolic-ref', 'HEAD', entry['head'])
+        _git(child_dir, 'reset', '-q', '--hard')
+
+
+def relink(child_dir: Path, parent_dir: Path) -> int:
+    """
+    Recreates the parent symlinks of a project that are missing or point elsewhere, e.g. to the old ET_HOME
+
+    :param parent_dir: the parent dir the project was exported from
+    :return: the number of symlinks created
+    """
+    import doctor
+    from utils import PairedProject
+
+    to_parent_symlink = child_dir / config.PARENT_SYMLINK_NAME
+    if not os.path.lexists(str(to_parent_symlink)):
+        # The checked out branch doesn't have the link to the parent dir
+        to_parent_symlink.symlink_to(parent_dir)
+
+    problems = doctor.check_project(PairedProject.from_child_dir(child_dir))
+    if any(problem.kind == doctor.PARENT_MISSING for problem in problems):
+        raise RuntimeError(f'Parent dir "{parent_dir}" does not exist, create it and run `et doctor --repair` from it')
+    return sum(1 for problem in problems
+               if problem.kind in (doctor.MISSING, doctor.WRONG_TARGET) and doctor.repair(problem))
+
+
+def import_archive(file: BinaryIO, jobs: int) -> Iterator[dict]:
+    """
+    Applies an archive written by export_archive, incremental archives in the order they were exported
+
+    :return: a result per project as it is applied, errors included
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with tarfile.open(fileobj=file, mode='r|*') as tar:
+            for member in _safe_members(tar):
+                tar.extract(member, tmp_dir)
+
+        manifest = _read_json(Path(tmp_dir, MANIFEST_NAME))
+        if manifest.get('version') != ARCHIVE_VERSION:
+            raise ValueError('Not an archive written by `et export`')
+
+        chunks_dir = Path(tmp_dir, 'store')
+        if chunks_dir.is_dir():
+            for chunk in chunks_dir.glob('*/*'):
+                destination = store.store_dir() / chunk.parent.name / chunk.name
+                if not destination.exists():
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(chunk), str(destination))
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(apply_bundle, entry, Path(tmp_dir)): entry
+                       for entry in manifest['projects']}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'name': entry['name'], 'action': 'error', 'error': str(e)}
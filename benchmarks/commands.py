@@ -0,0 +1,141 @@
+"""
+Command latency benchmarks on synthetic ET_HOME trees.
+
+For every combination of project count and tracked file count, builds a fixture
+(see benchmarks/fixtures.py) and runs init, link, unlink, status, commit and
+other in fresh interpreters from deep inside the target project. Records wall
+time, the number of subprocesses each command spawned and its peak memory, and
+writes one JSON object per measurement.
+
+    python -m benchmarks.commands --projects 1,100,1000 --files 1,100,5000 --output bench.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import GIT_ENV, Fixture
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Counts every subprocess and reports the peak RSS once the command is done
+RUNNER = '''
+import json, resource, subprocess, sys
+spawned = [0]
+original_init = subprocess.Popen.__init__
+def counting_init(self, *args, **kwargs):
+    spawned[0] += 1
+    original_init(self, *args, **kwargs)
+subprocess.Popen.__init__ = counting_init
+from main import et
+code = 0
+try:
+    et(sys.argv[1:])
+except SystemExit as e:
+    code = e.code or 0
+sys.stderr.write("\\n" + json.dumps({"exit_code": code, "subprocesses": spawned[0],
+                 "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}) + "\\n")
+'''
+
+
+def run_et(args, cwd: Path, env: dict) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', RUNNER, *args], cwd=str(cwd), env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    metrics = json.loads(proc.stderr.strip().splitlines()[-1])
+    if metrics['exit_code'] != 0:
+        raise RuntimeError(f'et {" ".join(args)} failed:\n{proc.stderr}')
+    metrics['wall_ms'] = wall_ms
+    return metrics
+
+
+def scenario_steps(fixture: Fixture, iteration: int):
+    """
+    :return: (command, args, cwd, setup) in the order they have to run, each step leaves a clean state
+    """
+    new_file = f'new-{iteration}.env'
+    new_project = fixture.projects_dir / f'new-project-{iteration}'
+
+    def create_new_project():
+        new_project.mkdir()
+        fixture.git(new_project, 'init', '-q')
+        fixture.git(new_project, 'commit', '-q', '--allow-empty', '-m', 'Hello World')
+
+    def create_new_file():
+        (fixture.target_parent / new_file).write_text('NEW=1\n')
+
+    def modify_tracked_file():
+        (fixture.target_child / fixture.tracked_file(0)).write_text(f'VALUE={iteration}\n')
+
+    return [
+        ('init', ['init', str(new_project)], fixture.root, create_new_project),
+        ('other', ['other'], fixture.deep_dir, None),
+        ('status', ['status'], fixture.deep_dir, None),
+        ('link', ['link', str(fixture.target_parent / new_file)], fixture.deep_dir, create_new_file),
+        ('unlink', ['unlink', str(fixture.target_parent / new_file)], fixture.deep_dir, None),
+        ('commit', ['commit', '-m', f'Benchmark {iteration}'], fixture.deep_dir, modify_tracked_file),
+    ]
+
+
+def run_scenario(project_count: int, file_count: int, depth: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_start = time.perf_counter()
+        fixture = Fixture(Path(tmp).resolve(), project_count, file_count, depth).create()
+        setup_ms = (time.perf_counter() - setup_start) * 1000
+        env = dict(os.environ, ET_HOME=str(fixture.et_home), PYTHONPATH=str(REPO_ROOT), **GIT_ENV)
+
+        samples = {}
+        for iteration in range(repeat):
+            for command, args, cwd, setup in scenario_steps(fixture, iteration):
+                if setup is not None:
+                    setup()
+                samples.setdefault(command, []).append(run_et(args, cwd, env))
+
+        for command, runs in samples.items():
+            yield {
+                'command': command,
+                'projects': project_count,
+                'tracked_files': file_count,
+                'depth': depth,
+                'runs': len(runs),
+                'wall_ms_median': round(statistics.median(run['wall_ms'] for run in runs), 2),
+                'wall_ms_max': round(max(run['wall_ms'] for run in runs), 2),
+                'subprocesses': max(run['subprocesses'] for run in runs),
+                'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+                'fixture_setup_ms': round(setup_ms, 2),
+            }
+
+
+def int_list(value: str):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--projects', type=int_list, default=[1, 100])
+    parser.add_argument('--files', type=int_list, default=[1, 100])
+    parser.add_argument('--depth', type=int, default=10, help='Directory depth inside the parent repo')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path, help='Write JSON lines here instead of stdout')
+    args = parser.parse_args()
+
+    out = args.output.open('w') if args.output else sys.stdout
+    try:
+        for project_count in args.projects:
+            for file_count in args.files:
+                for result in run_scenario(project_count, file_count, args.depth, args.repeat):
+                    out.write(json.dumps(result) + '\n')
+                    out.flush()
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Generates synthetic ET_HOME trees for the benchmarks.
+
+Every project gets a real parent repo and child repo. The target project (the
+first one) gets the tracked files, already linked and committed, and a deep
+directory inside its parent repo to run commands from.
+"""
+import os
+import subprocess
+from pathlib import Path
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'et-bench', 'GIT_AUTHOR_EMAIL': 'et-bench@example.com',
+    'GIT_COMMITTER_NAME': 'et-bench', 'GIT_COMMITTER_EMAIL': 'et-bench@example.com',
+}
+PARENT_SYMLINK_NAME = '.source'
+
+
+class Fixture(object):
+    def __init__(self, root: Path, project_count: int, file_count: int, depth: int):
+        self.root = root
+        self.et_home = root / 'et-home'
+        self.projects_dir = root / 'src'
+        self.project_count = project_count
+        self.file_count = file_count
+        self.depth = depth
+
+    @property
+    def target_parent(self) -> Path:
+        return self.projects_dir / 'project-0'
+
+    @property
+    def target_child(self) -> Path:
+        return self.et_home / 'project-0'
+
+    @property
+    def deep_dir(self) -> Path:
+        return self.target_parent.joinpath(*[f'level-{level}' for level in range(self.depth)])
+
+    def tracked_file(self, index: int) -> str:
+        return f'config/file-{index}.env'
+
+    def git(self, cwd: Path, *args):
+        subprocess.run(['git', *args], cwd=str(cwd), env=dict(os.environ, **GIT_ENV), check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def create(self) -> 'Fixture':
+        self.et_home.mkdir(parents=True)
+        self.projects_dir.mkdir(parents=True)
+        for index in range(self.project_count):
+            self._create_project(f'project-{index}')
+
+        self.deep_dir.mkdir(parents=True)
+        self._track_files()
+        return self
+
+    def _create_project(self, name: str):
+        parent_dir = self.projects_dir / name
+        child_dir = self.et_home / name
+        parent_dir.mkdir()
+        child_dir.mkdir()
+        self.git(parent_dir, 'init', '-q')
+        self.git(parent_dir, 'commit', '-q', '--allow-empty', '-m', 'Hello World')
+        self.git(child_dir, 'init', '-q')
+        (child_dir / PARENT_SYMLINK_NAME).symlink_to(parent_dir)
+        self.git(child_dir, 'add', PARENT_SYMLINK_NAME)
+        self.git(child_dir, 'commit', '-q', '-m', 'Link project to parent directory')
+
+    def _track_files(self):
+        (self.target_parent / 'config').mkdir()
+        (self.target_child / 'config').mkdir()
+        for index in range(self.file_count):
+            relative_path = self.tracked_file(index)
+            (self.target_child / relative_path).write_text(f'VALUE={index}\n')
+            (self.target_parent / relative_path).symlink_to(self.target_child / relative_path)
+        self.git(self.target_child, 'add', '-A')
+        self.git(self.target_child, 'commit', '-q', '-m', f'Track {self.file_count} files')
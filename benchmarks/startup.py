@@ -0,0 +1,178 @@
+"""
+Cold start benchmark for filesystem-only commands.
+
+Runs `et other` in fresh interpreters from inside a throwaway project and
+reports the median wall time. The target applies to the time spent on top
+of an interpreter that only imports click: click alone takes 30-60 ms to
+import depending on the host, which no change to et can win back. Exits
+non-zero if that exceeds the target or if GitPython was imported.
+
+The latency critical `et prompt` is timed the same way through the `et`
+executable's entry point, and so is the post-commit hook, which every
+`git commit` in the parent waits for, with nothing to commit. Neither loads
+click, their target applies to the time on top of importing the standard
+library modules they can't do without (json for the project index, pathlib),
+and they must load none of FAST_PATH_FORBIDDEN.
+
+    python -m benchmarks.startup [--runs 20] [--target-ms 50] [--fast-path-target-ms 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from index_stat import save_staged_state
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Run the command, then report whether GitPython got loaded along the way
+RUNNER = '''
+import sys
+from main import et
+try:
+    et(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stderr.write("git-imported=%s\\n" % ("git" in sys.modules))
+'''
+
+# Modules `et prompt` and the hooks must not load: GitPython, click, or what only writing and hashing files needs
+FAST_PATH_FORBIDDEN = ['git', 'click', 'logging', 'subprocess', 'threading', 'hashlib', 'store']
+
+# Run the statement, then report which forbidden modules got loaded along the way
+FAST_PATH_RUNNER = '''
+import sys
+try:
+    %s
+except SystemExit:
+    pass
+sys.stderr.write("loaded=%%s\\n" %% ",".join(name for name in %r if name in sys.modules))
+'''
+# The `et` executable's entry point
+PROMPT_RUNNER = FAST_PATH_RUNNER % ('import daemon; sys.argv = ["et"] + sys.argv[1:]; daemon.cli()', FAST_PATH_FORBIDDEN)
+# What the installed hook script runs
+HOOK_RUNNER = FAST_PATH_RUNNER % ('import hook; sys.exit(hook.main(sys.argv[1:]))', FAST_PATH_FORBIDDEN)
+
+
+def make_project(root: Path) -> Path:
+    """
+    Creates a git repo and a matching child dir in root without invoking et
+    """
+    project_dir = root / 'project'
+    child_dir = root / 'et-home' / 'project'
+    (project_dir / '.git').mkdir(parents=True)
+    (child_dir / '.git').mkdir(parents=True)
+    (child_dir / '.source').symlink_to(project_dir)
+    # Nothing staged, as a commit by et leaves it, so the post-commit hook has nothing to commit
+    (child_dir / '.git' / 'HEAD').write_text('ref: refs/heads/master\n')
+    save_staged_state(child_dir / '.git', False)
+    return project_dir
+
+
+def run_timed(runner: str, args, cwd: Path, env: dict):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', runner] + args, cwd=str(cwd), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return elapsed_ms, proc.stderr
+
+
+def time_command(args, cwd: Path, env: dict):
+    elapsed_ms, stderr = run_timed(RUNNER, args, cwd, env)
+    return elapsed_ms, 'git-imported=True' in stderr
+
+
+def time_fast_path(runner: str, args, cwd: Path, env: dict):
+    """
+    :return: the wall time of the command and the forbidden modules it loaded
+    """
+    elapsed_ms, stderr = run_timed(runner, args, cwd, env)
+    loaded = stderr.rpartition('loaded=')[2].strip()
+    return elapsed_ms, set(loaded.split(',')) if loaded else set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--target-ms', type=float, default=50.0)
+    parser.add_argument('--fast-path-target-ms', type=float, default=15.0)
+    parser.add_argument('--json', action='store_true', help='Print machine readable results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp).resolve()
+        project_dir = make_project(root)
+        env = dict(os.environ, ET_HOME=str(root / 'et-home'), PYTHONPATH=str(REPO_ROOT),
+                   PYTHONDONTWRITEBYTECODE='')
+
+        # Warm up the bytecode and filesystem caches
+        time_command(['other'], project_dir, env)
+        samples = []
+        git_imported = False
+        for _ in range(args.runs):
+            elapsed_ms, imported = time_command(['other'], project_dir, env)
+            samples.append(elapsed_ms)
+            git_imported = git_imported or imported
+
+        # The first `et other` built the project index they read
+        fast_paths = {'prompt': (PROMPT_RUNNER, ['prompt']), 'hook': (HOOK_RUNNER, ['post-commit', '--background'])}
+        fast_path_samples = {name: [] for name in fast_paths}
+        fast_path_loaded = set()
+        for _ in range(args.runs):
+            for name, (runner, runner_args) in fast_paths.items():
+                elapsed_ms, loaded = time_fast_path(runner, runner_args, project_dir, env)
+                fast_path_samples[name].append(elapsed_ms)
+                fast_path_loaded |= loaded
+
+    # Baseline interpreter startup, with and without click, to separate our cost from theirs
+    def baseline(code: str) -> float:
+        baseline_samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code])
+            baseline_samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(baseline_samples)
+
+    python_ms = baseline('pass')
+    click_ms = baseline('import click')
+    stdlib_ms = baseline('import json, pathlib, typing')
+
+    result = {
+        'command': 'other',
+        'runs': args.runs,
+        'median_ms': round(statistics.median(samples), 2),
+        'max_ms': round(max(samples), 2),
+        'python_startup_ms': round(python_ms, 2),
+        'overhead_ms': round(statistics.median(samples) - python_ms, 2),
+        'click_import_ms': round(click_ms - python_ms, 2),
+        'et_overhead_ms': round(statistics.median(samples) - click_ms, 2),
+        'target_ms': args.target_ms,
+        'git_imported': git_imported,
+        'stdlib_import_ms': round(stdlib_ms - python_ms, 2),
+    }
+    for name, fast_path_ms in fast_path_samples.items():
+        result[f'{name}_median_ms'] = round(statistics.median(fast_path_ms), 2)
+        result[f'{name}_et_overhead_ms'] = round(statistics.median(fast_path_ms) - stdlib_ms, 2)
+    result['fast_path_target_ms'] = args.fast_path_target_ms
+    result['fast_path_loaded'] = sorted(fast_path_loaded)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f'{key:>21}: {value}')
+
+    if git_imported or result['et_overhead_ms'] > args.target_ms:
+        sys.exit(1)
+    if fast_path_loaded or any(result[f'{name}_et_overhead_ms'] > args.fast_path_target_ms for name in fast_paths):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,16 @@ class config(object):
     """
     ET_HOME = Path(os.environ.get('ET_HOME', str(Path.home() / '.et'))) or '.et'
     PARENT_SYMLINK_NAME = os.environ.get('ET_PARENT_SYMLINK_NAME', '.source') or '.source'
+    # Internal state that lives in ET_HOME but is not a project
+    CONFIG_DIR_NAME = '.etconfig'
+    PROJECT_INDEX_NAME = 'project-index.json'
+    STORE_DIR_NAME = 'store'
+    SHARED_OBJECTS_NAME = 'objects'
+    DAEMON_SOCKET_NAME = 'daemon.sock'
+    # In the child dir of projects using the snapshot backend
+    SNAPSHOT_DIR_NAME = '.et-snapshots'
+    # Tracked files of at least this many bytes go to the chunk store instead of the child repo
+    LARGE_FILE_THRESHOLD = int(os.environ.get('ET_LARGE_FILE_THRESHOLD', 0) or 32 * 1024 * 1024)
 
     def __init__(self):
         raise RuntimeError('Do not init config object')
@@ -0,0 +1,188 @@
+"""
+Optional per-user daemon that runs read-only commands for the `et` executable.
+
+Prompt and editor integrations call `et` all the time, and every call pays for
+Python startup, importing click and GitPython, loading the project index and
+opening repos. The daemon keeps all of that in memory: it listens on a Unix
+socket in the ET_HOME config dir and runs forwarded commands in-process, one at
+a time, keeping repo handles open between requests. When no daemon is
+listening, `et` runs the command itself as usual.
+
+The client side of this module only imports the standard library and config,
+so forwarding a command costs little more than starting the interpreter.
+
+    et daemon start
+"""
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from config import config
+
+# Commands that only read state and are safe to run from the daemon's process
+FORWARDED_COMMANDS = {'other', 'status', 'list'}
+# Seconds to wait for the daemon before running the command in-process
+CLIENT_TIMEOUT = 5.0
+
+
+def socket_path() -> Path:
+    return Path(config.ET_HOME) / config.CONFIG_DIR_NAME / config.DAEMON_SOCKET_NAME
+
+
+def request(message: dict, timeout: float = CLIENT_TIMEOUT) -> Optional[dict]:
+    """
+    Sends one JSON message to the daemon
+
+    :return: the daemon's reply, or None if no daemon answered
+    """
+    # Imported here, `et prompt` and `et filter` never talk to the daemon
+    import socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(str(socket_path()))
+            client.sendall(json.dumps(message).encode() + b'\n')
+            with client.makefile('rb') as f:
+                reply = f.readline()
+    except OSError:
+        return None
+
+    try:
+        return json.loads(reply.decode())
+    except ValueError:
+        return None
+
+
+def forward(argv: List[str], cwd: str) -> Optional[dict]:
+    """
+    :return: the exit code and output of the command run by the daemon,
+     or None if the command must run in-process
+    """
+    if not argv or argv[0] not in FORWARDED_COMMANDS or os.environ.get('ET_TRACE'):
+        return None
+
+    reply = request({'command': 'run', 'argv': argv, 'cwd': cwd, 'et_home': str(config.ET_HOME)})
+    if reply is None or 'exit_code' not in reply:
+        return None
+    return reply
+
+
+def cli():
+    """
+    Entry point of the `et` executable, forwards to the daemon when one is running
+    """
+    if sys.argv[1:2] == ['prompt']:
+        # Faster in-process than over the socket, as long as click isn't loaded
+        import prompt
+        sys.exit(prompt.main(sys.argv[2:]))
+    if sys.argv[1:2] == ['filter']:
+        # Run by git for every large file, skip loading click
+        import store
+        sys.exit(store.main(sys.argv[2:]))
+
+    reply = forward(sys.argv[1:], os.getcwd())
+    if reply is not None:
+        sys.stdout.write(reply['stdout'])
+        sys.stderr.write(reply['stderr'])
+        sys.exit(reply['exit_code'])
+
+    from main import et
+    et()
+
+
+def run_command(argv: List[str], cwd: str) -> dict:
+    """
+    Runs an `et` command in this process, capturing its output
+    """
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+    from io import StringIO
+
+    import discovery
+    from main import et
+
+    # Repos may have been created or removed since the last request
+    discovery.clear_cache()
+    stdout, stderr = StringIO(), StringIO()
+    exit_code = 0
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            # Repo handles stay open for the next request, and nothing may be written
+            et.main(argv, prog_name='et', obj={'keep_repos_open': True, 'read_only': True})
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                stderr.write(e.code + '\n')
+                exit_code = 1
+            else:
+                exit_code = e.code or 0
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    return {'exit_code': exit_code, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+def serve(idle_timeout: float):
+    """
+    Answers requests until told to stop or idle for idle_timeout seconds
+    """
+    import socketserver
+
+    path = socket_path()
+    if request({'command': 'ping'}) is not None:
+        raise RuntimeError(f'A daemon is already listening on "{path}"')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.is_socket():
+        # Left behind by a daemon that didn't shut down cleanly
+        path.unlink()
+
+    state = {'running': True}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                message = json.loads(self.rfile.readline().decode())
+            except ValueError:
+                return
+
+            command = message.get('command')
+            if command == 'ping':
+                reply = {'pid': os.getpid()}
+            elif command == 'stop':
+                state['running'] = False
+                reply = {'pid': os.getpid()}
+            elif command == 'run' and message.get('et_home') == str(config.ET_HOME):
+                argv = message.get('argv') or ['']
+                # Anyone who can reach the socket runs commands as this process, only serve the read-only ones
+                if argv[0] in FORWARDED_COMMANDS:
+                    reply = run_command(argv, message['cwd'])
+                else:
+                    reply = {'error': f'Command not served by the daemon: {argv[0]}'}
+            else:
+                reply = {'error': f'Unsupported request for this daemon: {command}'}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+    class Server(socketserver.UnixStreamServer):
+        timeout = idle_timeout
+
+        def handle_timeout(self):
+            state['running'] = False
+
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(str(path), Handler)
+    finally:
+        os.umask(old_umask)
+
+    try:
+        while state['running']:
+            server.handle_request()
+    finally:
+        server.server_close()
+        path.unlink()
+
+        from utils import close_repos
+        close_repos()
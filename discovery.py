@@ -0,0 +1,123 @@
+"""
+Finds the git working tree containing a path by walking up the filesystem,
+without GitPython.
+
+A `.git` entry is either the git dir itself or a "gitfile" containing
+`gitdir: <path>`, which linked worktrees and submodules use. Linked worktrees
+share the objects and refs of the main repository, whose git dir is named in
+the `commondir` file of the worktree's git dir.
+
+Every directory visited on the way up is memoized for the life of the process,
+so resolving many paths of the same tree only stats each directory once.
+"""
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from exceptions import NotInRepository
+
+# working_dir: root of the working tree, git_dir: its own git dir (HEAD, index),
+# common_dir: the git dir holding objects and refs, which differs for linked worktrees
+GitLocation = namedtuple('GitLocation', ['working_dir', 'git_dir', 'common_dir'])
+
+_cache: Dict[str, Optional[GitLocation]] = {}
+
+
+def read_gitfile(path: Path) -> Optional[Path]:
+    """
+    :return: the git dir named by a gitfile, or None if path isn't one
+    """
+    try:
+        with open(str(path)) as f:
+            content = f.read(4096).strip()
+    except (IsADirectoryError, FileNotFoundError, NotADirectoryError):
+        return None
+    if not content.startswith('gitdir:'):
+        return None
+    return Path(os.path.normpath(os.path.join(str(path.parent), content[len('gitdir:'):].strip())))
+
+
+def get_common_dir(git_dir: Path) -> Path:
+    try:
+        with open(str(git_dir / 'commondir')) as f:
+            common_dir = f.read().strip()
+    except FileNotFoundError:
+        return git_dir
+    return Path(os.path.normpath(os.path.join(str(git_dir), common_dir)))
+
+
+def _locate(directory: str) -> Optional[GitLocation]:
+    """
+    :return: the location of the repo whose working tree root is directory, if it is one
+    """
+    dot_git = Path(directory) / '.git'
+    if os.path.isdir(str(dot_git)):
+        git_dir = dot_git
+    else:
+        git_dir = read_gitfile(dot_git)
+        if git_dir is None or not os.path.isdir(str(git_dir)):
+            return None
+    return GitLocation(Path(directory), git_dir, get_common_dir(git_dir))
+
+
+def discover(input_path: Path) -> GitLocation:
+    """
+    Finds the repo whose working tree contains input_path. The path is made
+    absolute but symlinks are not resolved, so a path reached through a
+    symlink belongs to the tree the symlink is in.
+
+    :raises NotInRepository: if no parent directory has a .git entry
+    """
+    path = os.path.abspath(str(input_path))
+    visited = []
+    location = None
+    while True:
+        if path in _cache:
+            location = _cache[path]
+            break
+        visited.append(path)
+        location = _locate(path)
+        if location is not None:
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    for directory in visited:
+        _cache[directory] = location
+
+    if location is None:
+        raise NotInRepository(f'Not a git repository: "{input_path}"')
+    return location
+
+
+def discover_all(input_paths: Iterable[Path]) -> List[Optional[GitLocation]]:
+    """
+    Resolves many paths at once, sharing the walk between paths of the same tree
+
+    :return: the location for each input path, None for paths outside of any repo
+    """
+    locations = []
+    for input_path in input_paths:
+        try:
+            locations.append(discover(input_path))
+        except NotInRepository:
+            locations.append(None)
+    return locations
+
+
+def get_git_dir(working_dir: Path) -> Path:
+    """
+    :return: the git dir of a working tree root, following gitfiles
+    """
+    dot_git = working_dir / '.git'
+    return read_gitfile(dot_git) or dot_git
+
+
+def clear_cache():
+    """
+    Forgets every memoized directory, e.g. after creating or removing a repo
+    """
+    _cache.clear()
@@ -0,0 +1,212 @@
+"""
+Verifies the symlinks of every tracked object, e.g. after restoring a home directory from backup.
+
+Every path is checked with at most one stat call: directory listings come from a
+cached os.scandir per parent directory, and symlink targets are compared as
+strings with os.readlink before falling back to a samefile check.
+"""
+import os
+import shutil
+import stat
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from index_stat import hash_blob
+from parent_status import PathChecker
+from utils import PairedProject
+
+# The parent path of a tracked object doesn't exist anymore
+MISSING = 'missing'
+# The parent path is a symlink, but not to the child path
+WRONG_TARGET = 'wrong-target'
+# The parent path is a symlink, but the child path it points to is gone
+DANGLING = 'dangling'
+# A regular file or directory replaced the symlink, with the same content as the child path
+REPLACED = 'replaced'
+# A regular file or directory replaced the symlink, and its content differs from the child path
+CONFLICT = 'conflict'
+# The project's parent dir doesn't exist
+PARENT_MISSING = 'parent-missing'
+# The parent repo tracks the linked path, other clones see a type change
+TRACKED_BY_PARENT = 'tracked'
+
+Problem = namedtuple('Problem', ['project', 'relative_path', 'kind'])
+
+
+class _DirCache(object):
+    """
+    Lists each directory once with os.scandir so lookups of its entries need no extra stat calls
+    """
+
+    def __init__(self):
+        self._listings: Dict[str, Optional[Dict[str, os.DirEntry]]] = {}
+
+    def listing(self, path: Path) -> Optional[Dict[str, os.DirEntry]]:
+        directory = str(path)
+        if directory not in self._listings:
+            try:
+                with os.scandir(directory) as entries:
+                    self._listings[directory] = {entry.name: entry for entry in entries}
+            except (FileNotFoundError, NotADirectoryError):
+                self._listings[directory] = None
+        return self._listings[directory]
+
+    def get(self, path: Path) -> Optional[os.DirEntry]:
+        listing = self.listing(path.parent)
+        return listing.get(path.name) if listing is not None else None
+
+
+def _points_to(link: os.DirEntry, target: Path) -> bool:
+    destination = os.readlink(link.path)
+    if os.path.normpath(os.path.join(os.path.dirname(link.path), destination)) == os.path.normpath(str(target)):
+        return True
+    # Same file reached through a differently spelled path, e.g. ET_HOME behind a symlink
+    try:
+        return os.path.samefile(link.path, str(target))
+    except FileNotFoundError:
+        return False
+
+
+def _is_replaced_dir(project: PairedProject, prefix: Path, tracked: List[str],
+                     parent_dirs: _DirCache, child_dirs: _DirCache) -> bool:
+    """
+    A real directory stands where a linked directory was when the child has everything it lists,
+    and none of the tracked paths under it goes through a symlink
+    """
+    parent_listing = parent_dirs.listing(project.parent_dir / prefix)
+    child_listing = child_dirs.listing(project.child_dir / prefix)
+    if parent_listing is None or child_listing is None or not set(parent_listing) <= set(child_listing):
+        return False
+
+    below = prefix.as_posix() + '/'
+    for path in tracked:
+        if not path.startswith(below):
+            continue
+        relative_path = Path(path)
+        for inner in [relative_path, *relative_path.parents]:
+            if inner == prefix:
+                break
+            entry = parent_dirs.get(project.parent_dir / inner)
+            if entry is not None and entry.is_symlink():
+                return False
+    return True
+
+
+def _same_tree(parent_path: Path, child_path: Path) -> bool:
+    """
+    :return: whether every file and symlink under parent_path is in child_path with the same content
+    """
+    for root, dirs, files in os.walk(str(parent_path)):
+        relative_root = Path(root).relative_to(parent_path)
+        for name in dirs + files:
+            path = Path(root) / name
+            st = os.lstat(str(path))
+            try:
+                child_st = os.lstat(str(child_path / relative_root / name))
+            except FileNotFoundError:
+                return False
+            if stat.S_IFMT(st.st_mode) != stat.S_IFMT(child_st.st_mode):
+                return False
+            if not stat.S_ISDIR(st.st_mode) \
+                    and hash_blob(path, st) != hash_blob(child_path / relative_root / name, child_st):
+                return False
+    return True
+
+
+def check_project(project: PairedProject) -> List[Problem]:
+    """
+    :return: every problem with the symlinks of the project's tracked objects
+    """
+    if not os.path.isdir(str(project.parent_dir)):
+        return [Problem(project, Path('.'), PARENT_MISSING)]
+
+    parent_dirs = _DirCache()
+    child_dirs = _DirCache()
+    problems = []
+    # Relative paths already accounted for, e.g. a linked directory covers everything under it
+    covered = set()
+    # Real directories already found not to replace a linked directory
+    containers: Set[Path] = set()
+    linked = []
+
+    tracked = list(project.iter_tracked_paths())
+    for path in tracked:
+        relative_path = Path(path)
+        if any(parent in covered for parent in relative_path.parents):
+            continue
+
+        # Walk down from the top, the first symlink found is the linked object
+        for prefix in reversed([relative_path, *relative_path.parents][:-1]):
+            parent_entry = parent_dirs.get(project.parent_dir / prefix)
+            if parent_entry is None:
+                problems.append(Problem(project, prefix, MISSING))
+                covered.add(prefix)
+                break
+
+            if parent_entry.is_symlink():
+                covered.add(prefix)
+                child_path = project.child_dir / prefix
+                if child_dirs.get(child_path) is None:
+                    problems.append(Problem(project, prefix, DANGLING))
+                elif not _points_to(parent_entry, child_path):
+                    problems.append(Problem(project, prefix, WRONG_TARGET))
+                else:
+                    linked.append(prefix)
+                break
+
+            if prefix != relative_path and parent_entry.is_dir(follow_symlinks=False) and prefix not in containers:
+                if _is_replaced_dir(project, prefix, tracked, parent_dirs, child_dirs):
+                    # Report the linked directory once, not every file under it
+                    covered.add(prefix)
+                    same = _same_tree(Path(parent_entry.path), project.child_dir / prefix)
+                    problems.append(Problem(project, prefix, REPLACED if same else CONFLICT))
+                    break
+                containers.add(prefix)
+
+            if prefix == relative_path or not parent_entry.is_dir(follow_symlinks=False):
+                # A real file where a symlink should be
+                covered.add(prefix)
+                child_path = project.child_dir / prefix
+                same = child_dirs.get(child_path) is not None \
+                    and parent_entry.is_file(follow_symlinks=False) \
+                    and hash_blob(Path(parent_entry.path)) == hash_blob(child_path)
+                problems.append(Problem(project, prefix, REPLACED if same else CONFLICT))
+                break
+
+    if linked:
+        checker = PathChecker(project.parent_dir)
+        problems.extend(Problem(project, prefix, TRACKED_BY_PARENT)
+                        for prefix in linked if checker.is_tracked(prefix.as_posix()))
+    return problems
+
+
+def repair(problem: Problem) -> bool:
+    """
+    Fixes a problem where it can be done without losing data
+
+    :return: whether the problem was repaired
+    """
+    project = problem.project
+    parent_path = project.parent_dir / problem.relative_path
+    child_path = project.child_dir / problem.relative_path
+
+    if problem.kind == MISSING:
+        parent_path.parent.mkdir(parents=True, exist_ok=True)
+        parent_path.symlink_to(child_path)
+    elif problem.kind == WRONG_TARGET:
+        parent_path.unlink()
+        parent_path.symlink_to(child_path)
+    elif problem.kind == DANGLING:
+        # Restore the committed version of the child path
+        project.backend.restore(problem.relative_path.as_posix())
+    elif problem.kind == REPLACED:
+        if parent_path.is_dir() and not parent_path.is_symlink():
+            # Only found replaced when the child has all of its content
+            shutil.rmtree(str(parent_path))
+        else:
+            parent_path.unlink()
+        parent_path.symlink_to(child_path)
+    else:
+        return False
+    return True
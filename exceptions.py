@@ -8,3 +8,6 @@ class NotInProject(Exception):
 
 class UnknownProject(Exception):
     pass
+
+class NotInRepository(Exception):
+    pass
@@ -0,0 +1,144 @@
+"""
+Entry point for the git hooks installed by `et hook install`.
+
+Hooks run on every `git commit` and `git checkout` in the parent repo, so
+this module is invoked directly by the hook script instead of through click,
+and only loads GitPython once it knows there is something to do.
+
+    python hook.py post-commit [--background]
+    python hook.py post-checkout <previous HEAD> <new HEAD> <branch flag>
+"""
+import os
+import sys
+from pathlib import Path
+
+from discovery import get_git_dir
+from index_stat import has_changes, has_staged_changes
+from project_index import ProjectIndex
+from snapshot import SnapshotBackend, is_snapshot_dir
+
+HOOK_MARKER = '# Installed by env-tracker'
+HOOK_NAMES = ['post-commit', 'post-checkout']
+
+# Git points these at the parent repo while a hook runs,
+# they must not leak into git commands run against the child repo
+GIT_LOCATION_VARIABLES = ['GIT_DIR', 'GIT_INDEX_FILE', 'GIT_WORK_TREE', 'GIT_COMMON_DIR', 'GIT_PREFIX',
+                          'GIT_OBJECT_DIRECTORY', 'GIT_ALTERNATE_OBJECT_DIRECTORIES']
+
+
+def hook_script(hook_name: str, background: bool) -> str:
+    args = [sys.executable, str(Path(__file__).resolve()), hook_name]
+    if background and hook_name == 'post-commit':
+        args.append('--background')
+    command = ' '.join(f'"{arg}"' for arg in args)
+    return f'#!/bin/sh\n{HOOK_MARKER}\nexec {command} "$@"\n'
+
+
+def get_branch_name(git_dir: Path) -> str:
+    """
+    :return: the checked out branch, or the abbreviated commit when HEAD is detached
+    """
+    head = (git_dir / 'HEAD').read_text().strip()
+    if head.startswith('ref: refs/heads/'):
+        return head[len('ref: refs/heads/'):]
+    return head[:8]
+
+
+def is_detached(git_dir: Path) -> bool:
+    return not (git_dir / 'HEAD').read_text().startswith('ref: ')
+
+
+def child_has_changes(child_dir: Path) -> bool:
+    if is_snapshot_dir(child_dir):
+        return bool(SnapshotBackend(child_dir).status())
+    git_dir = child_dir / '.git'
+    # An unknown staged state is left to the full check of the commit
+    return has_changes(child_dir, git_dir / 'index') or has_staged_changes(git_dir) is not False
+
+
+def post_commit(parent_dir: Path, background: bool) -> int:
+    child_dir = ProjectIndex.load().get(parent_dir)
+    if child_dir is None:
+        # Not a tracked project, nothing to do
+        return 0
+
+    if not child_has_changes(child_dir):
+        return 0
+
+    if background:
+        # Let `git commit` return now and commit the child repo from a detached process
+        import subprocess
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), 'post-commit'],
+                         cwd=str(parent_dir), start_new_session=True, stdin=subprocess.DEVNULL,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return 0
+
+    # Something changed, pay for GitPython from here on
+    from utils import PairedProject, close_repos
+
+    project = PairedProject(parent_dir=parent_dir, child_dir=child_dir, working_from_parent=True)
+    try:
+        branch = get_branch_name(get_git_dir(parent_dir))
+        parent_message = project.parent_repo.head.commit.message.strip()
+        project.commit_changes(f'[{branch}] {parent_message}')
+    finally:
+        close_repos()
+    return 0
+
+
+def post_checkout(parent_dir: Path, args) -> int:
+    """
+    Moves the child repo to the branch that was just checked out in the parent
+    """
+    if len(args) < 3 or args[2] != '1':
+        # A file checkout, the branch didn't change
+        return 0
+
+    child_dir = ProjectIndex.load().get(parent_dir)
+    if child_dir is None or is_snapshot_dir(child_dir):
+        # Snapshot histories have no branches to switch to
+        return 0
+
+    parent_git_dir = get_git_dir(parent_dir)
+    if is_detached(parent_git_dir):
+        # Keep the child on its branch until the parent is back on one
+        return 0
+
+    branch = get_branch_name(parent_git_dir)
+    if branch == get_branch_name(child_dir / '.git'):
+        return 0
+
+    from mirror import mirror_branch
+    from utils import PairedProject, close_repos
+
+    project = PairedProject(parent_dir=parent_dir, child_dir=child_dir, working_from_parent=True)
+    try:
+        mirror_branch(project, branch)
+    finally:
+        close_repos()
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in HOOK_NAMES:
+        sys.stderr.write(f'usage: hook.py {{{",".join(HOOK_NAMES)}}} [--background]\n')
+        return 2
+
+    for variable in GIT_LOCATION_VARIABLES:
+        os.environ.pop(variable, None)
+
+    # Hooks run from the top of the working tree
+    parent_dir = Path(os.getcwd()).resolve()
+    try:
+        if argv[0] == 'post-checkout':
+            return post_checkout(parent_dir, argv[1:])
+        return post_commit(parent_dir, background='--background' in argv[1:])
+    except Exception as e:
+        # The parent commit or checkout already happened, never make it look like it failed
+        sys.stderr.write(f'et: could not update tracked files: {e}\n')
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import json
+import os
+import stat
+from collections import namedtuple
+from pathlib import Path
+from struct import pack, unpack_from
+from typing import Iterable, Iterator, List, Optional, TYPE_CHECKING
+
+from config import config
+
+if TYPE_CHECKING:
+    from git import IndexFile, Repo
+
+# The fields of an index entry that stat_matches and has_changes read,
+# mtime is a (seconds, nanoseconds) tuple like GitPython's IndexEntry.mtime
+IndexStatEntry = namedtuple('IndexStatEntry', ['path', 'mode', 'binsha', 'size', 'inode', 'mtime'])
+
+# The index stores stat data truncated to 32 bits
+MASK_32 = 0xffffffff
+HASH_CHUNK_SIZE = 1024 * 1024
+# In the child's git dir, whether the index differed from HEAD when they were last compared
+STAGED_MARKER_NAME = 'et-staged.json'
+
+
+def index_mode(st: os.stat_result) -> int:
+    """
+    :return: the mode git would record in the index for a file with this stat data
+    """
+    if stat.S_ISLNK(st.st_mode):
+        return 0o120000
+    return 0o100755 if st.st_mode & stat.S_IXUSR else 0o100644
+
+
+def stat_matches(entry, st: os.stat_result, index_mtime_ns: int) -> bool:
+    """
+    Whether the stat data recorded in an index entry still matches the file.
+
+    Entries written in the same instant as the index are "racily clean" and
+    never trusted, the file could have changed after its stat data was read.
+    """
+    mtime = (int(st.st_mtime_ns // 10 ** 9) & MASK_32, st.st_mtime_ns % 10 ** 9)
+    if entry.mtime[0] * 10 ** 9 + entry.mtime[1] >= index_mtime_ns:
+        return False
+    return entry.mode == index_mode(st) \
+        and entry.size == st.st_size & MASK_32 \
+        and entry.inode == st.st_ino & MASK_32 \
+        and tuple(entry.mtime) == mtime
+
+
+def hash_blob(path: Path, st: Optional[os.stat_result] = None) -> bytes:
+    """
+    Computes the git blob id of a file or symlink, reading the file in chunks
+    """
+    import hashlib
+
+    st = st or os.lstat(str(path))
+    if stat.S_ISLNK(st.st_mode):
+        target = os.fsencode(os.readlink(str(path)))
+        return hashlib.sha1(b'blob %d\0' % len(target) + target).digest()
+
+    sha = hashlib.sha1(b'blob %d\0' % st.st_size)
+    with open(str(path), 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def content_blob_id(path: Path, st: os.stat_result) -> bytes:
+    """
+    :return: the blob id the child repo stores for a file,
+     which is the id of its pointer for files kept in the chunk store
+    """
+    # Only loaded once a file has to be hashed, checking stat data (e.g. `et prompt`) doesn't need it
+    import hashlib
+
+    # The size check of store.is_large, the hooks decide whether to commit without loading the store
+    if stat.S_ISREG(st.st_mode) and st.st_size >= config.LARGE_FILE_THRESHOLD:
+        import store
+
+        pointer = store.store_file(path, write=False)
+        return hashlib.sha1(b'blob %d\0' % len(pointer) + pointer).digest()
+    return hash_blob(path, st)
+
+
+def get_changed_paths(repo: 'Repo', refresh: bool = True) -> List[str]:
+    """
+    Finds tracked paths whose content differs from the index, without spawning git.
+
+    Only files whose stat data no longer matches their index entry are hashed.
+    With refresh, entries that turned out to be unchanged get their stat data
+    updated so the next check can skip hashing them, like `git update-index --refresh`.
+
+    :return: relative paths that were modified, deleted or changed type
+    """
+    index = repo.index
+    working_dir = Path(repo.working_dir)
+    try:
+        index_mtime_ns = os.stat(index.path).st_mtime_ns
+    except FileNotFoundError:
+        return []
+
+    changed = []
+    unchanged = []
+    for (path, stage), entry in index.entries.items():
+        full_path = working_dir / path
+        try:
+            st = os.lstat(str(full_path))
+        except FileNotFoundError:
+            changed.append(path)
+            continue
+
+        if stat_matches(entry, st, index_mtime_ns):
+            continue
+
+        if stat.S_ISDIR(st.st_mode) or entry.mode != index_mode(st) or content_blob_id(full_path, st) != entry.binsha:
+            changed.append(path)
+        else:
+            unchanged.append(path)
+
+    if refresh and unchanged:
+        # Refreshing stat data doesn't stage anything, whatever was known about staged changes still holds
+        git_dir = Path(repo.git_dir)
+        staged = has_staged_changes(git_dir)
+        from tracing import span
+
+        refresh_entries(index, unchanged)
+        with span('index.write', repo=working_dir):
+            index.write()
+        if staged is not None:
+            save_staged_state(git_dir, staged)
+
+    return changed
+
+
+def _file_key(path: Path) -> Optional[list]:
+    try:
+        st = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def read_head_commit(git_dir: Path) -> Optional[str]:
+    """
+    :return: the hex id of the HEAD commit, None on an unborn branch
+    """
+    head = (git_dir / 'HEAD').read_text().strip()
+    if not head.startswith('ref: '):
+        return head
+    ref = head[len('ref: '):]
+    try:
+        return (git_dir / ref).read_text().strip()
+    except FileNotFoundError:
+        pass
+    try:
+        with (git_dir / 'packed-refs').open() as f:
+            for line in f:
+                if line.rstrip('\n').endswith(' ' + ref):
+                    return line.split(' ', 1)[0]
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _staged_key(git_dir: Path) -> list:
+    return [_file_key(git_dir / 'index'), read_head_commit(git_dir)]
+
+
+def has_staged_changes(git_dir: Path) -> Optional[bool]:
+    """
+    Whether index entries differ from HEAD, answered without reading any tree.
+    The answer is remembered by the last commit or full comparison, for that
+    same index and HEAD commit. Adding files or moving HEAD, even with
+    `git reset --soft`, makes it unknown again.
+
+    :return: None if only comparing the index with the HEAD tree can tell
+    """
+    try:
+        with (git_dir / STAGED_MARKER_NAME).open() as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return marker['staged'] if marker.get('key') == _staged_key(git_dir) else None
+
+
+def get_staged_paths(repo: 'Repo', save: bool = True) -> List[str]:
+    """
+    Finds index entries that differ from HEAD, comparing the HEAD tree only when has_staged_changes can't tell
+
+    :param save: remember the answer for has_staged_changes while the index and HEAD are unchanged
+    :return: relative paths that were added, modified or removed in the index
+    """
+    git_dir = Path(repo.git_dir)
+    key = _staged_key(git_dir)
+    if has_staged_changes(git_dir) is False:
+        return []
+
+    entries = {path: (entry.binsha, entry.mode) for (path, stage), entry in repo.index.entries.items()}
+    try:
+        tree = repo.head.commit.tree
+    except ValueError:
+        # No commit yet, everything in the index is new
+        head = {}
+    else:
+        head = {item.path: (item.binsha, item.mode) for item in tree.traverse() if item.type == 'blob'}
+    staged = sorted(path for path in entries.keys() | head.keys() if entries.get(path) != head.get(path))
+
+    if save:
+        save_staged_state(git_dir, bool(staged), key)
+    return staged
+
+
+def save_staged_state(git_dir: Path, staged: bool, key: Optional[list] = None):
+    """
+    Records whether the index has staged changes, e.g. none right after a commit
+
+    :param key: the index and HEAD as they were when staged was found, defaults to the current ones
+    """
+    marker_path = git_dir / STAGED_MARKER_NAME
+    tmp_path = marker_path.with_name(f'{STAGED_MARKER_NAME}.{os.getpid()}.tmp')
+    try:
+        with tmp_path.open('w') as f:
+            json.dump({'key': key or _staged_key(git_dir), 'staged': staged}, f)
+        os.replace(str(tmp_path), str(marker_path))
+    except OSError:
+        # Only a cache, the next check compares the trees again
+        pass
+
+
+def refresh_entries(index: 'IndexFile', paths: Iterable[str]):
+    """
+    Records the current stat data of paths in their index entries.
+    GitPython writes zeroed stat data when adding files, which would force
+    every later check to hash them. Call index.write() afterwards.
+    """
+    from git import IndexEntry
+
+    working_dir = Path(index.repo.working_dir)
+    for path in paths:
+        key = (path, 0)
+        entry = index.entries[key]
+        st = os.lstat(str(working_dir / path))
+        index.entries[key] = IndexEntry((
+            entry.mode, entry.binsha, entry.flags, entry.path,
+            pack('>LL', int(st.st_ctime_ns // 10 ** 9) & MASK_32, st.st_ctime_ns % 10 ** 9),
+            pack('>LL', int(st.st_mtime_ns // 10 ** 9) & MASK_32, st.st_mtime_ns % 10 ** 9),
+            st.st_dev & MASK_32, st.st_ino & MASK_32, st.st_uid & MASK_32, st.st_gid & MASK_32,
+            st.st_size & MASK_32,
+        ))
+
+
+def iter_index_entries(index_path: Path) -> Iterator[IndexStatEntry]:
+    """
+    Minimal reader for version 2 and 3 git index files that does not need GitPython.
+    The header is checked immediately, the stage 0 entries are then yielded lazily in index (path) order.
+
+    :raises ValueError: if the index uses a format this reader does not understand
+    """
+    with open(str(index_path), 'rb') as f:
+        data = f.read()
+
+    if data[:4] != b'DIRC':
+        raise ValueError(f'"{index_path}" is not a git index')
+    version, count = unpack_from('>LL', data, 4)
+    if version not in (2, 3):
+        raise ValueError(f'Unsupported index version {version}')
+
+    return _iter_entries(data, count)
+
+
+def _iter_entries(data: bytes, count: int) -> Iterator[IndexStatEntry]:
+    offset = 12
+    for _ in range(count):
+        (ctime_s, ctime_ns, mtime_s, mtime_ns, dev, inode, mode, uid, gid, size, binsha,
+         flags) = unpack_from('>10L20sH', data, offset)
+        header_size = 62
+        if flags & 0x4000:
+            # Extended flags, only in version 3
+            header_size += 2
+        path_end = data.index(b'\0', offset + header_size)
+        path = data[offset + header_size:path_end].decode('utf-8', 'surrogateescape')
+        if not (flags >> 12) & 0x3:
+            yield IndexStatEntry(path, mode, binsha, size, inode, (mtime_s, mtime_ns))
+        # Entries are padded with 1-8 NUL bytes to a multiple of 8
+        offset += (path_end - offset + 8) & ~7
+
+
+def read_index_entries(index_path: Path) -> Optional[List[IndexStatEntry]]:
+    """
+    :return: the stage 0 entries, or None if the index uses
+     a format iter_index_entries does not understand
+    """
+    try:
+        return list(iter_index_entries(index_path))
+    except ValueError:
+        return None
+
+
+def has_changes(working_dir: Path, index_path: Path) -> bool:
+    """
+    Fast dirty check for hooks and prompts: reads the index without GitPython,
+    never writes it, and stops at the first changed path.
+    When the index can't be read the answer is True, so callers fall back to a full check.
+    """
+    try:
+        index_mtime_ns = os.stat(str(index_path)).st_mtime_ns
+        entries = read_index_entries(index_path)
+    except FileNotFoundError:
+        return False
+    if entries is None:
+        return True
+
+    for entry in entries:
+        full_path = working_dir / entry.path
+        try:
+            st = os.lstat(str(full_path))
+        except FileNotFoundError:
+            return True
+        if entry.mode != index_mode(st) or stat.S_ISDIR(st.st_mode):
+            return True
+        if not stat_matches(entry, st, index_mtime_ns) and content_blob_id(full_path, st) != entry.binsha:
+            return True
+    return False
@@ -1,34 +1,87 @@
+import json
+import logging
+import os
+import shutil
+import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import click
-from git import Repo
-from git.exc import InvalidGitRepositoryError
 
 from logger import logger
 from config import config
-from utils import PairedObject, PairedProject, get_current_project, PathType
+from discovery import discover
+from exceptions import NotInRepository
+from project_index import ProjectIndex, iter_child_dirs
+from storage import BACKEND_NAMES, get_backend_class
+from utils import PairedObject, PairedProject, get_current_project, PathType, close_repo, close_repos, \
+    expand_paths, get_all_statuses, get_relative_path, open_repo, read_path_list
+
+DEFAULT_JOBS = min(32, (os.cpu_count() or 1) * 4)
 
 
 @click.group()
 @click.option('-v', '--verbose', is_flag=True, help='Enables verbose messaging')
+@click.option('--trace', type=click.Path(dir_okay=False), envvar='ET_TRACE',
+              help='Write a Chrome trace of command phases and git calls to this file (or set ET_TRACE)')
 @click.pass_context
-def et(ctx: click.core.Context, verbose: bool):
+def et(ctx: click.core.Context, verbose: bool, trace: str):
     """
     Primary top-level group command.
     Calling directly with no parameters will display help.
     """
-    ctx.obj = {}
+    ctx.ensure_object(dict)
     ctx.obj['verbose'] = verbose
+    if verbose:
+        logger.setLevel(logging.INFO)
+    if trace:
+        import tracing
+        tracing.enable(trace)
+        ctx.call_on_close(report_trace)
+    if not ctx.obj.get('keep_repos_open'):
+        ctx.call_on_close(close_repos)
+
+
+def report_trace():
+    """
+    Logs the per-phase totals (visible with --verbose) and writes the trace file
+    """
+    import tracing
+
+    for name, total in sorted(tracing.summary().items(), key=lambda item: -item[1]['total_ms']):
+        logger.info(f'trace: {name}: {total["count"]} in {total["total_ms"]:.1f} ms')
+    tracing.dump()
 
 
 @et.command('init', short_help='Initialize a new Env Tracker repository')
 @click.argument('directory', default='.',
                 type=PathType(exists=True, file_okay=False, dir_okay=True, resolve_path=True, allow_dash=False))
 @click.option('-n', '--name', type=click.STRING)
-def cmd_init(directory: Path, name: str):
+@click.option('--shared', is_flag=True, help='Store objects in the object database shared by all projects')
+@click.option('-t', '--template', type=click.STRING,
+              help='Start from the history of another project, without copying it. Implies --shared')
+@click.option('--scan', type=PathType(exists=True, file_okay=False, dir_okay=True, resolve_path=True),
+              help='Initialize every git repository found under this directory instead of DIRECTORY')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=DEFAULT_JOBS, show_default=True,
+              help='Maximum number of repositories initialized at the same time by --scan')
+@click.option('-b', '--backend', type=click.Choice(BACKEND_NAMES), default='git', show_default=True,
+              help='How versions of tracked files are stored, "snapshot" keeps them without git')
+def cmd_init(directory: Path, name: str, shared: bool, template: str, scan: Path, jobs: int, backend: str):
     """
-    Create an empty Git repository that points to an existing repository
+    Create an empty Git repository that points to an existing repository.
+
+    With --backend snapshot, versions are kept in an append-only snapshot store
+    instead, which links, commits and checks status without running git.
     """
+    if backend != 'git' and (shared or template):
+        raise click.BadParameter(f'Can not be used with --backend {backend}', param_hint=['shared', 'template'])
+
+    if scan is not None:
+        if name or template:
+            raise click.BadParameter('Can not be used with --scan', param_hint=['name', 'template'])
+        init_scanned(scan, shared, jobs, backend)
+        return
+
     try:
         existing_project = PairedProject.from_path(directory)
     except Exception:
@@ -38,6 +91,9 @@ def cmd_init(directory: Path, name: str):
             f'Conflict: specified directory is already linked to {str(existing_project.child_dir)}',
             param_hint='DIRECTORY')
 
+    from git import Repo
+    from git.exc import InvalidGitRepositoryError
+
     ## Validate parameters and set defaults
     try:
         repo = Repo(directory, search_parent_directories=False)
@@ -61,9 +117,22 @@ def cmd_init(directory: Path, name: str):
     child_path: Path = Path(config.ET_HOME) / name
     to_parent_symlink: Path = child_path / config.PARENT_SYMLINK_NAME
 
-    ## Attempt to create the child directory
+    if template:
+        template_path = Path(config.ET_HOME) / template
+        if Path(template).name != template or not template_path.joinpath(config.PARENT_SYMLINK_NAME).is_symlink():
+            raise click.BadParameter(f'"{template}" is not a project in "{config.ET_HOME}"', param_hint=['template'])
+
+        from snapshot import is_snapshot_dir
+        if is_snapshot_dir(template_path):
+            raise click.BadParameter(f'"{template}" uses the snapshot backend, only git projects can be templates',
+                                     param_hint=['template'])
+
+    # Load before creating the child dir so a fresh index can be updated in place
+    index = ProjectIndex.load()
+
+    ## Attempt to create the child directory and repo
     try:
-        child_path.mkdir(parents=True)
+        create_child_repo(parent_path, child_path, shared, template_path if template else None, backend)
     except FileExistsError:
         if to_parent_symlink.exists():
             raise click.BadParameter(
@@ -72,25 +141,128 @@ def cmd_init(directory: Path, name: str):
         else:
             raise click.BadParameter(f'Path "{child_path}" already exists', param_hint=['name'])
 
-    ## Initialize the child repo
-    repo = Repo.init(child_path)
-    to_parent_symlink.symlink_to(parent_path)
-
-    repo.index.add([config.PARENT_SYMLINK_NAME])
-    repo.index.commit('Link project to parent directory')
+    index.add(parent_path, child_path)
+    index.save()
 
     click.echo(f'Installed new project "{name}", linking "{child_path}" -> "{parent_path}"')
+    if template:
+        click.echo(f'Run `et doctor --repair` in "{parent_path}" to link the files from "{template}"')
+
 
+def init_scanned(root: Path, shared: bool, jobs: int, backend: str = 'git'):
+    """
+    Initializes a project for every repository under root that isn't tracked yet,
+    and updates the project index once at the end
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from scan import assign_names, find_repos
+
+    index = ProjectIndex.load()
+    repos = [repo for repo in find_repos(root) if index.get(repo) is None]
+    if not repos:
+        click.echo(f'No untracked git repositories found under "{root}"')
+        return
+
+    et_home = Path(config.ET_HOME)
+    taken = {path.name for path in et_home.iterdir()} if et_home.exists() else set()
+    names = assign_names(repos, taken)
+
+    def init_repo(repo: Path) -> float:
+        start = time.perf_counter()
+        create_child_repo(repo.resolve(), et_home / names[repo], shared, backend_name=backend)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(init_repo, repo): repo for repo in repos}
+        for future in as_completed(futures):
+            repo = futures[future]
+            try:
+                elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                click.echo(f'Could not initialize "{repo}": {e}', err=True)
+                continue
+            index.add(repo, et_home / names[repo])
+            click.echo(f'Installed "{names[repo]}" -> "{repo}" in {elapsed * 1000:.0f} ms')
+
+    index.save()
+    click.echo(f'Initialized {len(repos) - failed} projects in {time.perf_counter() - start:.2f} s')
+    if failed:
+        raise click.ClickException(f'{failed} repositories could not be initialized')
+
+
+def create_child_repo(parent_path: Path, child_path: Path, shared: bool, template_path: Optional[Path] = None,
+                      backend_name: str = 'git'):
+    """
+    Creates the child dir and its storage backend, with a first commit of the link to the parent dir.
+    The project index is left to the caller. Sharing objects and templates require the git backend.
 
-@et.command('link', short_help='Link a file or directory')
-@click.argument('file', type=PathType(exists=True, file_okay=True, dir_okay=True, allow_dash=False, writable=True,
-                                      readable=True, resolve_path=False))
-def cmd_link(file: Path):
+    :raises FileExistsError: if the child dir already exists
     """
-    Tracks a file in the parent repo.
+    to_parent_symlink = child_path / config.PARENT_SYMLINK_NAME
+    child_path.mkdir(parents=True)
 
-    Moves the specified file to the child repository and symlinks the file back to
-    its original location.
+    try:
+        backend = get_backend_class(backend_name).init(child_path)
+        if shared or template_path:
+            import shared_objects
+            shared_objects.attach(child_path)
+        if template_path:
+            start_from_template(backend.repo, template_path)
+            # The template's checkout brought its own link to its parent dir
+            to_parent_symlink.unlink()
+        to_parent_symlink.symlink_to(parent_path)
+
+        backend.add([config.PARENT_SYMLINK_NAME])
+        backend.commit('Link project to parent directory')
+    except Exception:
+        # A half created child dir would block running init again
+        close_repo(child_path)
+        shutil.rmtree(str(child_path))
+        raise
+
+
+def start_from_template(repo, template_path: Path):
+    """
+    Points a new child repo at the latest commit of another project and checks it out.
+    The template's objects are moved to the shared store first, so no history is copied.
+    """
+    import shared_objects
+    import store
+
+    shared_objects.share_objects(template_path)
+
+    template_repo = open_repo(template_path)
+    attributes = template_path / '.git' / 'info' / 'attributes'
+    if attributes.exists():
+        # Large files are committed as pointers, the checkout needs the same filter
+        Path(repo.git_dir, 'info').mkdir(exist_ok=True)
+        shutil.copy2(str(attributes), str(Path(repo.git_dir, 'info', 'attributes')))
+        store.configure_repo(Path(repo.working_dir))
+
+    repo.git.update_ref('HEAD', template_repo.head.commit.hexsha)
+    repo.git.reset('--hard')
+
+
+LINKABLE_PATH = PathType(exists=True, file_okay=True, dir_okay=True, allow_dash=False, writable=True,
+                         readable=True, resolve_path=False)
+
+
+@et.command('link', short_help='Link files or directories')
+@click.argument('files', nargs=-1, type=click.STRING)
+@click.option('-f', '--from-file', type=click.File('r'),
+              help='Read additional paths from a file, one per line. Use "-" for stdin')
+def cmd_link(files: Tuple[str], from_file):
+    """
+    Tracks files in the parent repo.
+
+    Moves the specified files to the child repository and symlinks them back to
+    their original location. FILES may contain glob patterns. All of the paths
+    are linked in a single commit.
 
     Validations:
     - path exists
@@ -98,61 +270,446 @@ def cmd_link(file: Path):
     - path does not exist under the child dir
     - parent path is not a symlink
     """
-    # We check for symlink here because we resolve the file path to init the project
-
-    obj_pair = PairedObject.from_path(file)
-    if obj_pair.is_linked:
-        raise click.BadParameter(f'Path "{obj_pair.relative_path}" is already linked')
-
-    if obj_pair.parent_path.is_symlink():
-        raise click.BadParameter(f'Path "{file}" is already a symlink', param_hint=['file'])
+    obj_pairs = get_paired_objects(files, from_file, LINKABLE_PATH)
 
-    if not obj_pair.working_from_parent:
-        raise click.BadParameter(f'Path "{file}" not found under "{obj_pair.project.parent_dir}"',
-                                 param_hint=['file'])
+    # Validate everything before touching the filesystem
+    for obj_pair in obj_pairs:
+        # We check for symlink here because we resolve the file path to init the project
+        if obj_pair.is_linked:
+            raise click.BadParameter(f'Path "{obj_pair.relative_path}" is already linked')
 
-    if obj_pair.child_path.exists():
-        raise click.BadParameter(f'Destination path "{obj_pair.child_path}" already exists', param_hint=['file'])
+        if obj_pair.parent_path.is_symlink():
+            raise click.BadParameter(f'Path "{obj_pair.parent_path}" is already a symlink', param_hint=['files'])
 
-    obj_pair.link()
+        if not obj_pair.working_from_parent:
+            raise click.BadParameter(f'Path "{obj_pair.child_path}" not found under "{obj_pair.project.parent_dir}"',
+                                     param_hint=['files'])
 
-    # commit the new file
-    child_repo = obj_pair.project.child_repo
-    child_repo.index.add([str(obj_pair.relative_path)])
-    child_repo.index.commit(f'Initialize tracking for "{obj_pair.relative_path}"')
+        if obj_pair.child_path.exists():
+            raise click.BadParameter(f'Destination path "{obj_pair.child_path}" already exists',
+                                     param_hint=['files'])
 
+    warn_parent_status(obj_pairs)
 
-@et.command('unlink', short_help='Stop tracking a file or directory')
-@click.argument('file', type=PathType(exists=True, file_okay=True, dir_okay=True, allow_dash=False, writable=True,
-                                      readable=True, resolve_path=False))
-def cmd_unlink(file: Path):
+    linked = []
+    try:
+        for obj_pair in obj_pairs:
+            obj_pair.link(progress=copy_progress(f'Moving "{obj_pair.relative_path}"'))
+            linked.append(obj_pair)
+    except Exception:
+        # Leave the parent dir the way we found it
+        for obj_pair in reversed(linked):
+            obj_pair.unlink()
+        raise
+
+    # commit the new files
+    relative_paths = [obj_pair.relative_path.as_posix() for obj_pair in obj_pairs]
+    backend = obj_pairs[0].project.backend
+    backend.add(relative_paths)
+    backend.commit(commit_message('Initialize tracking for', relative_paths))
+
+
+@et.command('unlink', short_help='Stop tracking files or directories')
+@click.argument('files', nargs=-1, type=click.STRING)
+@click.option('-f', '--from-file', type=click.File('r'),
+              help='Read additional paths from a file, one per line. Use "-" for stdin')
+def cmd_unlink(files: Tuple[str], from_file):
     """
-    Unlinks a tracked file by reverting the changes made by the `link` command
+    Unlinks tracked files by reverting the changes made by the `link` command.
+    FILES may contain glob patterns. All of the paths are unlinked in a single commit.
 
     TODO: add an `--all` option to unlink all objects
     """
     ## Validate parameters and set defaults
-    obj_pair = PairedObject.from_path(file)
+    obj_pairs = get_paired_objects(files, from_file, LINKABLE_PATH)
 
-    if not obj_pair.is_linked:
-        raise click.BadParameter('File is not linked', param_hint=['file'])
+    for obj_pair in obj_pairs:
+        if not obj_pair.is_linked:
+            raise click.BadParameter(f'Path "{obj_pair.relative_path}" is not linked', param_hint=['files'])
 
     ## Unlink files
-    obj_pair.unlink()
+    unlinked = []
+    try:
+        for obj_pair in obj_pairs:
+            obj_pair.unlink(progress=copy_progress(f'Moving "{obj_pair.relative_path}"'))
+            unlinked.append(obj_pair)
+    except Exception:
+        # Leave the parent dir the way we found it
+        for obj_pair in reversed(unlinked):
+            obj_pair.link()
+        raise
 
     ## Commit changes
-    child_repo = obj_pair.project.child_repo
-    child_repo.index.remove([str(obj_pair.relative_path)])
-    child_repo.index.commit(f'Stop tracking for "{obj_pair.relative_path}"')
+    relative_paths = [obj_pair.relative_path.as_posix() for obj_pair in obj_pairs]
+    backend = obj_pairs[0].project.backend
+    backend.remove(relative_paths)
+    backend.commit(commit_message('Stop tracking for', relative_paths))
+
+
+def warn_parent_status(obj_pairs: List[PairedObject]):
+    """
+    Warns about paths the parent repository tracks or doesn't ignore, all checked with one read of its index
+    """
+    from parent_status import PathChecker
+
+    checker = PathChecker(obj_pairs[0].project.parent_dir)
+    for obj_pair in obj_pairs:
+        path = obj_pair.relative_path.as_posix()
+        if checker.is_tracked(path):
+            click.echo(f'Warning: "{path}" is tracked by the parent repository, '
+                       f'linking it shows up as a type change there', err=True)
+        # Checked as the symlink it is about to become, dir-only rules don't match it anymore
+        elif not checker.is_ignored(path, is_dir=False):
+            click.echo(f'Warning: "{path}" is not ignored by the parent repository, '
+                       f'its symlink shows up as an untracked file', err=True)
+
+
+def get_paired_objects(files: Tuple[str], from_file, path_type: click.Path) -> List[PairedObject]:
+    """
+    Expands the FILES arguments and --from-file paths into PairedObjects of a single project
+    """
+    patterns = list(files)
+    if from_file is not None:
+        patterns.extend(read_path_list(from_file))
+
+    paths = expand_paths(patterns, path_type)
+    if not paths:
+        raise click.BadParameter('At least one path is required', param_hint=['files'])
+
+    # Every path has to belong to the same project
+    try:
+        projects = PairedProject.from_paths(paths)
+    except NotInRepository as e:
+        raise click.BadParameter(str(e), param_hint=['files'])
+    project = projects[0]
+    if any(other.child_dir != project.child_dir for other in projects):
+        raise click.BadParameter('All paths have to belong to the same project', param_hint=['files'])
+
+    obj_pairs = []
+    for path in paths:
+        try:
+            relative_path = get_relative_path(project, path)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint=['files'])
+        obj_pairs.append(PairedObject(project, relative_path))
+
+    relative_paths = {obj_pair.relative_path for obj_pair in obj_pairs}
+    for obj_pair in obj_pairs:
+        if any(parent in relative_paths for parent in obj_pair.relative_path.parents):
+            raise click.BadParameter(f'Path "{obj_pair.relative_path}" is inside of another given path',
+                                     param_hint=['files'])
+
+    return obj_pairs
+
+
+def copy_progress(label: str):
+    """
+    Progress callback for moves that have to copy across filesystems, writes to stderr
+    """
+    last_percent = [-1]
+
+    def report(copied: int, total: int):
+        percent = copied * 100 // total if total else 100
+        if percent == last_percent[0]:
+            return
+        last_percent[0] = percent
+        click.echo(f'\r{label}: {copied / 2 ** 20:.1f} of {total / 2 ** 20:.1f} MiB ({percent}%)', nl=False, err=True)
+        if copied >= total:
+            click.echo(err=True)
+
+    return report
+
+
+def commit_message(action: str, relative_paths: List[str]) -> str:
+    if len(relative_paths) == 1:
+        return f'{action} "{relative_paths[0]}"'
+    listing = '\n'.join(f'- {path}' for path in relative_paths)
+    return f'{action} {len(relative_paths)} paths\n\n{listing}'
 
 
 @et.command('status', short_help='`git status` on the linked repository')
-def cmd_status():
+@click.option('-a', '--all', 'all_projects', is_flag=True, help='Summarize every project in ET_HOME')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=DEFAULT_JOBS, show_default=True,
+              help='Number of projects to check at the same time with --all')
+@click.option('--json', 'as_json', is_flag=True, help='Output the --all summary as JSON')
+def cmd_status(all_projects: bool, jobs: int, as_json: bool):
+    """
+    Shows `git status` for the current project.
+
+    With --all, checks every project in ET_HOME concurrently and
+    lists only the projects that have uncommitted changes.
+    """
+    # The daemon serves status for any caller, it must not write the child indexes
+    refresh = not (click.get_current_context().obj or {}).get('read_only')
+    if all_projects:
+        show_all_statuses(jobs, as_json, refresh)
+        return
+    elif as_json:
+        raise click.BadParameter('--json requires --all', param_hint=['json'])
+
     proj = get_current_project()
-    g = proj.child_repo.git
-    click.echo(click.style(f'Showing git status for "{proj.child_dir}"', fg='red'))
+    click.echo(click.style(f'Showing {proj.backend.name} status for "{proj.child_dir}"', fg='red'))
     click.echo()
-    click.echo(g.status())
+
+    # Skip spawning `git status` when the index stat data shows nothing changed
+    changed = proj.changed_paths(refresh)
+    if not changed:
+        click.echo('Nothing to commit, tracked files are unchanged')
+        return
+
+    if proj.backend.name != 'git':
+        for path in changed:
+            state = 'modified' if os.path.lexists(str(proj.child_dir / path)) else 'deleted'
+            click.echo(f'    {state + ":":<12}{path}')
+        return
+
+    # Without refreshing the index, which would forget what get_staged_paths found
+    status, stdout, stderr = proj.child_repo.git.execute(['git', '--no-optional-locks', 'status'],
+                                                         with_extended_output=True, with_exceptions=False)
+    if status:
+        # e.g. the large file filter failing, git's own message says why
+        raise click.ClickException(f'git status failed in "{proj.child_dir}":\n{stderr}')
+    click.echo(stdout)
+
+
+def show_all_statuses(jobs: int, as_json: bool, refresh: bool = True):
+    statuses = get_all_statuses(jobs, refresh)
+
+    if as_json:
+        click.echo(json.dumps(statuses, indent=2))
+        return
+
+    dirty = [status for status in statuses if status['dirty'] or 'error' in status]
+    for status in dirty:
+        if 'error' in status:
+            click.echo(click.style(f'{status["name"]}: error: {status["error"]}', fg='red'))
+            continue
+        click.echo(click.style(f'{status["name"]}', fg='yellow') + f' ({status["parent_dir"]})')
+        for change in status['changes']:
+            click.echo(f'    {change}')
+
+    click.echo(f'{len(dirty)} of {len(statuses)} projects have uncommitted changes')
+
+
+@et.command('list', short_help='List tracked files')
+@click.option('-a', '--all', 'all_projects', is_flag=True, help='List tracked files of every project in ET_HOME')
+@click.option('--json', 'as_json', is_flag=True, help='Output one JSON object per line')
+def cmd_list(all_projects: bool, as_json: bool):
+    """
+    Lists the files tracked in the linked repository, read from its index.
+    Output is streamed, one path per line.
+    """
+    if all_projects:
+        projects = (PairedProject.from_child_dir(child_dir) for child_dir in iter_child_dirs())
+    else:
+        projects = [get_current_project()]
+
+    for proj in projects:
+        for path in proj.iter_tracked_paths():
+            if as_json:
+                click.echo(json.dumps({
+                    'project': proj.child_dir.name,
+                    'path': path,
+                    'parent_path': str(proj.parent_dir / path),
+                    'child_path': str(proj.child_dir / path),
+                }))
+            elif all_projects:
+                click.echo(f'{proj.child_dir.name}\t{path}')
+            else:
+                click.echo(path)
+        # Each project's output shows up right away when piped
+        sys.stdout.flush()
+
+
+@et.command('doctor', short_help='Find and repair broken links')
+@click.option('-a', '--all', 'all_projects', is_flag=True, help='Check every project in ET_HOME')
+@click.option('-r', '--repair', is_flag=True, help='Repair the problems that can be fixed without losing data')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=DEFAULT_JOBS, show_default=True,
+              help='Number of projects to check at the same time with --all')
+def cmd_doctor(all_projects: bool, repair: bool, jobs: int):
+    """
+    Verifies that every tracked object is still symlinked from the parent
+    directory to the linked directory. Exits with an error if problems remain.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import doctor
+
+    if all_projects:
+        projects = [PairedProject.from_child_dir(child_dir) for child_dir in iter_child_dirs()]
+    else:
+        projects = [get_current_project()]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        problems = [problem for project_problems in executor.map(doctor.check_project, projects)
+                    for problem in project_problems]
+
+    remaining = 0
+    for problem in problems:
+        location = f'{problem.project.child_dir.name}: {problem.relative_path}'
+        if repair and doctor.repair(problem):
+            click.echo(click.style('repaired ', fg='green') + f'{problem.kind:<15}{location}')
+        else:
+            remaining += 1
+            click.echo(click.style('problem  ', fg='red') + f'{problem.kind:<15}{location}')
+
+    click.echo(f'Checked {len(projects)} projects, {remaining} problems remaining')
+    if remaining:
+        sys.exit(1)
+
+
+@et.command('gc', short_help='Pack and prune the repositories of every project')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=max(1, (os.cpu_count() or 1) // 2),
+              show_default=True, help='Number of projects to gc at the same time')
+@click.option('--threshold', type=click.IntRange(min=0), default=1024, show_default=True,
+              help='Skip repositories with fewer (estimated) loose objects')
+@click.option('--budget', type=click.FloatRange(min=0), default=None,
+              help='Stop starting new projects after this many seconds')
+def cmd_gc(jobs: int, threshold: int, budget: float):
+    """
+    Runs `git gc` on every project in ET_HOME in a pool of low priority processes,
+    most loose objects first. Safe to run from cron: with --budget, projects that
+    did not fit are picked up by the next run.
+    """
+    import maintenance
+    from snapshot import is_snapshot_dir
+
+    counts = {}
+    child_dirs = [child_dir for child_dir in iter_child_dirs() if not is_snapshot_dir(child_dir)]
+    for result in maintenance.run_gc(child_dirs, jobs, threshold, budget):
+        counts[result['action']] = counts.get(result['action'], 0) + 1
+        if result['action'] == 'error':
+            click.echo(click.style(f'{result["name"]}: {result["error"]}', fg='red'), err=True)
+        elif result['action'] not in ('skipped', 'out-of-time'):
+            click.echo(f'{result["name"]}: {result["action"]} in {result["seconds"]:.2f}s')
+
+    click.echo(', '.join(f'{count} {action}' for action, count in sorted(counts.items())) or 'No projects')
+
+
+@et.command('export', short_help='Back up the history of every project to an archive')
+@click.argument('archive', type=click.File('wb'))
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=DEFAULT_JOBS, show_default=True,
+              help='Number of projects to bundle at the same time')
+@click.option('--full', is_flag=True, help='Include the whole history instead of what changed since the last export')
+def cmd_export(archive, jobs: int, full: bool):
+    """
+    Writes a compressed archive with a git bundle per project, holding only the
+    commits made since the previous export unless --full is given. ARCHIVE may be "-" for stdout.
+    Incremental archives have to be imported in the order they were exported.
+    Projects using the snapshot backend are skipped, back up their child dirs as they are.
+    """
+    import backup
+    from snapshot import is_snapshot_dir
+
+    child_dirs = []
+    for child_dir in iter_child_dirs():
+        if is_snapshot_dir(child_dir):
+            click.echo(f'{child_dir.name}: skipped, not a git project', err=True)
+        else:
+            child_dirs.append(child_dir)
+
+    failed = show_backup_results(backup.export_archive(archive, child_dirs, jobs, full))
+    if failed:
+        sys.exit(1)
+
+
+@et.command('import', short_help='Restore projects from an archive written by `et export`')
+@click.argument('archive', type=click.File('rb'))
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=DEFAULT_JOBS, show_default=True,
+              help='Number of projects to restore at the same time')
+def cmd_import(archive, jobs: int):
+    """
+    Applies every bundle of an archive to its project, creating missing projects,
+    and symlinks the tracked files back into their parent dirs. ARCHIVE may be "-" for stdin.
+    """
+    import tarfile
+
+    import backup
+
+    try:
+        failed = show_backup_results(backup.import_archive(archive, jobs))
+    except (ValueError, tarfile.TarError) as e:
+        raise click.BadParameter(str(e), param_hint=['archive'])
+    if failed:
+        sys.exit(1)
+
+
+def show_backup_results(results) -> int:
+    """
+    Prints export/import results to stderr, so an archive can be streamed on stdout
+
+    :return: the number of projects that failed
+    """
+    counts = {}
+    for result in results:
+        counts[result['action']] = counts.get(result['action'], 0) + 1
+        if result['action'] == 'error':
+            click.echo(click.style(f'{result["name"]}: {result["error"]}', fg='red'), err=True)
+        elif result['action'] != 'unchanged':
+            relinked = f', {result["relinked"]} symlinks restored' if result.get('relinked') else ''
+            click.echo(f'{result["name"]}: {result["action"]}{relinked}', err=True)
+
+    click.echo(', '.join(f'{count} {action}' for action, count in sorted(counts.items())) or 'No projects', err=True)
+    return counts.get('error', 0)
+
+
+@et.command('compact', short_help='Thin out old commits of the linked repository')
+@click.option('-a', '--all', 'all_projects', is_flag=True, help='Compact every project in ET_HOME')
+@click.option('--keep-all', 'keep_all_days', type=click.IntRange(min=0), default=7, show_default=True,
+              help='Keep every commit younger than this many days')
+@click.option('--daily', 'daily_days', type=click.IntRange(min=0), default=365, show_default=True,
+              help='Keep one commit per day up to this age in days, one per month after that')
+@click.option('-n', '--dry-run', is_flag=True, help='Only report how many commits would be kept')
+@click.option('--no-reclaim', is_flag=True, help='Leave the dropped commits for a later `git gc`')
+def cmd_compact(all_projects: bool, keep_all_days: int, daily_days: int, dry_run: bool, no_reclaim: bool):
+    """
+    Squashes the history of the linked repository according to a retention policy.
+    The current version of every tracked file is left untouched, and chunks of large
+    files only the dropped commits referred to are deleted from the store.
+    """
+    import store
+    from retention import RetentionPolicy, compact, reclaim_space
+    from snapshot import is_snapshot_dir
+
+    if all_projects:
+        projects = [PairedProject.from_child_dir(child_dir) for child_dir in iter_child_dirs()
+                    if not is_snapshot_dir(child_dir)]
+    else:
+        projects = [get_current_project()]
+        if projects[0].backend.name != 'git':
+            raise click.ClickException('Snapshot histories are append-only and can not be compacted')
+
+    policy = RetentionPolicy(keep_all_days=keep_all_days, daily_days=max(daily_days, keep_all_days))
+    reclaimed = False
+    for proj in projects:
+        repo = proj.child_repo
+        result = compact(repo, policy, dry_run=dry_run)
+        if result.before != result.after and not (dry_run or no_reclaim):
+            reclaim_space(repo)
+            reclaimed = True
+        verb = 'would keep' if dry_run else 'kept'
+        click.echo(f'{proj.child_dir.name}: {verb} {result.after} of {result.before} commits')
+        proj.close()
+
+    if reclaimed and store.store_dir().is_dir():
+        # The store is shared, a chunk can only go once no project refers to it
+        removed = store.sweep(child_dir for child_dir in iter_child_dirs() if not is_snapshot_dir(child_dir))
+        click.echo(f'Deleted {removed} unreferenced chunks from the store')
+
+
+@et.command('log', short_help='Show the history of the linked directory')
+@click.option('-n', '--max-count', type=click.IntRange(min=1), default=None, help='Show at most this many commits')
+def cmd_log(max_count: Optional[int]):
+    """
+    Lists the commits of the linked directory, newest first, for either storage backend
+    """
+    import time
+
+    proj = get_current_project()
+    for revision in proj.backend.history()[:max_count]:
+        date = time.strftime('%Y-%m-%d %H:%M', time.localtime(revision.time))
+        summary = revision.message.partition('\n')[0]
+        click.echo(click.style(revision.id[:12], fg='yellow') + f' {date} {summary}')
 
 
 @et.command('other', short_help='Output the linked repository directory')
@@ -171,12 +728,197 @@ def cmd_other():
     click.echo(other_dir)
 
 
+@et.command('prompt', short_help='Print clean, dirty or unknown for shell prompts')
+@click.option('--budget', type=click.FloatRange(min=0), default=5.0, show_default=True,
+              envvar='ET_PROMPT_BUDGET_MS', help='Milliseconds to spend before giving up with "unknown"')
+def cmd_prompt(budget: float):
+    """
+    Prints whether tracked files of the current project have uncommitted changes,
+    without loading GitPython. Prints nothing and exits with 1 outside of a tracked project.
+    The `et` executable answers this command without loading click either.
+    """
+    import prompt
+
+    status = prompt.get_status(Path.cwd(), budget)
+    if status is None:
+        sys.exit(1)
+    click.echo(status)
+
+
+@et.command('filter', hidden=True, context_settings={'ignore_unknown_options': True})
+@click.argument('args', nargs=-1, type=click.UNPROCESSED)
+def cmd_filter(args: Tuple[str]):
+    """
+    Clean/smudge filter git runs for large files, see store.py.
+    The `et` executable answers this command without loading click.
+    """
+    import store
+
+    sys.exit(store.main(list(args)))
+
+
 @et.command('commit', short_help='Commit all changes to the linked directory')
 @click.option('-m', '--message', type=click.STRING, default='Saving changes')
 def cmd_commit(message):
     """
-    Commits all changes to the linked repository using `git add -u`
+    Commits all changes to tracked files in the linked repository, like `git add -u`
     """
     proj = get_current_project()
-    proj.child_repo.git.add(update=True)  # git add -u
-    proj.child_repo.index.commit(message)
+    if not proj.commit_changes(message):
+        click.echo('Nothing to commit')
+
+
+@et.group('hook', short_help='Manage git hooks in the parent repository')
+def grp_hook():
+    """
+    Git hooks that keep the linked repository up to date
+    """
+
+
+@grp_hook.command('install', short_help='Auto-commit tracked files and mirror parent branches')
+@click.option('--background', is_flag=True, help='Commit tracked files from a detached process')
+@click.option('--force', is_flag=True, help='Replace an existing hook that was not installed by et')
+def cmd_hook_install(background: bool, force: bool):
+    """
+    Installs hooks in the parent repository. The post-commit hook commits changes
+    to tracked files, using the branch name and commit message of the parent commit.
+    The post-checkout hook switches the child repo to a branch of the same name,
+    rewriting only the tracked files that differ between the two branches.
+    """
+    import hook
+
+    proj = get_current_project()
+    # Linked worktrees share the hooks of the main repository
+    hooks_dir = discover(proj.parent_dir).common_dir / 'hooks'
+    hooks_dir.mkdir(exist_ok=True)
+
+    for hook_name in hook.HOOK_NAMES:
+        hook_path = hooks_dir / hook_name
+        if hook_path.exists() and hook.HOOK_MARKER not in hook_path.read_text() and not force:
+            raise click.BadParameter(f'Hook "{hook_path}" already exists, use --force to replace it')
+
+    for hook_name in hook.HOOK_NAMES:
+        hook_path = hooks_dir / hook_name
+        hook_path.write_text(hook.hook_script(hook_name, background))
+        hook_path.chmod(0o755)
+        click.echo(f'Installed "{hook_path}"')
+
+
+@grp_hook.command('uninstall', short_help='Remove the hooks installed by et')
+def cmd_hook_uninstall():
+    import hook
+
+    proj = get_current_project()
+    hooks_dir = discover(proj.parent_dir).common_dir / 'hooks'
+
+    for hook_name in hook.HOOK_NAMES:
+        hook_path = hooks_dir / hook_name
+        if hook_path.exists() and hook.HOOK_MARKER in hook_path.read_text():
+            hook_path.unlink()
+            click.echo(f'Removed "{hook_path}"')
+
+
+@et.group('daemon', short_help='Serve commands from a background process')
+def grp_daemon():
+    """
+    A per-user daemon keeps the project index and repos loaded, and the `et`
+    executable forwards the read-only commands (other, status, list) to it.
+    Without a daemon, commands run in-process as usual.
+    """
+
+
+@grp_daemon.command('start', short_help='Start the daemon')
+@click.option('--idle-timeout', type=click.FloatRange(min=1), default=1800, show_default=True,
+              help='Seconds without requests before the daemon exits')
+@click.option('--foreground', is_flag=True, help='Serve from this process instead of a detached one')
+def cmd_daemon_start(idle_timeout: float, foreground: bool):
+    import daemon
+
+    reply = daemon.request({'command': 'ping'})
+    if reply is not None:
+        click.echo(f'Daemon already running in process {reply["pid"]}')
+        return
+
+    if foreground:
+        click.echo(f'Listening on "{daemon.socket_path()}"', err=True)
+        daemon.serve(idle_timeout)
+        return
+
+    import subprocess
+    import time
+
+    args = [sys.executable, str(Path(__file__).resolve()), 'daemon', 'start', '--foreground',
+            '--idle-timeout', str(idle_timeout)]
+    subprocess.Popen(args, start_new_session=True, stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        reply = daemon.request({'command': 'ping'})
+        if reply is not None:
+            click.echo(f'Daemon started in process {reply["pid"]}')
+            return
+        time.sleep(0.1)
+    raise click.ClickException('The daemon did not start')
+
+
+@grp_daemon.command('stop', short_help='Stop the daemon')
+def cmd_daemon_stop():
+    import daemon
+
+    reply = daemon.request({'command': 'stop'})
+    if reply is None:
+        click.echo('Daemon is not running')
+    else:
+        click.echo(f'Stopped daemon in process {reply["pid"]}')
+
+
+@grp_daemon.command('status', short_help='Show whether the daemon is running')
+def cmd_daemon_status():
+    import daemon
+
+    reply = daemon.request({'command': 'ping'})
+    if reply is None:
+        click.echo('Daemon is not running')
+    else:
+        click.echo(f'Daemon running in process {reply["pid"]} on "{daemon.socket_path()}"')
+
+
+@et.command('watch', short_help='Auto-commit tracked files when they change')
+@click.option('-a', '--all', 'all_projects', is_flag=True, help='Watch every project in ET_HOME')
+@click.option('-d', '--debounce', type=click.FloatRange(min=0), default=2.0, show_default=True,
+              help='Seconds without changes before a burst of changes is committed')
+@click.option('--daemon', is_flag=True, help='Keep watching from a detached background process')
+def cmd_watch(all_projects: bool, debounce: float, daemon: bool):
+    """
+    Watches linked directories with inotify and commits each burst
+    of changes to tracked files as a single commit. Linux only.
+    """
+    if all_projects:
+        projects = [PairedProject.from_child_dir(child_dir) for child_dir in iter_child_dirs()]
+    else:
+        projects = [get_current_project()]
+
+    if daemon:
+        import subprocess
+
+        args = [sys.executable, str(Path(__file__).resolve()), 'watch', '--debounce', str(debounce)]
+        if all_projects:
+            args.append('--all')
+        process = subprocess.Popen(args, start_new_session=True, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        click.echo(f'Watching {len(projects)} projects in process {process.pid}')
+        return
+
+    from watch import Watcher
+
+    watcher = Watcher(projects, debounce)
+    click.echo(f'Watching {len(projects)} projects, press Ctrl+C to stop', err=True)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    et()
@@ -0,0 +1,151 @@
+"""
+Maintenance for the child repos in ET_HOME.
+
+Auto-commits leave many small loose objects behind. Projects are gc'd in a
+bounded process pool, most loose objects first, and projects below the
+threshold are skipped. With a time budget no new project is started once the
+budget is spent, so running it from cron repeatedly works through a large
+ET_HOME incrementally.
+"""
+import os
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import shared_objects
+
+# Like `git gc --auto`, estimate the loose object count from a single fan-out directory
+SAMPLE_DIR = '17'
+FAN_OUT = 256
+# Every pack of the shared store is another index to search, fold them into one past this many
+MAX_SHARED_PACKS = 20
+
+
+def estimate_loose_objects(objects_dir: Path) -> int:
+    try:
+        with os.scandir(str(objects_dir / SAMPLE_DIR)) as entries:
+            return sum(1 for _ in entries) * FAN_OUT
+    except FileNotFoundError:
+        return 0
+
+
+def _lower_priority():
+    # Stay out of the way of interactive work on busy hosts
+    os.nice(10)
+
+
+def gc_project(child_dir: str) -> dict:
+    """
+    Runs in a worker process. Shared projects hand their objects to the shared
+    store, other projects get a regular `git gc`.
+    """
+    start = time.monotonic()
+    path = Path(child_dir)
+    if shared_objects.is_shared(path):
+        shared_objects.share_objects(path)
+        action = 'shared'
+    else:
+        subprocess.run(['git', 'gc', '--quiet'], cwd=child_dir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        action = 'gc'
+    return {'name': path.name, 'action': action, 'seconds': time.monotonic() - start}
+
+
+def pack_shared_store(git_dir: str) -> dict:
+    """
+    Packs the loose objects of the shared store. The store has no refs, so instead of
+    a reachability based repack every loose object is packed as is. Nothing is pruned.
+    Once there are more than MAX_SHARED_PACKS packs, they are all consolidated into one.
+
+    :param git_dir: any repo attached to the store, git needs one to run in
+    """
+    start = time.monotonic()
+    objects_dir = shared_objects.shared_objects_dir()
+    object_ids = [f'{entry.parent.name}{entry.name}' for entry in shared_objects.iter_loose_objects(objects_dir)]
+    env = dict(os.environ, GIT_DIR=git_dir, GIT_OBJECT_DIRECTORY=str(objects_dir))
+    subprocess.run(['git', 'pack-objects', '--quiet', str(objects_dir / 'pack' / 'pack')],
+                   input='\n'.join(object_ids).encode(), env=env, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(['git', 'prune-packed', '--quiet'], env=env, check=True)
+
+    action = 'packed'
+    if len(list((objects_dir / 'pack').glob('*.pack'))) > MAX_SHARED_PACKS:
+        consolidate_packs(objects_dir, env)
+        action = 'repacked'
+    return {'name': objects_dir.name, 'action': action, 'seconds': time.monotonic() - start}
+
+
+def consolidate_packs(objects_dir: Path, env: dict):
+    """
+    Writes every object of the store's packs into a single pack, then deletes the old ones.
+    Objects are listed from the pack indexes: `git repack` would only keep what the refs
+    of the repo it runs in reach, and that repo's own objects aren't even in the store.
+    """
+    pack_dir = objects_dir / 'pack'
+    old_packs = [idx for idx in pack_dir.glob('pack-*.idx') if not idx.with_suffix('.keep').exists()]
+    object_ids = {}
+    for idx in old_packs:
+        with idx.open('rb') as f:
+            output = subprocess.run(['git', 'show-index'], stdin=f, stdout=subprocess.PIPE, check=True).stdout
+        # Lines are "<offset> <object id> (<crc>)"
+        object_ids.update(dict.fromkeys(line.split()[1] for line in output.decode().splitlines()))
+
+    new_pack = subprocess.run(['git', 'pack-objects', '--quiet', str(pack_dir / 'pack')],
+                              input='\n'.join(object_ids).encode(), env=env, check=True,
+                              stdout=subprocess.PIPE).stdout.decode().strip()
+    for idx in old_packs:
+        if idx.stem == f'pack-{new_pack}':
+            continue
+        # The index first, a pack without one is never read
+        for suffix in ('.idx', '.bitmap', '.rev', '.pack'):
+            try:
+                idx.with_suffix(suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def run_gc(child_dirs: List[Path], jobs: int, threshold: int, budget: Optional[float]) -> Iterator[dict]:
+    """
+    :param threshold: skip repos with fewer estimated loose objects
+    :param budget: seconds after which no new project is started
+    :return: a result per project as it finishes, errors included, then one per skipped project
+    """
+    deadline = None if budget is None else time.monotonic() + budget
+    candidates = [(estimate_loose_objects(child_dir / '.git' / 'objects'), child_dir) for child_dir in child_dirs]
+    queue = sorted([candidate for candidate in candidates if candidate[0] >= threshold],
+                   key=lambda candidate: candidate[0], reverse=True)
+    skipped = [{'name': child_dir.name, 'action': 'skipped', 'seconds': 0.0}
+               for count, child_dir in candidates if count < threshold]
+
+    shared_store = shared_objects.shared_objects_dir()
+    shared_children = [child_dir for child_dir in child_dirs if shared_objects.is_shared(child_dir)]
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_lower_priority) as executor:
+        running = {}
+        while queue or running:
+            while queue and len(running) < jobs and (deadline is None or time.monotonic() < deadline):
+                count, child_dir = queue.pop(0)
+                running[executor.submit(gc_project, str(child_dir))] = child_dir
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                child_dir = running.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'name': child_dir.name, 'action': 'error', 'error': str(e), 'seconds': 0.0}
+
+        # Shared projects moved their loose objects into the store, pack them together at the end
+        if shared_children and estimate_loose_objects(shared_store) >= threshold \
+                and (deadline is None or time.monotonic() < deadline):
+            try:
+                yield executor.submit(pack_shared_store, str(shared_children[0] / '.git')).result()
+            except Exception as e:
+                yield {'name': shared_store.name, 'action': 'error', 'error': str(e), 'seconds': 0.0}
+
+    for count, child_dir in queue:
+        skipped.append({'name': child_dir.name, 'action': 'out-of-time', 'seconds': 0.0})
+    yield from skipped
@@ -0,0 +1,134 @@
+"""
+Keeps the child repo on a branch named after the parent's checked out branch.
+
+Switching branches only rewrites the tracked files whose blob differs between
+the two child branches, and only updates their index entries, so the stat data
+of every other entry stays valid and nothing else in the child dir is touched.
+A child branch that doesn't exist yet is created from the current child commit.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+
+import store
+from index_stat import refresh_entries, save_staged_state
+from move import checkout_mode, open_for_checkout
+from tracing import span
+
+if TYPE_CHECKING:
+    from git import Blob
+    from utils import PairedProject
+
+SYMLINK_MODE = 0o120000
+COPY_SIZE = 1024 * 1024
+
+
+def mirror_branch(project: 'PairedProject', branch: str) -> List[str]:
+    """
+    Moves the child repo to `branch`, committing pending child changes to the current branch first
+
+    :return: the tracked paths that were rewritten or removed
+    """
+    from git import IndexEntry
+
+    repo = project.child_repo
+    current = repo.head.reference.name if not repo.head.is_detached else None
+    if current == branch:
+        return []
+
+    project.commit_changes(f'[{current}] Save before switching to {branch}')
+
+    if branch not in repo.heads:
+        # First time on this branch, it starts with the files we already have
+        repo.head.reference = repo.create_head(branch)
+        return []
+
+    target = repo.heads[branch].commit
+    index = repo.index
+    current_entries = {path: entry for (path, stage), entry in index.entries.items() if stage == 0}
+    target_blobs = {item.path: item for item in target.tree.traverse() if item.type == 'blob'}
+
+    changed = []
+    for path, blob in target_blobs.items():
+        entry = current_entries.get(path)
+        if entry is None or entry.binsha != blob.binsha or entry.mode != blob.mode:
+            changed.append(path)
+    removed = [path for path in current_entries if path not in target_blobs]
+
+    with span('mirror.checkout', changed=len(changed), removed=len(removed)):
+        for path in removed:
+            _remove_file(project, path)
+            del index.entries[(path, 0)]
+
+        for path in changed:
+            blob = target_blobs[path]
+            _write_blob(project.child_dir / path, blob)
+            _link_parent(project, path)
+            index.entries[(path, 0)] = IndexEntry.from_blob(blob)
+
+        refresh_entries(index, changed)
+        with span('index.write', repo=project.child_dir):
+            index.write()
+
+    repo.head.reference = repo.heads[branch]
+    # The index now holds exactly the tree of the branch
+    save_staged_state(Path(repo.git_dir), False)
+    return changed + removed
+
+
+def _write_blob(path: Path, blob: 'Blob'):
+    """
+    Replaces path with the content of a blob, expanding store pointers.
+    The new file is renamed over the old one, so parent symlinks to it stay valid.
+    It keeps the permissions of the file it replaces, so private files stay private.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.et-checkout')
+    if tmp_path.is_symlink() or tmp_path.exists():
+        tmp_path.unlink()
+
+    stream = blob.data_stream
+    if blob.mode == SYMLINK_MODE:
+        os.symlink(stream.read().decode(), str(tmp_path))
+    else:
+        with open_for_checkout(tmp_path, checkout_mode(path, bool(blob.mode & 0o111))) as f:
+            head = stream.read(len(store.POINTER_HEADER))
+            if head == store.POINTER_HEADER:
+                # Pointers are small, the content they point to is streamed from the store
+                store.restore_stream(head + stream.read(), f)
+            else:
+                f.write(head)
+                shutil.copyfileobj(stream, f, COPY_SIZE)
+    os.replace(str(tmp_path), str(path))
+
+
+def _link_parent(project: 'PairedProject', path: str):
+    """
+    Symlinks a file that only the target branch tracks back into the parent dir,
+    unless the parent already has something there, e.g. through a linked directory
+    """
+    parent_path = project.parent_dir / path
+    if os.path.lexists(str(parent_path)):
+        return
+    parent_path.parent.mkdir(parents=True, exist_ok=True)
+    parent_path.symlink_to(project.child_dir / path)
+
+
+def _remove_file(project: 'PairedProject', path: str):
+    """
+    Removes a file the target branch doesn't track, along with its parent symlink
+    and the child directories it leaves empty
+    """
+    child_path = project.child_dir / path
+    parent_path = project.parent_dir / path
+    if parent_path.is_symlink() and os.path.realpath(str(parent_path)) == os.path.realpath(str(child_path)):
+        parent_path.unlink()
+
+    if child_path.is_symlink() or child_path.exists():
+        child_path.unlink()
+
+    directory = child_path.parent
+    while directory != project.child_dir and directory.is_dir() and not any(directory.iterdir()):
+        directory.rmdir()
+        directory = directory.parent
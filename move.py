@@ -0,0 +1,262 @@
+"""
+Moves files and directories between filesystems.
+
+A rename is used whenever possible. When ET_HOME and the project live on different
+filesystems the rename fails with EXDEV, and the source is copied instead (reflink,
+then copy_file_range, then a plain read/write loop), verified, moved into place with
+a final rename and only then removed.
+"""
+import errno
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+# Called with (bytes copied so far, total bytes) while copying across filesystems
+Progress = Callable[[int, int], None]
+
+# ioctl request to share extents between files on btrfs, xfs and friends
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+# Trees with at least this many files are copied by a thread pool
+PARALLEL_COPY_THRESHOLD = 32
+COPY_JOBS = 8
+
+_umask_lock = threading.Lock()
+
+
+def move_path(src: Path, dst: Path, progress: Optional[Progress] = None, leave_symlink: bool = False):
+    """
+    Moves src to dst, like Path.replace but across filesystems.
+
+    dst may be an existing symlink (e.g. unlinking), it is only replaced once
+    the copy is complete. For files the swap is a single atomic rename.
+
+    :param leave_symlink: replace src with a symlink to dst instead of removing it
+    """
+    if _same_filesystem(src, dst) and _rename(src, dst):
+        if leave_symlink:
+            src.symlink_to(dst)
+        return
+
+    partial = dst.with_name(f'.{dst.name}.et-partial')
+    _remove(partial)
+    try:
+        copy_path(src, partial, progress)
+    except BaseException:
+        _remove(partial)
+        raise
+
+    if partial.is_dir() and dst.is_symlink():
+        # A directory can't be renamed over a symlink
+        dst.unlink()
+    os.replace(str(partial), str(dst))
+
+    if leave_symlink:
+        replace_with_symlink(src, dst)
+    else:
+        _remove(src)
+
+
+def replace_with_symlink(path: Path, target: Path):
+    """
+    Replaces whatever is at path with a symlink to target, atomically for files and symlinks
+    """
+    tmp_link = path.with_name(f'.{path.name}.et-link')
+    _remove(tmp_link)
+    tmp_link.symlink_to(target)
+
+    if path.is_dir() and not path.is_symlink():
+        aside = path.with_name(f'.{path.name}.et-old')
+        os.rename(str(path), str(aside))
+        os.replace(str(tmp_link), str(path))
+        shutil.rmtree(str(aside))
+    else:
+        os.replace(str(tmp_link), str(path))
+
+
+def get_umask() -> int:
+    """
+    Reads the process umask, from /proc where possible since os.umask can only read it by changing it
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    with _umask_lock:
+        umask = os.umask(0o077)
+        os.umask(umask)
+    return umask
+
+
+def checkout_mode(path: Path, executable: bool) -> int:
+    """
+    Permission bits for a file about to be written over path: those of the file it replaces,
+    or the umask default like `git checkout`. The execute bits follow executable.
+    """
+    try:
+        st = os.lstat(str(path))
+    except FileNotFoundError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
+        return (0o777 if executable else 0o666) & ~get_umask()
+
+    mode = stat.S_IMODE(st.st_mode) & ~0o111
+    if executable:
+        # Execute wherever the file is readable
+        mode |= (mode & 0o444) >> 2
+    return mode
+
+
+def open_for_checkout(path: Path, mode: int) -> BinaryIO:
+    """
+    Creates path with exactly mode, so the content is never readable with broader permissions
+    """
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode & 0o700)
+    try:
+        os.fchmod(fd, mode)
+    except OSError:
+        os.close(fd)
+        raise
+    return os.fdopen(fd, 'wb')
+
+
+def copy_path(src: Path, dst: Path, progress: Optional[Progress] = None):
+    """
+    Copies a file, symlink or directory tree, preserving modes and timestamps.
+    Every copied file is verified to have the size of its source.
+    """
+    dirs, files = _plan(src, dst)
+    total = sum(size for _, _, size in files)
+    copied = [0]
+    lock = threading.Lock()
+
+    def on_chunk(length: int):
+        if progress is not None:
+            with lock:
+                copied[0] += length
+                progress(copied[0], total)
+
+    for src_dir, dst_dir in dirs:
+        os.mkdir(str(dst_dir))
+
+    if len(files) >= PARALLEL_COPY_THRESHOLD:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=COPY_JOBS) as executor:
+            # list() re-raises the first error
+            list(executor.map(lambda file: _copy_entry(file[0], file[1], on_chunk), files))
+    else:
+        for src_file, dst_file, size in files:
+            _copy_entry(src_file, dst_file, on_chunk)
+
+    # Directory timestamps last, creating their entries changed them
+    for src_dir, dst_dir in reversed(dirs):
+        shutil.copystat(str(src_dir), str(dst_dir))
+
+
+def _plan(src: Path, dst: Path) -> Tuple[List[Tuple[Path, Path]], List[Tuple[Path, Path, int]]]:
+    """
+    :return: the directories to create and the (src, dst, size) of every file and symlink to copy
+    """
+    st = os.lstat(str(src))
+    if not stat.S_ISDIR(st.st_mode):
+        return [], [(src, dst, st.st_size)]
+
+    dirs = [(src, dst)]
+    files = []
+    for root, dir_names, file_names in os.walk(str(src)):
+        relative_root = Path(root).relative_to(src)
+        for name in dir_names[:]:
+            path = Path(root) / name
+            if path.is_symlink():
+                # os.walk lists symlinks to directories as directories, copy them as links
+                dir_names.remove(name)
+                files.append((path, dst / relative_root / name, 0))
+            else:
+                dirs.append((path, dst / relative_root / name))
+        for name in file_names:
+            path = Path(root) / name
+            files.append((path, dst / relative_root / name, os.lstat(str(path)).st_size))
+    return dirs, files
+
+
+def _copy_entry(src: Path, dst: Path, on_chunk: Callable[[int], None]):
+    st = os.lstat(str(src))
+    if stat.S_ISLNK(st.st_mode):
+        os.symlink(os.readlink(str(src)), str(dst))
+        return
+
+    with open(str(src), 'rb') as src_file, open(str(dst), 'wb') as dst_file:
+        _copy_data(src_file.fileno(), dst_file.fileno(), st.st_size, on_chunk)
+        copied_size = os.fstat(dst_file.fileno()).st_size
+    if copied_size != st.st_size:
+        raise OSError(errno.EIO, f'Copied {copied_size} of {st.st_size} bytes', str(src))
+    shutil.copystat(str(src), str(dst))
+
+
+def _copy_data(src_fd: int, dst_fd: int, size: int, on_chunk: Callable[[int], None]):
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        on_chunk(size)
+        return
+    except (ImportError, OSError):
+        pass
+
+    offset = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                length = os.copy_file_range(src_fd, dst_fd, min(CHUNK_SIZE, size - offset))
+                if length == 0:
+                    break
+                offset += length
+                on_chunk(length)
+        except OSError as e:
+            # Kernels before 5.3 refuse to copy across filesystems
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = os.read(src_fd, CHUNK_SIZE)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        on_chunk(len(chunk))
+
+
+def _same_filesystem(src: Path, dst: Path) -> bool:
+    return os.lstat(str(src)).st_dev == os.stat(str(dst.parent)).st_dev
+
+
+def _rename(src: Path, dst: Path) -> bool:
+    """
+    :return: False if the rename failed because src and dst are on different mounts
+    """
+    try:
+        if dst.is_symlink() and src.is_dir() and not src.is_symlink():
+            dst.unlink()
+        os.replace(str(src), str(dst))
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return False
+        raise
+    return True
+
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(str(path))
+    elif os.path.lexists(str(path)):
+        path.unlink()
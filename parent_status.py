@@ -0,0 +1,198 @@
+"""
+Whether the parent repository tracks or ignores paths, answered in-process.
+
+Linking a path that the parent repository tracks turns it into a type change
+for everybody else, and linking a path it doesn't ignore leaves an untracked
+symlink in `git status`. PathChecker reads the parent index once and every
+exclude file at most once, so any number of paths is checked without git.
+
+Exclude rules follow gitignore(5): the global excludes file, then
+info/exclude, then the .gitignore files from the top of the working tree
+down, the last matching pattern wins, and nothing inside an ignored
+directory can be re-included.
+"""
+import os
+import re
+import stat
+from bisect import bisect_left
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from discovery import discover
+from index_stat import iter_index_entries
+
+PathStatus = namedtuple('PathStatus', ['tracked', 'ignored'])
+# regex: compiled pattern, negate: `!` pattern, dir_only: trailing `/`, anchored: matched against the whole path
+Rule = namedtuple('Rule', ['regex', 'negate', 'dir_only', 'anchored'])
+
+
+def _translate(pattern: str) -> str:
+    """
+    Converts a gitignore glob to a regex, `*` and `?` never match a `/`
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i) and i + 2 == len(pattern) and (i == 0 or pattern[i - 1] == '/'):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def parse_rules(lines: Iterable[str]) -> List[Rule]:
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if line:
+            rules.append(Rule(re.compile(_translate(line) + r'\Z'), negate, dir_only, anchored))
+    return rules
+
+
+def _read_rules(path: Path) -> List[Rule]:
+    try:
+        with open(str(path), errors='surrogateescape') as f:
+            return parse_rules(f)
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return []
+
+
+def global_excludes_file() -> Path:
+    """
+    :return: core.excludesFile from the global git config, or its default location
+    """
+    for config_path in [Path.home() / '.gitconfig',
+                        Path(os.environ.get('XDG_CONFIG_HOME', str(Path.home() / '.config'))) / 'git' / 'config']:
+        try:
+            content = config_path.read_text()
+        except (OSError, UnicodeDecodeError):
+            continue
+        match = re.search(r'^\s*excludesfile\s*=\s*(.+?)\s*$', content, re.IGNORECASE | re.MULTILINE)
+        if match:
+            return Path(os.path.expanduser(match.group(1).strip('"')))
+    return Path(os.environ.get('XDG_CONFIG_HOME', str(Path.home() / '.config'))) / 'git' / 'ignore'
+
+
+class PathChecker(object):
+    """
+    Answers tracked/ignored questions about paths of one parent working tree
+    """
+
+    def __init__(self, working_dir: Path):
+        location = discover(working_dir)
+        self.working_dir = location.working_dir
+        self._tracked = sorted(self._read_index(location.git_dir / 'index'))
+        # Lowest priority first, the .gitignore rules of each directory are added when first needed
+        self._base_rules = [('', _read_rules(global_excludes_file())),
+                            ('', _read_rules(location.common_dir / 'info' / 'exclude'))]
+        self._dir_rules: Dict[str, List[Rule]] = {}
+        self._ignored_dirs: Dict[str, bool] = {}
+
+    def _read_index(self, index_path: Path) -> List[str]:
+        try:
+            return [entry.path for entry in iter_index_entries(index_path)]
+        except FileNotFoundError:
+            return []
+        except ValueError:
+            # An index format the fast reader doesn't support
+            from utils import open_repo
+            return [path for path, stage in open_repo(self.working_dir).index.entries]
+
+    def is_tracked(self, relative_path: str) -> bool:
+        """
+        :return: whether the path, or anything under it, is in the parent index
+        """
+        position = bisect_left(self._tracked, relative_path)
+        if position < len(self._tracked) and self._tracked[position] == relative_path:
+            return True
+        # Entries under a directory don't necessarily follow it, e.g. "a-b" sorts between "a" and "a/b"
+        prefix = relative_path + '/'
+        position = bisect_left(self._tracked, prefix)
+        return position < len(self._tracked) and self._tracked[position].startswith(prefix)
+
+    def _rules_of(self, directory: str) -> List[Rule]:
+        if directory not in self._dir_rules:
+            self._dir_rules[directory] = _read_rules(self.working_dir / directory / '.gitignore')
+        return self._dir_rules[directory]
+
+    def _match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        :return: whether the last matching rule ignores the path, None if no rule matches
+        """
+        directory = os.path.dirname(relative_path)
+        layers: List[Tuple[str, List[Rule]]] = self._base_rules + [('', self._rules_of(''))]
+        parts = directory.split('/') if directory else []
+        for depth in range(1, len(parts) + 1):
+            prefix = '/'.join(parts[:depth])
+            layers.append((prefix, self._rules_of(prefix)))
+
+        name = os.path.basename(relative_path)
+        for base, rules in reversed(layers):
+            local_path = relative_path[len(base) + 1:] if base else relative_path
+            for rule in reversed(rules):
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.match(local_path if rule.anchored else name):
+                    return not rule.negate
+        return None
+
+    def _is_dir_ignored(self, relative_dir: str) -> bool:
+        if relative_dir not in self._ignored_dirs:
+            parent = os.path.dirname(relative_dir)
+            self._ignored_dirs[relative_dir] = (bool(parent) and self._is_dir_ignored(parent)) \
+                or bool(self._match(relative_dir, True))
+        return self._ignored_dirs[relative_dir]
+
+    def is_ignored(self, relative_path: str, is_dir: Optional[bool] = None) -> bool:
+        """
+        :param is_dir: whether dir-only rules like "secrets/" apply, found with lstat by default.
+         Git sees a symlink as a file, even one to a directory
+        """
+        parent = os.path.dirname(relative_path)
+        if parent and self._is_dir_ignored(parent):
+            return True
+        if is_dir is None:
+            try:
+                is_dir = stat.S_ISDIR(os.lstat(str(self.working_dir / relative_path)).st_mode)
+            except FileNotFoundError:
+                is_dir = False
+        return bool(self._match(relative_path, is_dir))
+
+    def check(self, relative_paths: Iterable[str]) -> Dict[str, PathStatus]:
+        return {path: PathStatus(self.is_tracked(path), self.is_ignored(path)) for path in relative_paths}
@@ -0,0 +1,143 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from config import config
+
+
+class ProjectIndex(object):
+    """
+    On-disk reverse lookup of resolved parent dirs -> child dir names.
+
+    The filesystem stays the source of truth; the index is only a cache.
+    It records the mtime of ET_HOME at the time it was written, so adding,
+    removing or renaming a child dir invalidates it and it is rebuilt with
+    a single scan. The index lives in a subdirectory of ET_HOME so that
+    writing it does not bump the ET_HOME mtime it is validated against.
+    """
+    VERSION = 1
+    # The last index loaded by this process, reused while ET_HOME is unchanged (e.g. by the daemon)
+    _loaded: Optional['ProjectIndex'] = None
+    _loaded_path: Optional[Path] = None
+
+    def __init__(self, projects: Dict[str, str], et_home_mtime_ns: Optional[int] = None):
+        """
+        :param projects: mapping of resolved parent dir -> child dir name
+        :param et_home_mtime_ns: mtime of ET_HOME when the index was built
+        """
+        self.projects = projects
+        self.et_home_mtime_ns = et_home_mtime_ns
+
+    @staticmethod
+    def path() -> Path:
+        return Path(config.ET_HOME) / config.CONFIG_DIR_NAME / config.PROJECT_INDEX_NAME
+
+    @classmethod
+    def load(cls) -> 'ProjectIndex':
+        """
+        Load the index, rebuilding and saving it first if it is missing or stale
+        """
+        current_mtime = et_home_mtime_ns()
+        if current_mtime is None:
+            # Nothing has been initialized yet, don't create ET_HOME as a side effect
+            return cls({})
+
+        loaded = cls._loaded
+        if loaded is not None and cls._loaded_path == cls.path() and loaded.et_home_mtime_ns == current_mtime:
+            return loaded
+
+        try:
+            with cls.path().open() as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+
+        if data and data.get('version') == cls.VERSION and data.get('et_home_mtime_ns') == current_mtime:
+            index = cls(data['projects'], current_mtime)
+        else:
+            # Imported here, `et prompt` and the git hooks read a fresh index without loading logging
+            from logger import logger
+
+            logger.debug('Project index is missing or stale - rebuilding')
+            index = cls.build()
+            index.save()
+
+        cls._loaded, cls._loaded_path = index, cls.path()
+        return index
+
+    @classmethod
+    def build(cls) -> 'ProjectIndex':
+        """
+        Scan ET_HOME and map every child dir back to its resolved parent dir
+        """
+        from tracing import span
+
+        projects = {}
+        with span('et_home.scan'):
+            for child_dir in iter_child_dirs():
+                parent_dir = (child_dir / config.PARENT_SYMLINK_NAME).resolve()
+                projects[str(parent_dir)] = child_dir.name
+        return cls(projects)
+
+    def save(self):
+        """
+        Atomically write the index and stamp it with the current ET_HOME mtime
+        """
+        index_path = self.path()
+        # Create the config dir before reading the mtime, creating it modifies ET_HOME
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.et_home_mtime_ns = et_home_mtime_ns()
+
+        tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as f:
+            json.dump({
+                'version': self.VERSION,
+                'et_home_mtime_ns': self.et_home_mtime_ns,
+                'projects': self.projects,
+            }, f)
+        tmp_path.replace(index_path)
+
+    def add(self, parent_dir: Path, child_dir: Path):
+        self.projects[str(parent_dir.resolve())] = child_dir.name
+
+    def get(self, parent_dir: Path) -> Optional[Path]:
+        """
+        :return: the child dir tracking parent_dir, if the index has an entry
+         for it and the child still links back to parent_dir
+        """
+        parent_dir = parent_dir.resolve()
+        name = self.projects.get(str(parent_dir))
+        if name is None:
+            return None
+
+        child_dir = Path(config.ET_HOME) / name
+        # The symlink may have been retargeted without touching ET_HOME
+        if (child_dir / config.PARENT_SYMLINK_NAME).resolve() != parent_dir:
+            return None
+        return child_dir
+
+
+def et_home_mtime_ns() -> Optional[int]:
+    try:
+        return os.stat(str(config.ET_HOME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def iter_child_dirs() -> Iterator[Path]:
+    """
+    Yields every child dir in ET_HOME, i.e. every top level
+    directory containing a PARENT_SYMLINK_NAME symlink
+    """
+    try:
+        entries = os.scandir(str(config.ET_HOME))
+    except FileNotFoundError:
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_dir(follow_symlinks=False):
+                continue
+            if os.path.islink(os.path.join(entry.path, config.PARENT_SYMLINK_NAME)):
+                yield Path(entry.path)
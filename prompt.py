@@ -0,0 +1,208 @@
+"""
+Status indicator for shell prompts: `et prompt` or `python prompt.py`.
+
+Prints one of:
+    clean    the current project has no uncommitted changes to tracked files
+    dirty    some tracked file changed
+    unknown  the answer could not be found within the latency budget
+and prints nothing (exit code 1) outside of a tracked project.
+
+The project is found by walking up the filesystem and reading the project
+index, without click or GitPython. After a full check against the child
+index, the stat data of every tracked file is saved in a snapshot next to the
+index, so the next prompt only has to lstat the files and compare. The
+snapshot is trusted only while the index itself is unchanged. Changes staged
+in the index are read from the answer the last commit or `et status` recorded.
+
+    PS1='$(et prompt) \\$ '
+"""
+import json
+import os
+import stat
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from config import config
+from discovery import discover
+from exceptions import NotInRepository
+from index_stat import content_blob_id, has_staged_changes, index_mode, iter_index_entries, stat_matches
+from project_index import ProjectIndex
+from snapshot import SnapshotBackend, find_snapshot_child, is_snapshot_dir
+
+CLEAN = 'clean'
+DIRTY = 'dirty'
+UNKNOWN = 'unknown'
+
+DEFAULT_BUDGET_MS = 5.0
+# Bytes a changed file can be hashed at per millisecond of budget, a conservative guess for a cold read
+HASH_BYTES_PER_MS = 100 * 1024
+SNAPSHOT_NAME = 'et-prompt-snapshot.json'
+
+
+class OutOfTime(Exception):
+    pass
+
+
+def find_project(path: Path) -> Optional[Tuple[Path, Path]]:
+    """
+    :return: the (parent dir, child dir) of the project containing path, if it is tracked
+    """
+    child_dir = find_snapshot_child(path)
+    if child_dir is not None:
+        return (child_dir / config.PARENT_SYMLINK_NAME).resolve(), child_dir
+
+    try:
+        working_dir = discover(path).working_dir
+    except NotInRepository:
+        return None
+
+    et_home = Path(config.ET_HOME)
+    if et_home in working_dir.parents:
+        child_dir = et_home / working_dir.relative_to(et_home).parts[0]
+        return (child_dir / config.PARENT_SYMLINK_NAME).resolve(), child_dir
+
+    child_dir = ProjectIndex.load().get(working_dir)
+    if child_dir is None:
+        return None
+    return working_dir, child_dir
+
+
+def _file_key(st: Optional[os.stat_result]) -> Optional[list]:
+    if st is None:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode]
+
+
+def _lstat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.lstat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _index_key(index_path: Path) -> Optional[list]:
+    return _file_key(_lstat(str(index_path)))
+
+
+def check_snapshot(child_dir: Path, index_key: list, deadline: float) -> Optional[str]:
+    """
+    :return: the status saved in the snapshot if neither the index nor any tracked file changed since
+    """
+    try:
+        with (child_dir / '.git' / SNAPSHOT_NAME).open() as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('index') != index_key:
+        return None
+
+    for path, key in snapshot['files'].items():
+        if time.perf_counter() > deadline:
+            raise OutOfTime()
+        if _file_key(_lstat(str(child_dir / path))) != key:
+            return None
+    return snapshot['status']
+
+
+def check_index(child_dir: Path, index_path: Path, index_key: list, deadline: float) -> str:
+    """
+    Compares every tracked file with the child index, and saves the result in a snapshot
+    """
+    # time.time_ns() needs python 3.7
+    started_ns = int(time.time() * 10 ** 9)
+    index_mtime_ns = index_key[0]
+    status = CLEAN
+    files = {}
+    for entry in iter_index_entries(index_path):
+        if time.perf_counter() > deadline:
+            raise OutOfTime()
+
+        full_path = child_dir / entry.path
+        st = _lstat(str(full_path))
+        files[entry.path] = _file_key(st)
+        if st is None or entry.mode != index_mode(st) or stat.S_ISDIR(st.st_mode):
+            status = DIRTY
+        elif not stat_matches(entry, st, index_mtime_ns):
+            # Hashing can't be interrupted, don't start on a file the rest of the budget can't cover
+            if st.st_size > (deadline - time.perf_counter()) * 1000 * HASH_BYTES_PER_MS:
+                raise OutOfTime()
+            if content_blob_id(full_path, st) != entry.binsha:
+                status = DIRTY
+
+    # A file written while the snapshot was taken could change again without a new mtime
+    if all(key is None or key[0] < started_ns for key in files.values()):
+        _save_snapshot(child_dir, {'index': index_key, 'status': status, 'files': files})
+    return status
+
+
+def _save_snapshot(child_dir: Path, snapshot: dict):
+    snapshot_path = child_dir / '.git' / SNAPSHOT_NAME
+    tmp_path = snapshot_path.with_name(f'{SNAPSHOT_NAME}.{os.getpid()}.tmp')
+    try:
+        with tmp_path.open('w') as f:
+            json.dump(snapshot, f)
+        os.replace(str(tmp_path), str(snapshot_path))
+    except OSError:
+        # Only a cache, the next prompt checks the index again
+        pass
+
+
+def get_status(path: Path, budget_ms: float = DEFAULT_BUDGET_MS) -> Optional[str]:
+    """
+    :return: CLEAN, DIRTY or UNKNOWN for the project containing path, None if it isn't tracked
+    """
+    deadline = time.perf_counter() + budget_ms / 1000
+    project = find_project(path)
+    if project is None:
+        return None
+
+    child_dir = project[1]
+    if is_snapshot_dir(child_dir):
+        # The snapshot store keeps stat data of its own, read it directly
+        try:
+            return DIRTY if SnapshotBackend(child_dir).status(deadline=deadline) else CLEAN
+        except TimeoutError:
+            return UNKNOWN
+
+    index_path = child_dir / '.git' / 'index'
+    index_key = _index_key(index_path)
+    if index_key is None:
+        return CLEAN
+
+    # The checks below compare files with the index, changes staged in the index are checked apart
+    staged = has_staged_changes(child_dir / '.git')
+    if staged:
+        return DIRTY
+
+    try:
+        status = check_snapshot(child_dir, index_key, deadline)
+        if status is None:
+            status = check_index(child_dir, index_path, index_key, deadline)
+    except OutOfTime:
+        return UNKNOWN
+    except ValueError:
+        # An index format the fast reader doesn't support
+        return UNKNOWN
+    if status == CLEAN and staged is None:
+        # Only comparing the index with the HEAD tree can tell, `et status` does and remembers the answer
+        return UNKNOWN
+    return status
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    budget_ms = float(os.environ.get('ET_PROMPT_BUDGET_MS', DEFAULT_BUDGET_MS))
+    if argv[:1] == ['--budget'] and len(argv) > 1:
+        budget_ms = float(argv[1])
+
+    status = get_status(Path(os.getcwd()), budget_ms)
+    if status is None:
+        return 1
+    sys.stdout.write(status + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
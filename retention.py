@@ -0,0 +1,112 @@
+"""
+Thins out the auto-commit history of child repos.
+
+Recent commits are all kept, older ones are reduced to the last commit of each
+day, and the oldest to the last commit of each month. The branch is rewritten
+in a single pass over its first-parent history: the unchanged prefix is reused
+as is and only the commits after the first squash are recreated, on top of
+the trees of the commits that are kept. The newest commit is always kept, so
+the working tree and index are not touched.
+"""
+import time
+from collections import namedtuple
+from typing import List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from git import Commit, Repo
+
+DAY = 24 * 60 * 60
+
+CompactResult = namedtuple('CompactResult', ['before', 'after'])
+
+
+class RetentionPolicy(object):
+    """
+    Which commits survive compaction, by age
+    """
+
+    def __init__(self, keep_all_days: int = 7, daily_days: int = 365):
+        """
+        :param keep_all_days: every commit younger than this is kept
+        :param daily_days: up to this age, the last commit of each day is kept.
+         Older than that, the last commit of each month
+        """
+        self.keep_all_days = keep_all_days
+        self.daily_days = daily_days
+
+    def bucket(self, commit_time: int, now: float) -> Optional[str]:
+        """
+        :return: a key shared by all commits of which only the newest is kept,
+         or None if the commit is kept regardless
+        """
+        age = now - commit_time
+        if age < self.keep_all_days * DAY:
+            return None
+        if age < self.daily_days * DAY:
+            return time.strftime('day:%Y-%m-%d', time.localtime(commit_time))
+        return time.strftime('month:%Y-%m', time.localtime(commit_time))
+
+    def select(self, commits: List['Commit'], now: float) -> List[List['Commit']]:
+        """
+        :param commits: oldest first
+        :return: groups of consecutive commits, the last commit of each group is the one kept
+        """
+        groups = []
+        last_bucket = None
+        for commit in commits:
+            bucket = self.bucket(commit.committed_date, now)
+            if groups and bucket is not None and bucket == last_bucket:
+                groups[-1].append(commit)
+            else:
+                groups.append([commit])
+            last_bucket = bucket
+        return groups
+
+
+def compact(repo: 'Repo', policy: RetentionPolicy, now: Optional[float] = None,
+            dry_run: bool = False) -> CompactResult:
+    """
+    Rewrites the checked out branch according to policy
+
+    :return: the number of commits before and after
+    """
+    from git import Commit
+
+    now = time.time() if now is None else now
+    commits = list(repo.iter_commits(repo.head.reference, first_parent=True))
+    commits.reverse()
+    groups = policy.select(commits, now)
+    result = CompactResult(len(commits), len(groups))
+    if dry_run or result.before == result.after:
+        return result
+
+    parent = None
+    rewriting = False
+    for group in groups:
+        kept = group[-1]
+        if not rewriting and len(group) == 1:
+            # Nothing squashed so far, the original commit can stay
+            parent = kept
+            continue
+
+        rewriting = True
+        message = kept.message
+        if len(group) > 1:
+            message = f'{message.rstrip()}\n\nCompacted {len(group)} commits'
+        parent = Commit.create_from_tree(repo, kept.tree, message,
+                                         parent_commits=[parent] if parent is not None else [],
+                                         author=kept.author, committer=kept.committer,
+                                         author_date=kept.authored_datetime, commit_date=kept.committed_datetime)
+
+    repo.head.reference.set_commit(parent, logmsg=f'et compact: {result.before} -> {result.after} commits')
+    return result
+
+
+def reclaim_space(repo: 'Repo'):
+    """
+    Drops the rewritten commits right away instead of waiting for reflog and gc expiry.
+    Objects in the shared object store are never pruned, chunks in the large file store
+    are swept separately with store.sweep, once every project was compacted.
+    """
+    repo.git.reflog('expire', '--expire-unreachable=now', '--all')
+    repo.git.gc('--quiet', '--prune=now')
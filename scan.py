@@ -0,0 +1,59 @@
+"""
+Finds the git repos under a directory tree for `et init --scan`.
+
+The walk does not descend into repos it found, their .git dirs, ET_HOME or
+dependency dirs, so scanning a tree of checkouts only lists directories
+outside of the checkouts themselves.
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Set
+
+from config import config
+
+# Dependency and cache dirs that never contain a project of their own
+PRUNED_DIRS = {'.git', 'node_modules', 'vendor', 'bower_components', '.venv', 'venv', '__pycache__', '.tox'}
+
+
+def find_repos(root: Path) -> Iterator[Path]:
+    """
+    Yields the working tree roots under root, sorted within each directory
+    """
+    et_home = os.path.realpath(str(config.ET_HOME))
+    pending = [str(root)]
+    while pending:
+        directory = pending.pop()
+        if os.path.lexists(os.path.join(directory, '.git')):
+            yield Path(directory)
+            continue
+
+        try:
+            with os.scandir(directory) as it:
+                subdirs = sorted(entry.path for entry in it
+                                 if entry.name not in PRUNED_DIRS and entry.is_dir(follow_symlinks=False))
+        except (PermissionError, FileNotFoundError):
+            continue
+        # Reversed so the stack pops them in order
+        pending.extend(path for path in reversed(subdirs) if os.path.realpath(path) != et_home)
+
+
+def assign_names(repos: Iterable[Path], taken: Set[str]) -> Dict[Path, str]:
+    """
+    Names a child dir for every repo without reusing a name of taken or of another repo.
+    Repos with the same directory name are told apart by their parent directory's name, then by a number.
+
+    :param taken: the names already used in ET_HOME
+    """
+    taken = set(taken)
+    names = {}
+    for repo in repos:
+        candidates = [repo.name, f'{repo.parent.name}-{repo.name}']
+        name = next((candidate for candidate in candidates if candidate not in taken), None)
+        number = 2
+        while name is None:
+            if f'{repo.name}-{number}' not in taken:
+                name = f'{repo.name}-{number}'
+            number += 1
+        taken.add(name)
+        names[repo] = name
+    return names
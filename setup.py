@@ -4,12 +4,12 @@ from setuptools import setup
 setup(
     name='et',
     version='0.1',
-    py_modules=['main'],
+    py_modules=['main', 'daemon', 'prompt'],
     install_requires=[
         'Click',
     ],
     entry_points = '''
     [console_scripts]
-    et=main:et
+    et=daemon:cli
     '''
 )
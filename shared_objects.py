@@ -0,0 +1,102 @@
+"""
+Object database shared by child repos, using git alternates.
+
+Child repos list the shared store in .git/objects/info/alternates, so objects in
+it are readable by every child without being copied. Moving a child's objects
+into the store deduplicates them: an object that another child already moved
+there is simply dropped from the child.
+
+The shared store must never be pruned, no single child knows every object
+that the other children still reference.
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+from config import config
+
+LOOSE_OBJECT_DIR = re.compile(r'^[0-9a-f]{2}$')
+
+
+def shared_objects_dir() -> Path:
+    return Path(config.ET_HOME) / config.CONFIG_DIR_NAME / config.SHARED_OBJECTS_NAME
+
+
+def ensure_store() -> Path:
+    objects_dir = shared_objects_dir()
+    (objects_dir / 'info').mkdir(parents=True, exist_ok=True)
+    (objects_dir / 'pack').mkdir(exist_ok=True)
+    return objects_dir
+
+
+def alternates_path(child_dir: Path) -> Path:
+    return child_dir / '.git' / 'objects' / 'info' / 'alternates'
+
+
+def is_shared(child_dir: Path) -> bool:
+    path = alternates_path(child_dir)
+    return path.exists() and str(shared_objects_dir()) in path.read_text().splitlines()
+
+
+def attach(child_dir: Path):
+    """
+    Lets a child repo read objects from the shared store
+    """
+    objects_dir = ensure_store()
+    path = alternates_path(child_dir)
+    lines = path.read_text().splitlines() if path.exists() else []
+    if str(objects_dir) not in lines:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('a') as f:
+            f.write(f'{objects_dir}\n')
+
+
+def iter_loose_objects(objects_dir: Path) -> Iterator[Path]:
+    for entry in os.scandir(str(objects_dir)):
+        if entry.is_dir() and LOOSE_OBJECT_DIR.match(entry.name):
+            for object_entry in os.scandir(entry.path):
+                yield Path(object_entry.path)
+
+
+def share_objects(child_dir: Path) -> int:
+    """
+    Moves a child's loose objects and packs into the shared store.
+    The child is attached first, so its objects stay readable throughout.
+
+    :return: number of objects that were already in the shared store and got deduplicated
+    """
+    attach(child_dir)
+    shared_dir = shared_objects_dir()
+    objects_dir = child_dir / '.git' / 'objects'
+    deduplicated = 0
+
+    for loose_object in iter_loose_objects(objects_dir):
+        destination = shared_dir / loose_object.parent.name / loose_object.name
+        if destination.exists():
+            deduplicated += 1
+            loose_object.unlink()
+            continue
+        destination.parent.mkdir(exist_ok=True)
+        _move(loose_object, destination)
+
+    # Move the index last, a pack is only usable once its .idx exists
+    for suffix in ('.pack', '.rev', '.bitmap', '.idx'):
+        for pack_file in (objects_dir / 'pack').glob(f'pack-*{suffix}'):
+            _move(pack_file, shared_dir / 'pack' / pack_file.name)
+
+    # Cached handles run git helpers that read the alternates only once, at startup
+    from utils import close_repo
+    close_repo(child_dir)
+
+    return deduplicated
+
+
+def _move(src: Path, dst: Path):
+    try:
+        os.replace(str(src), str(dst))
+    except OSError:
+        # ET_HOME on another filesystem than the repo, e.g. a symlinked child dir
+        shutil.copy2(str(src), str(dst))
+        src.unlink()
@@ -0,0 +1,312 @@
+"""
+Append-only snapshot storage for projects that only want versioned copies.
+
+Everything lives in the child dir, next to the tracked files, and no git is involved:
+
+    .et-snapshots/objects/<xx>/<rest>   zlib compressed file contents, named by their sha256
+    .et-snapshots/log                   one JSON line per snapshot with the paths it changed
+    .et-snapshots/index.json            the tracked paths, their blob and stat data, staged changes,
+                                        and the blob and mode of every path as of the last snapshot
+
+Like a git index, the stat data recorded for each tracked file lets status skip
+hashing files that didn't change, and entries written in the same instant as the
+index file are "racily clean" and always hashed.
+The log is only appended to, and a snapshot's id is the hash of its record.
+"""
+import json
+import os
+import stat
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import config
+from storage import Backend, Revision
+
+SYMLINK_MODE = 0o120000
+READ_SIZE = 1024 * 1024
+
+
+def is_snapshot_dir(child_dir: Path) -> bool:
+    return (child_dir / config.SNAPSHOT_DIR_NAME).is_dir()
+
+
+def find_snapshot_child(input_path: Path) -> Optional[Path]:
+    """
+    Snapshot child dirs aren't git working trees, so paths in them are found from ET_HOME instead of discovery
+
+    :return: the child dir of a snapshot project if input_path is inside of it
+    """
+    et_home = Path(config.ET_HOME)
+    try:
+        relative_path = Path(os.path.abspath(str(input_path))).relative_to(os.path.abspath(str(et_home)))
+    except ValueError:
+        return None
+    if not relative_path.parts:
+        return None
+    child_dir = et_home / relative_path.parts[0]
+    return child_dir if is_snapshot_dir(child_dir) else None
+
+
+def _file_mode(st: os.stat_result) -> int:
+    if stat.S_ISLNK(st.st_mode):
+        return SYMLINK_MODE
+    return 0o100755 if st.st_mode & stat.S_IXUSR else 0o100644
+
+
+def _iter_files(path: Path) -> Iterator[Path]:
+    """
+    Yields path itself, or every file and symlink below it if it is a directory
+    """
+    if not path.is_dir() or path.is_symlink():
+        yield path
+        return
+
+    for root, dirs, files in os.walk(str(path)):
+        dirs[:] = [d for d in dirs if d not in ('.git', config.SNAPSHOT_DIR_NAME)]
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            yield Path(root) / name
+
+
+class SnapshotBackend(Backend):
+    name = 'snapshot'
+
+    def __init__(self, child_dir: Path):
+        super().__init__(child_dir)
+        self.snapshot_dir = child_dir / config.SNAPSHOT_DIR_NAME
+        self._index: Optional[dict] = None
+        self._index_mtime_ns = 0
+
+    @classmethod
+    def init(cls, child_dir: Path) -> 'SnapshotBackend':
+        backend = cls(child_dir)
+        (backend.snapshot_dir / 'objects').mkdir(parents=True)
+        (backend.snapshot_dir / 'log').touch()
+        backend._index = {'head': None, 'entries': {}, 'staged': {}, 'committed': {}}
+        backend._save()
+        return backend
+
+    ## Index
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            index_path = self.snapshot_dir / 'index.json'
+            with index_path.open() as f:
+                self._index = json.load(f)
+            self._index_mtime_ns = os.stat(str(index_path)).st_mtime_ns
+        return self._index
+
+    def _save(self):
+        index_path = self.snapshot_dir / 'index.json'
+        tmp_path = index_path.with_name(f'index.json.{os.getpid()}.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(self._index, f)
+        tmp_path.replace(index_path)
+        self._index_mtime_ns = os.stat(str(index_path)).st_mtime_ns
+
+    ## Blobs
+
+    def _blob_path(self, blob_id: str) -> Path:
+        return self.snapshot_dir / 'objects' / blob_id[:2] / blob_id[2:]
+
+    def _hash(self, path: Path, st: os.stat_result, write: bool) -> str:
+        """
+        :return: the blob id of a file or symlink, storing the blob if write is set
+        """
+        # Only loaded when content is read, finding snapshot projects is on every command's path
+        import hashlib
+        import zlib
+
+        if stat.S_ISLNK(st.st_mode):
+            chunks = [os.fsencode(os.readlink(str(path)))]
+        else:
+            f = open(str(path), 'rb')
+            chunks = iter(lambda: f.read(READ_SIZE), b'')
+
+        sha = hashlib.sha256()
+        tmp_path = self.snapshot_dir / 'objects' / f'.{os.getpid()}.tmp'
+        out = tmp_path.open('wb') if write else None
+        compressor = zlib.compressobj()
+        try:
+            for chunk in chunks:
+                sha.update(chunk)
+                if out:
+                    out.write(compressor.compress(chunk))
+            if out:
+                out.write(compressor.flush())
+                # On disk before any log line can refer to it
+                out.flush()
+                os.fsync(out.fileno())
+        finally:
+            if out:
+                out.close()
+            if not stat.S_ISLNK(st.st_mode):
+                f.close()
+
+        blob_id = sha.hexdigest()
+        if write:
+            blob_path = self._blob_path(blob_id)
+            if blob_path.exists():
+                # Deduplicated, the same content was stored before
+                tmp_path.unlink()
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                tmp_path.replace(blob_path)
+        return blob_id
+
+    def _read_blob(self, blob_id: str) -> bytes:
+        import zlib
+
+        return zlib.decompress(self._blob_path(blob_id).read_bytes())
+
+    def _record(self, relative_path: str) -> Optional[Tuple[str, int]]:
+        """
+        Stores the current content of a tracked path and updates its entry
+
+        :return: (blob id, mode), or None if the path is gone
+        """
+        full_path = self.child_dir / relative_path
+        try:
+            st = os.lstat(str(full_path))
+        except FileNotFoundError:
+            self.index['entries'].pop(relative_path, None)
+            return None
+        blob_id = self._hash(full_path, st, write=True)
+        mode = _file_mode(st)
+        self.index['entries'][relative_path] = [blob_id, mode, st.st_size, st.st_mtime_ns, st.st_ino]
+        return blob_id, mode
+
+    ## Backend interface
+
+    def add(self, relative_paths: Iterable[str]):
+        for relative_path in relative_paths:
+            for path in _iter_files(self.child_dir / relative_path):
+                relative_file = path.relative_to(self.child_dir).as_posix()
+                self.index['staged'][relative_file] = self._record(relative_file)
+        self._save()
+
+    def remove(self, relative_paths: Iterable[str]):
+        entries = self.index['entries']
+        for relative_path in relative_paths:
+            for path in [path for path in entries if path == relative_path or path.startswith(relative_path + '/')]:
+                del entries[path]
+                self.index['staged'][path] = None
+        self._save()
+
+    def status(self, refresh: bool = True, deadline: Optional[float] = None) -> List[str]:
+        """
+        Only reads the snapshot index, refresh makes no difference
+        :param deadline: a time.perf_counter() value to give up at, for callers with a latency budget
+        :raises TimeoutError: if the deadline passed before every path was checked
+        :return: tracked paths whose content differs from their last recorded version
+        """
+        changed = []
+        for path, (blob_id, mode, size, mtime_ns, inode) in self.index['entries'].items():
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError()
+            full_path = self.child_dir / path
+            try:
+                st = os.lstat(str(full_path))
+            except FileNotFoundError:
+                changed.append(path)
+                continue
+            if _file_mode(st) != mode or stat.S_ISDIR(st.st_mode):
+                changed.append(path)
+            elif (st.st_size, st.st_mtime_ns, st.st_ino) == (size, mtime_ns, inode) \
+                    and mtime_ns < self._index_mtime_ns:
+                continue
+            elif self._hash(full_path, st, write=False) != blob_id:
+                changed.append(path)
+        return sorted(changed)
+
+    def commit(self, message: str) -> bool:
+        """
+        Appends a snapshot of what add/remove staged, or when nothing was staged,
+        of every tracked file that changed
+
+        :return: False if there was nothing to snapshot
+        """
+        import hashlib
+
+        staged = self.index['staged']
+        if not staged:
+            for path in self.status():
+                staged[path] = self._record(path)
+        if not staged:
+            return False
+
+        record = {'parent': self.index['head'], 'time': int(time.time()), 'message': message, 'changes': staged}
+        line = json.dumps(record, sort_keys=True)
+        record = {'id': hashlib.sha256(line.encode()).hexdigest(), **record}
+        with (self.snapshot_dir / 'log').open('a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        committed = self._committed()
+        for path, change in staged.items():
+            if change is None:
+                committed.pop(path, None)
+            else:
+                committed[path] = change
+        self.index['head'] = record['id']
+        self.index['staged'] = {}
+        self._save()
+        return True
+
+    def _iter_log(self) -> Iterator[dict]:
+        with (self.snapshot_dir / 'log').open() as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def history(self) -> List[Revision]:
+        """
+        :return: snapshots, newest first
+        """
+        return [Revision(record['id'], record['time'], record['message']) for record in self._iter_log()][::-1]
+
+    def tracked_paths(self) -> Iterator[str]:
+        yield from sorted(self.index['entries'])
+
+    def _committed(self) -> Dict[str, list]:
+        """
+        :return: the (blob id, mode) of every path as of the last snapshot, replaying the log
+         once for indexes written before they were kept
+        """
+        if 'committed' not in self.index:
+            committed: Dict[str, list] = {}
+            for record in self._iter_log():
+                for path, change in record['changes'].items():
+                    if change is None:
+                        committed.pop(path, None)
+                    else:
+                        committed[path] = change
+            self.index['committed'] = committed
+        return self.index['committed']
+
+    def restore(self, relative_path: str):
+        """
+        Writes the last snapshotted version of a path, or of every file under it
+        """
+        from move import checkout_mode, open_for_checkout
+
+        for path, (blob_id, mode) in self._committed().items():
+            if path != relative_path and not path.startswith(relative_path + '/'):
+                continue
+            full_path = self.child_dir / path
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            data = self._read_blob(blob_id)
+            if mode == SYMLINK_MODE:
+                if os.path.lexists(str(full_path)):
+                    full_path.unlink()
+                os.symlink(os.fsdecode(data), str(full_path))
+            else:
+                # Like git checkout, keep the mode of the replaced file or follow the umask
+                tmp_path = full_path.with_name(f'.{full_path.name}.{os.getpid()}.tmp')
+                with open_for_checkout(tmp_path, checkout_mode(full_path, bool(mode & 0o111))) as f:
+                    f.write(data)
+                os.replace(str(tmp_path), str(full_path))
+            self._record(path)
+        self._save()
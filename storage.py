@@ -0,0 +1,183 @@
+"""
+Storage backends that keep the history of a child dir.
+
+    git       a git repo in the child dir, the default
+    snapshot  an append-only log of content-addressed blobs, see snapshot.py
+
+A project's backend is chosen with `et init --backend` and detected from the
+child dir afterwards. Both backends track the same working files, so linking
+and symlinks work the same way, only how versions are recorded differs.
+"""
+import os
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterable, Iterator, List, Type
+
+Revision = namedtuple('Revision', ['id', 'time', 'message'])
+
+
+class Backend(ABC):
+    """
+    Records versions of the files tracked in a child dir.
+    Paths are relative to the child dir, add and remove only stage until the next commit.
+    """
+    name: str
+
+    def __init__(self, child_dir: Path):
+        self.child_dir = child_dir
+
+    @classmethod
+    @abstractmethod
+    def init(cls, child_dir: Path) -> 'Backend':
+        """
+        Creates an empty store in an existing child dir
+        """
+
+    @abstractmethod
+    def add(self, relative_paths: Iterable[str]):
+        pass
+
+    @abstractmethod
+    def remove(self, relative_paths: Iterable[str]):
+        pass
+
+    @abstractmethod
+    def commit(self, message: str) -> bool:
+        """
+        Records what add and remove staged, or when nothing was staged, every change to tracked files
+
+        :return: False if there was nothing to commit
+        """
+
+    @abstractmethod
+    def status(self, refresh: bool = True) -> List[str]:
+        """
+        :param refresh: allow saving the stat data of files found unchanged, so the next check can skip them
+        :return: tracked paths with uncommitted changes
+        """
+
+    @abstractmethod
+    def history(self) -> List[Revision]:
+        """
+        :return: every commit, newest first
+        """
+
+    @abstractmethod
+    def tracked_paths(self) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def restore(self, relative_path: str):
+        """
+        Writes the committed version of a path back to the child dir
+        """
+
+
+class GitBackend(Backend):
+    name = 'git'
+
+    def __init__(self, child_dir: Path):
+        super().__init__(child_dir)
+        # Staged by add/remove, written by the next commit
+        self._index = None
+
+    @classmethod
+    def init(cls, child_dir: Path) -> 'GitBackend':
+        from git import Repo
+
+        Repo.init(child_dir)
+        return cls(child_dir)
+
+    @property
+    def repo(self):
+        from utils import open_repo
+        return open_repo(self.child_dir)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.repo.index
+        return self._index
+
+    def add(self, relative_paths: Iterable[str]):
+        from utils import stage_paths
+        stage_paths(self.index, relative_paths)
+
+    def remove(self, relative_paths: Iterable[str]):
+        import store
+
+        relative_paths = list(relative_paths)
+        self.index.remove(relative_paths, r=True, write=False)
+        store.unmark_large(self.child_dir, relative_paths)
+
+    def commit(self, message: str) -> bool:
+        from index_stat import get_changed_paths, get_staged_paths
+        from utils import stage_paths, write_and_commit
+
+        if self._index is None:
+            # Like `git add -u && git commit`, changes someone already staged are committed too
+            staged = get_staged_paths(self.repo)
+            changed = get_changed_paths(self.repo)
+            if not changed and not staged:
+                return False
+            modified = [path for path in changed if os.path.lexists(str(self.child_dir / path))]
+            stage_paths(self.index, modified)
+            for path in changed:
+                if path not in modified:
+                    del self.index.entries[(path, 0)]
+
+        write_and_commit(self.index, message)
+        self._index = None
+        return True
+
+    def status(self, refresh: bool = True) -> List[str]:
+        """
+        :return: paths staged in the index or changed in the working tree since the last commit
+        """
+        from index_stat import get_changed_paths, get_staged_paths
+
+        # Before the worktree check, which may write the index
+        staged = get_staged_paths(self.repo, save=refresh)
+        return sorted(set(staged).union(get_changed_paths(self.repo, refresh)))
+
+    def history(self) -> List[Revision]:
+        return [Revision(commit.hexsha, commit.committed_date, commit.message.strip())
+                for commit in self.repo.iter_commits()]
+
+    def tracked_paths(self) -> Iterator[str]:
+        from index_stat import iter_index_entries
+
+        try:
+            entries = iter_index_entries(self.child_dir / '.git' / 'index')
+        except FileNotFoundError:
+            return
+        except ValueError:
+            # An index format the fast reader doesn't support
+            yield from (path for path, stage in self.repo.index.entries)
+        else:
+            yield from (entry.path for entry in entries)
+
+    def restore(self, relative_path: str):
+        self.repo.git.checkout('HEAD', '--', relative_path)
+
+
+BACKEND_NAMES = ['git', 'snapshot']
+
+
+def get_backend_class(name: str) -> Type[Backend]:
+    if name == 'snapshot':
+        from snapshot import SnapshotBackend
+        return SnapshotBackend
+    return GitBackend
+
+
+def get_backend(child_dir: Path) -> Backend:
+    """
+    :return: the backend of an existing child dir
+    """
+    from snapshot import SnapshotBackend, is_snapshot_dir
+
+    if is_snapshot_dir(child_dir):
+        return SnapshotBackend(child_dir)
+    return GitBackend(child_dir)
@@ -0,0 +1,285 @@
+"""
+Content-addressed, chunked store for large tracked files.
+
+Files at or above config.LARGE_FILE_THRESHOLD bytes are split into fixed size
+chunks stored once under ET_HOME by their sha256, and the child repo only
+commits a small pointer listing the chunks. Hashing is streamed, so memory use
+does not depend on the file size.
+
+The child repo is configured with a git filter so plain git commands
+(status, diff, checkout) see the pointers too:
+
+    python store.py --chunk-size N clean   # content on stdin -> pointer on stdout
+    python store.py --chunk-size N smudge  # pointer on stdin -> content on stdout
+
+The command is registered with absolute paths, git also runs it where `et`
+isn't on the PATH (cron, GUI clients, a checkout). The filter finds the store
+from the repo it runs in, a child dir is always at the top of ET_HOME, so
+moving ET_HOME doesn't break it.
+"""
+import hashlib
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config import config
+
+POINTER_HEADER = b'et-store v1\n'
+CHUNK_SIZE = 4 * 1024 * 1024
+FILTER_NAME = 'et-store'
+# Seconds a chunk is kept by sweep even if nothing refers to it yet, e.g. while `et link` is storing a file
+SWEEP_GRACE = 60 * 60
+
+
+# Set when running as a git filter, which may not have ET_HOME in its environment
+_store_dir_override: Optional[Path] = None
+
+
+def store_dir() -> Path:
+    if _store_dir_override is not None:
+        return _store_dir_override
+    return Path(config.ET_HOME) / config.CONFIG_DIR_NAME / config.STORE_DIR_NAME
+
+
+def is_large(size: int) -> bool:
+    return size >= config.LARGE_FILE_THRESHOLD
+
+
+def _read_chunks(file: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _chunk_path(digest: str) -> Path:
+    return store_dir() / digest[:2] / digest[2:]
+
+
+def _pointer(chunks: List[Tuple[str, int]]) -> bytes:
+    lines = [f'size {sum(length for _, length in chunks)}']
+    lines.extend(f'chunk {digest} {length}' for digest, length in chunks)
+    return POINTER_HEADER + '\n'.join(lines).encode() + b'\n'
+
+
+def store_stream(file: BinaryIO, write: bool = True) -> bytes:
+    """
+    Splits a stream into chunks and returns its pointer
+
+    :param write: store chunks that aren't in the store yet, otherwise only compute the pointer
+    """
+    chunks = []
+    for chunk in _read_chunks(file):
+        digest = hashlib.sha256(chunk).hexdigest()
+        chunks.append((digest, len(chunk)))
+        if write:
+            _write_chunk(digest, chunk)
+    return _pointer(chunks)
+
+
+def store_file(path: Path, write: bool = True) -> bytes:
+    with open(str(path), 'rb') as f:
+        return store_stream(f, write)
+
+
+def _write_chunk(digest: str, chunk: bytes):
+    chunk_path = _chunk_path(digest)
+    if chunk_path.exists():
+        # Deduplicated, another file or version already stored it
+        return
+    chunk_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = chunk_path.with_name(f'{chunk_path.name}.{os.getpid()}.tmp')
+    with open(str(tmp_path), 'wb') as f:
+        f.write(chunk)
+    os.replace(str(tmp_path), str(chunk_path))
+
+
+def parse_pointer(data: bytes) -> Optional[List[Tuple[str, int]]]:
+    """
+    :return: the (sha256, length) of every chunk, or None if data isn't a pointer
+    """
+    if not data.startswith(POINTER_HEADER):
+        return None
+    chunks = []
+    for line in data[len(POINTER_HEADER):].decode().splitlines():
+        kind, _, value = line.partition(' ')
+        if kind == 'chunk':
+            digest, length = value.split()
+            chunks.append((digest, int(length)))
+    return chunks
+
+
+def restore_stream(pointer: bytes, out: BinaryIO):
+    """
+    Writes the content described by a pointer, one chunk at a time
+    """
+    for digest, length in parse_pointer(pointer):
+        with open(str(_chunk_path(digest)), 'rb') as f:
+            chunk = f.read()
+        if len(chunk) != length or hashlib.sha256(chunk).hexdigest() != digest:
+            raise IOError(f'Corrupt chunk {digest} in "{store_dir()}"')
+        out.write(chunk)
+
+
+def _referenced_chunks(child_dir: Path) -> Set[str]:
+    """
+    :return: the chunks of every pointer reachable from a branch or staged in the index of a child repo
+    """
+    def git(*args: str, stdin: bytes = b'') -> bytes:
+        return subprocess.run(['git', *args], cwd=str(child_dir), input=stdin, stdout=subprocess.PIPE,
+                              check=True).stdout
+
+    objects = git('rev-list', '--objects', '--all', '--indexed-objects')
+    # Lines are the object id, followed by a path for trees and blobs
+    ids = b''.join(line.split(b' ', 1)[0] + b'\n' for line in objects.splitlines())
+    types = [line.split() for line in git('cat-file', '--batch-check', stdin=ids).splitlines()]
+    # Pointers are small, larger blobs are never read
+    blobs = [object_id for object_id, kind, size in types
+             if kind == b'blob' and int(size) < config.LARGE_FILE_THRESHOLD]
+
+    digests = set()
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=str(child_dir),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def feed():
+        with process.stdin:
+            process.stdin.write(b''.join(object_id + b'\n' for object_id in blobs))
+
+    # Fed from a thread, git stops reading its input while its output isn't read
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    with process.stdout:
+        for _ in blobs:
+            size = int(process.stdout.readline().split()[2])
+            data = process.stdout.read(size + 1)[:size]
+            try:
+                chunks = parse_pointer(data)
+            except ValueError:
+                chunks = None
+            if chunks:
+                digests.update(digest for digest, length in chunks)
+    feeder.join()
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, 'git cat-file --batch')
+    return digests
+
+
+def sweep(child_dirs: Iterable[Path], grace: float = SWEEP_GRACE) -> int:
+    """
+    Deletes the chunks no pointer in any child repo refers to anymore, e.g. after `et compact`.
+    The store is shared, so child_dirs must be every git child dir in ET_HOME.
+
+    :return: the number of chunks deleted
+    """
+    referenced = set()
+    for child_dir in child_dirs:
+        referenced.update(_referenced_chunks(child_dir))
+
+    removed = 0
+    cutoff = time.time() - grace
+    for chunk in store_dir().glob('*/*'):
+        # Temporary files of chunks being written have a suffix
+        if '.' in chunk.name or chunk.parent.name + chunk.name in referenced:
+            continue
+        if chunk.stat().st_mtime < cutoff:
+            chunk.unlink()
+            removed += 1
+    return removed
+
+
+def configure_repo(child_dir: Path):
+    """
+    Registers the clean/smudge filter in a child repo's local config, outside of the working tree
+    """
+    from utils import open_repo
+
+    # Only the chunk size is pinned, the pointers git compares with must be split the same way.
+    # Git runs the command through the shell, it can't count on `et` being on the PATH.
+    command = f'{shlex.quote(sys.executable)} {shlex.quote(str(Path(__file__).resolve()))} --chunk-size {CHUNK_SIZE}'
+    with open_repo(child_dir).config_writer() as writer:
+        section = f'filter "{FILTER_NAME}"'
+        writer.set_value(section, 'clean', f'{command} clean')
+        writer.set_value(section, 'smudge', f'{command} smudge')
+        writer.set_value(section, 'required', 'true')
+
+
+def mark_large(child_dir: Path, relative_paths: List[str]):
+    """
+    Routes paths through the filter in .git/info/attributes, so the
+    attributes never show up as a tracked file in the child dir
+    """
+    attributes_path = child_dir / '.git' / 'info' / 'attributes'
+    existing = attributes_path.read_text().splitlines() if attributes_path.exists() else []
+    lines = [f'/{path} filter={FILTER_NAME}' for path in relative_paths]
+    new_lines = [line for line in lines if line not in existing]
+    if new_lines:
+        attributes_path.parent.mkdir(parents=True, exist_ok=True)
+        with attributes_path.open('a') as f:
+            f.write(''.join(f'{line}\n' for line in new_lines))
+
+
+def unmark_large(child_dir: Path, relative_paths: List[str]):
+    """
+    Removes the attributes lines of paths, or of any file under them, that stop being tracked
+    """
+    attributes_path = child_dir / '.git' / 'info' / 'attributes'
+    if not attributes_path.exists():
+        return
+    prefixes = [f'/{path}' for path in relative_paths]
+
+    def is_unlinked(line: str) -> bool:
+        pattern, _, attribute = line.rpartition(' ')
+        return attribute == f'filter={FILTER_NAME}' and any(
+            pattern == prefix or pattern.startswith(prefix + '/') for prefix in prefixes)
+
+    lines = attributes_path.read_text().splitlines()
+    kept = [line for line in lines if not is_unlinked(line)]
+    if len(kept) != len(lines):
+        attributes_path.write_text(''.join(f'{line}\n' for line in kept))
+
+
+def main(argv=None) -> int:
+    global CHUNK_SIZE, _store_dir_override
+
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='et filter')
+    parser.add_argument('--store', type=Path, help='chunk store directory, defaults to the one next to the repo')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('action', choices=['clean', 'smudge'])
+    args = parser.parse_args(argv)
+
+    if args.store is None:
+        from discovery import discover
+
+        # Git runs filters at the top of the working tree, the child dir in ET_HOME
+        et_home = discover(Path.cwd()).working_dir.parent
+        args.store = et_home / config.CONFIG_DIR_NAME / config.STORE_DIR_NAME
+    _store_dir_override = args.store
+    CHUNK_SIZE = args.chunk_size
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    if args.action == 'clean':
+        # Content that already is a pointer (e.g. from a checkout) passes through
+        head = stdin.peek(len(POINTER_HEADER))[:len(POINTER_HEADER)]
+        if head == POINTER_HEADER:
+            stdout.write(stdin.read())
+        else:
+            stdout.write(store_stream(stdin))
+    else:
+        data = stdin.read()
+        if parse_pointer(data) is None:
+            stdout.write(data)
+        else:
+            restore_stream(data, stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
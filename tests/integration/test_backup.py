@@ -0,0 +1,100 @@
+import shutil
+from pathlib import Path
+
+from git import Repo
+
+import backup
+from main import cmd_commit, cmd_export, cmd_import, cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+
+class TestBackupCommands(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+
+    def export(self, name, *args):
+        archive = Path(self.test_dir, name)
+        result = self.runner.invoke(cmd_export, [str(archive), *args])
+        if result.exception:
+            raise result.exception
+        return archive, result
+
+    def test_exports_only_new_commits(self):
+        archive, result = self.export('first.tgz')
+        self.assertIn('1 exported', result.output)
+        self.assertTrue(self.child_dir.joinpath('.git', backup.MARKER_NAME).exists())
+
+        archive, result = self.export('second.tgz')
+        self.assertIn('1 unchanged', result.output)
+
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.runner.invoke(cmd_commit, [])
+        archive, result = self.export('third.tgz')
+        self.assertIn('1 exported', result.output)
+
+    def test_import_restores_projects_and_links(self):
+        first, _ = self.export('first.tgz')
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.runner.invoke(cmd_commit, [])
+        second, _ = self.export('second.tgz')
+        head = Repo(str(self.child_dir)).head.commit.hexsha
+
+        # A new machine: same parent dirs, empty ET_HOME
+        shutil.rmtree(str(self.ET_HOME))
+        self.project_dir.joinpath('.env').unlink()
+
+        for archive in [first, second]:
+            result = self.runner.invoke(cmd_import, [str(archive)])
+            self.assertEqual(0, result.exit_code, result.output)
+
+        self.assertEqual(head, Repo(str(self.child_dir)).head.commit.hexsha)
+        self.assertTrue(self.project_dir.joinpath('.env').is_symlink(), 'Parent symlink should be restored')
+        self.assertEqual('A=2', self.project_dir.joinpath('.env').read_text())
+
+    def test_incremental_archive_needs_its_base(self):
+        self.export('first.tgz')
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.runner.invoke(cmd_commit, [])
+        second, _ = self.export('second.tgz')
+        shutil.rmtree(str(self.ET_HOME))
+
+        result = self.runner.invoke(cmd_import, [str(second)])
+
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('1 error', result.output)
+        self.assertFalse(self.child_dir.exists(), 'A project that could not be restored should be removed')
+
+    def test_import_deletes_removed_branches(self):
+        repo = Repo(str(self.child_dir))
+        repo.create_head('feature')
+        first, _ = self.export('first.tgz')
+        repo.delete_head('feature')
+        second, _ = self.export('second.tgz')
+
+        shutil.rmtree(str(self.ET_HOME))
+        self.project_dir.joinpath('.env').unlink()
+        for archive in [first, second]:
+            result = self.runner.invoke(cmd_import, [str(archive)])
+            self.assertEqual(0, result.exit_code, result.output)
+
+        imported = Repo(str(self.child_dir))
+        self.assertEqual([imported.active_branch], imported.heads)
+
+    def test_import_does_not_move_refs_when_the_current_branch_diverged(self):
+        repo = Repo(str(self.child_dir))
+        repo.create_head('other')
+        archive, _ = self.export('first.tgz')
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.runner.invoke(cmd_commit, [])
+        repo.heads.other.commit = repo.head.commit
+
+        result = self.runner.invoke(cmd_import, [str(archive)])
+
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('can not fast-forward', result.output)
+        self.assertEqual(repo.head.commit, repo.heads.other.commit, 'Other branches should not move')
@@ -1,15 +1,107 @@
+import os
+
+from git import Repo
+
+from main import cmd_commit, cmd_init, cmd_link, cmd_log, cmd_status
 from tests.helpers import BaseTestCase
 
 
 class TestCommitCommand(BaseTestCase):
+    def init_project(self):
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+    def link(self, name, content=''):
+        self.project_dir.joinpath(name).write_text(content)
+        result = self.runner.invoke(cmd_link, [name])
+        if result.exception:
+            raise result.exception
+
     def test_can_commit(self):
         """
         Default use case where user invokes `et commit` with minimal parameters
         """
-        self.fail('Not Implemented')
+        self.init_project()
+        self.link('.env', 'A=1')
+        self.project_dir.joinpath('.env').write_text('A=2')
+
+        result = self.runner.invoke(cmd_commit, ['-m', 'Update env'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        child_repo = Repo(str(self.child_dir))
+        self.assertEqual('Update env', child_repo.head.commit.message)
+        self.assertEqual(b'A=2', child_repo.head.commit.tree['.env'].data_stream.read())
+        self.assertFalse(child_repo.is_dirty(), 'Everything should be committed')
 
     def test_does_not_work_outside_of_a_linked_project(self):
         """
         The users cwd must be inside of a project
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_commit, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for an unlinked project')
+        self.assertIn('Could not find an associated project', result.output)
+
+    def test_skips_commit_without_changes(self):
+        self.init_project()
+        self.link('.env')
+        head = Repo(str(self.child_dir)).head.commit
+
+        result = self.runner.invoke(cmd_commit, [])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertIn('Nothing to commit', result.output)
+        self.assertEqual(head, Repo(str(self.child_dir)).head.commit, 'No commit should be created')
+
+    def test_commits_deleted_files(self):
+        self.init_project()
+        self.link('.env')
+        os.remove(str(self.child_dir / '.env'))
+
+        result = self.runner.invoke(cmd_commit, [])
+        if result.exception:
+            raise result.exception
+
+        self.assertNotIn('.env', Repo(str(self.child_dir)).head.commit.tree)
+
+    def test_commits_staged_changes(self):
+        self.init_project()
+        self.link('.env', 'A=1')
+        self.child_dir.joinpath('.env').write_text('A=2')
+        child_repo = Repo(str(self.child_dir))
+        child_repo.git.add('.env')
+
+        result = self.runner.invoke(cmd_commit, ['-m', 'Staged by hand'])
+        if result.exception:
+            raise result.exception
+
+        self.assertNotIn('Nothing to commit', result.output)
+        child_repo = Repo(str(self.child_dir))
+        self.assertEqual('Staged by hand', child_repo.head.commit.message)
+        self.assertEqual(b'A=2', child_repo.head.commit.tree['.env'].data_stream.read())
+
+    def test_can_commit_to_snapshot_project(self):
+        result = self.runner.invoke(cmd_init, ['--backend', 'snapshot'])
+        if result.exception:
+            raise result.exception
+        self.assertFalse(self.child_dir.joinpath('.git').exists(), 'Snapshot projects have no git repo')
+        self.link('.env', 'A=1')
+        self.assertTrue(self.project_dir.joinpath('.env').is_symlink())
+
+        self.project_dir.joinpath('.env').write_text('A=22')
+        result = self.runner.invoke(cmd_status, [])
+        self.assertIn('modified:   .env', result.output)
+
+        result = self.runner.invoke(cmd_commit, ['-m', 'Update env'])
+        if result.exception:
+            raise result.exception
+        self.assertIn('Nothing to commit', self.runner.invoke(cmd_status, []).output)
+
+        # Works from the child dir too, without a git repo to discover
+        os.chdir(str(self.child_dir))
+        result = self.runner.invoke(cmd_log, [])
+        self.assertEqual(['Update env', 'Initialize tracking for ".env"', 'Link project to parent directory'],
+                         [line.split(' ', 3)[3] for line in result.output.splitlines()])
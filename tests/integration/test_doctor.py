@@ -0,0 +1,108 @@
+import os
+
+from main import cmd_doctor, cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+
+class TestDoctorCommand(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+        fixtures = self.project_dir.joinpath('fixtures')
+        fixtures.mkdir()
+        fixtures.joinpath('data.json').write_text('{}')
+        self.project_dir.joinpath('.env').write_text('A=1')
+        result = self.runner.invoke(cmd_link, ['.env', 'fixtures'])
+        if result.exception:
+            raise result.exception
+
+    def test_can_doctor(self):
+        """
+        Default use case where user invokes `et doctor` with minimal parameters
+        """
+        result = self.runner.invoke(cmd_doctor, [])
+
+        self.assertEqual(0, result.exit_code, 'Expect no problems')
+        self.assertIn('0 problems remaining', result.output)
+
+    def test_finds_broken_links(self):
+        self.project_dir.joinpath('fixtures').unlink()
+        self.project_dir.joinpath('.env').unlink()
+        self.project_dir.joinpath('.env').write_text('A=1')
+
+        result = self.runner.invoke(cmd_doctor, [])
+
+        self.assertEqual(1, result.exit_code, 'Expected problems')
+        self.assertIn('missing        project_root: fixtures', result.output)
+        self.assertIn('replaced       project_root: .env', result.output)
+
+    def test_can_repair(self):
+        self.project_dir.joinpath('fixtures').unlink()
+        self.project_dir.joinpath('.env').unlink()
+        self.project_dir.joinpath('.env').symlink_to(self.test_dir)
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('wrong-target', result.output)
+
+        result = self.runner.invoke(cmd_doctor, [])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertTrue(self.project_dir.joinpath('.env').samefile(self.child_dir / '.env'))
+        self.assertEqual('{}', self.project_dir.joinpath('fixtures', 'data.json').read_text())
+
+    def test_can_restore_dangling_links(self):
+        os.remove(str(self.child_dir / '.env'))
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('dangling', result.output)
+        self.assertEqual('A=1', self.project_dir.joinpath('.env').read_text())
+
+    def test_conflicts_are_not_repaired(self):
+        self.project_dir.joinpath('.env').unlink()
+        self.project_dir.joinpath('.env').write_text('A=2')
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+
+        self.assertEqual(1, result.exit_code, 'Expected the conflict to remain')
+        self.assertIn('conflict', result.output)
+        self.assertEqual('A=2', self.project_dir.joinpath('.env').read_text())
+
+    def test_finds_links_tracked_by_parent(self):
+        from git import Repo
+
+        Repo(str(self.project_dir)).index.add(['.env'])
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+
+        self.assertEqual(1, result.exit_code, 'Expected a problem that cannot be repaired')
+        self.assertIn('tracked        project_root: .env', result.output)
+
+    def replace_fixtures(self, content: str):
+        self.project_dir.joinpath('fixtures').unlink()
+        self.project_dir.joinpath('fixtures').mkdir()
+        self.project_dir.joinpath('fixtures', 'data.json').write_text(content)
+
+    def test_repairs_replaced_directories(self):
+        self.replace_fixtures('{}')
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('replaced       project_root: fixtures\n', result.output)
+        self.assertNotIn('fixtures/data.json', result.output)
+        self.assertTrue(self.project_dir.joinpath('fixtures').is_symlink())
+        self.assertEqual('{}', self.project_dir.joinpath('fixtures', 'data.json').read_text())
+
+    def test_replaced_directories_with_changes_are_conflicts(self):
+        self.replace_fixtures('{"a": 1}')
+
+        result = self.runner.invoke(cmd_doctor, ['--repair'])
+
+        self.assertEqual(1, result.exit_code, 'Expected the conflict to remain')
+        self.assertIn('conflict       project_root: fixtures\n', result.output)
+        self.assertEqual('{"a": 1}', self.project_dir.joinpath('fixtures', 'data.json').read_text())
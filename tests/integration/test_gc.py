@@ -0,0 +1,104 @@
+import os
+import subprocess
+from unittest import mock
+
+from git import Repo
+
+import maintenance
+import shared_objects
+from main import cmd_commit, cmd_gc, cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+from utils import close_repos
+
+
+class TestGcCommand(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_repos)
+
+    def init_and_link(self, *args):
+        result = self.runner.invoke(cmd_init, list(args))
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        result = self.runner.invoke(cmd_link, ['.env'])
+        if result.exception:
+            raise result.exception
+
+    def loose_objects(self, objects_dir):
+        return list(shared_objects.iter_loose_objects(objects_dir))
+
+    def test_can_gc(self):
+        """
+        Default use case where user invokes `et gc` with minimal parameters
+        """
+        self.init_and_link()
+        self.assertTrue(self.loose_objects(self.child_dir / '.git' / 'objects'))
+
+        result = self.runner.invoke(cmd_gc, ['--threshold', '0', '-j', '1'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertIn(f'{self.child_dir.name}: gc', result.output)
+        self.assertEqual([], self.loose_objects(self.child_dir / '.git' / 'objects'))
+        self.assertEqual(b'A=1', Repo(str(self.child_dir)).head.commit.tree['.env'].data_stream.read())
+
+    def test_skips_repos_below_threshold(self):
+        self.init_and_link()
+
+        result = self.runner.invoke(cmd_gc, [])
+
+        self.assertIn('1 skipped', result.output)
+        self.assertTrue(self.loose_objects(self.child_dir / '.git' / 'objects'))
+
+    def test_out_of_time(self):
+        self.init_and_link()
+
+        result = self.runner.invoke(cmd_gc, ['--threshold', '0', '--budget', '0'])
+
+        self.assertIn('1 out-of-time', result.output)
+
+    def test_shared_projects_are_packed_in_the_store(self):
+        self.init_and_link('--shared')
+
+        result = self.runner.invoke(cmd_gc, ['--threshold', '0', '-j', '1'])
+        if result.exception:
+            raise result.exception
+
+        self.assertIn(f'{self.child_dir.name}: shared', result.output)
+        self.assertIn('objects: packed', result.output)
+        self.assertEqual([], self.loose_objects(shared_objects.shared_objects_dir()))
+        self.assertTrue(os.listdir(str(shared_objects.shared_objects_dir() / 'pack')))
+        self.assertEqual(b'A=1', Repo(str(self.child_dir)).head.commit.tree['.env'].data_stream.read())
+
+    def consolidate_shared_packs(self, share_new_commit: bool):
+        self.init_and_link('--shared')
+        self.runner.invoke(cmd_gc, ['--threshold', '0', '-j', '1'])
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.runner.invoke(cmd_commit, [])
+        if share_new_commit:
+            shared_objects.share_objects(self.child_dir)
+
+        # An object no ref of this project reaches, like the objects of other projects
+        objects_dir = shared_objects.shared_objects_dir()
+        env = dict(os.environ, GIT_OBJECT_DIRECTORY=str(objects_dir))
+        other = subprocess.run(['git', 'hash-object', '-w', '--stdin'], cwd=str(self.child_dir), env=env,
+                               input=b'other project', stdout=subprocess.PIPE, check=True).stdout.strip()
+
+        with mock.patch.object(maintenance, 'MAX_SHARED_PACKS', 1):
+            result = maintenance.pack_shared_store(str(self.child_dir / '.git'))
+
+        self.assertEqual('repacked', result['action'])
+        self.assertEqual(1, len(list((objects_dir / 'pack').glob('*.pack'))))
+        subprocess.run(['git', 'cat-file', '-e', other], cwd=str(self.child_dir), env=env, check=True)
+        repo = Repo(str(self.child_dir))
+        self.assertEqual(b'A=2', repo.head.commit.tree['.env'].data_stream.read())
+        self.assertEqual(b'A=1', repo.head.commit.parents[0].tree['.env'].data_stream.read())
+
+    def test_shared_store_packs_are_consolidated(self):
+        self.consolidate_shared_packs(share_new_commit=True)
+
+    def test_shared_store_packs_are_consolidated_while_a_child_has_local_objects(self):
+        # Projects below the gc threshold keep their newest objects until the next run
+        self.consolidate_shared_packs(share_new_commit=False)
@@ -0,0 +1,149 @@
+import os
+import stat
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from git import Repo
+
+from main import cmd_hook_install, cmd_hook_uninstall, cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+class TestHookCommand(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.hook_path = self.project_dir / '.git' / 'hooks' / 'post-commit'
+        self.branch = Repo(str(self.project_dir)).active_branch.name
+
+    def git_commit(self, message):
+        env = dict(os.environ, ET_HOME=str(self.ET_HOME), GIT_AUTHOR_NAME='et', GIT_AUTHOR_EMAIL='et@example.com',
+                   GIT_COMMITTER_NAME='et', GIT_COMMITTER_EMAIL='et@example.com')
+        subprocess.check_call(['git', 'commit', '--allow-empty', '-q', '-m', message],
+                              cwd=str(self.project_dir), env=env)
+
+    def test_can_install(self):
+        result = self.runner.invoke(cmd_hook_install, [])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertTrue(os.access(str(self.hook_path), os.X_OK), 'Hook should be executable')
+
+    def test_will_not_replace_other_hooks(self):
+        self.hook_path.write_text('#!/bin/sh\necho mine\n')
+
+        result = self.runner.invoke(cmd_hook_install, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for an existing hook')
+        self.assertIn('already exists', result.output)
+        self.assertIn('echo mine', self.hook_path.read_text())
+
+    def test_can_uninstall(self):
+        self.runner.invoke(cmd_hook_install, [])
+
+        result = self.runner.invoke(cmd_hook_uninstall, [])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertFalse(self.hook_path.exists())
+
+    def test_parent_commit_commits_tracked_changes(self):
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.runner.invoke(cmd_hook_install, [])
+        child_repo = Repo(str(self.child_dir))
+        head = child_repo.head.commit
+
+        self.git_commit('Nothing changed')
+        self.assertEqual(head, child_repo.head.commit, 'Expected no child commit without changes')
+
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.git_commit('Change the env')
+
+        self.assertEqual(f'[{self.branch}] Change the env', Repo(str(self.child_dir)).head.commit.message)
+
+    def test_unchanged_commit_loads_no_heavy_modules(self):
+        """
+        Every parent commit waits for the hook to decide there is nothing to commit
+        """
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        # Same content with a new mtime, the hook has to hash the file
+        os.utime(str(self.project_dir / '.env'), ns=(time.time_ns() + 10 ** 9,) * 2)
+        code = 'import sys, hook\n' \
+               'hook.main(["post-commit", "--background"])\n' \
+               'print(*[name for name in ["git", "click", "logging", "subprocess", "store"] if name in sys.modules])'
+        env = dict(os.environ, ET_HOME=str(self.ET_HOME), PYTHONPATH=str(REPO_ROOT))
+
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=str(self.project_dir), env=env,
+                                         universal_newlines=True)
+
+        self.assertEqual('', output.strip())
+
+    def test_background_commit(self):
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.runner.invoke(cmd_hook_install, ['--background'])
+        self.project_dir.joinpath('.env').write_text('A=2')
+
+        self.git_commit('Change the env')
+
+        child_repo = Repo(str(self.child_dir))
+        for _ in range(50):
+            if child_repo.head.commit.message == f'[{self.branch}] Change the env':
+                break
+            time.sleep(0.1)
+        self.assertEqual(f'[{self.branch}] Change the env', child_repo.head.commit.message)
+
+    def git_checkout(self, *args):
+        subprocess.check_call(['git', 'checkout', '-q', *args], cwd=str(self.project_dir),
+                              env=dict(os.environ, ET_HOME=str(self.ET_HOME)))
+
+    def test_checkout_mirrors_branch(self):
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.project_dir.joinpath('.other').write_text('B=1')
+        self.runner.invoke(cmd_link, ['.env', '.other'])
+        self.runner.invoke(cmd_hook_install, [])
+        self.child_dir.joinpath('.env').chmod(0o600)
+        other_inode = self.child_dir.joinpath('.other').stat().st_ino
+
+        self.git_checkout('-b', 'feature')
+        self.assertEqual('feature', Repo(str(self.child_dir)).active_branch.name)
+
+        self.project_dir.joinpath('.env').write_text('A=2')
+        self.git_commit('Change the env')
+        self.git_checkout(self.branch)
+
+        child_repo = Repo(str(self.child_dir))
+        self.assertEqual(self.branch, child_repo.active_branch.name)
+        self.assertEqual('A=1', self.project_dir.joinpath('.env').read_text())
+        self.assertTrue(self.project_dir.joinpath('.env').is_symlink())
+        self.assertFalse(child_repo.is_dirty(untracked_files=True), 'Index should match the checked out files')
+        self.assertEqual(other_inode, self.child_dir.joinpath('.other').stat().st_ino,
+                         'Files with the same blob should not be rewritten')
+
+        self.git_checkout('feature')
+        self.assertEqual('A=2', self.project_dir.joinpath('.env').read_text())
+        self.assertEqual(0o600, stat.S_IMODE(self.child_dir.joinpath('.env').stat().st_mode),
+                         'Rewritten files should keep their permissions')
+
+    def test_checkout_removes_files_missing_from_branch(self):
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.runner.invoke(cmd_hook_install, [])
+        self.git_checkout('-b', 'feature')
+        self.project_dir.joinpath('.extra').write_text('C=1')
+        self.runner.invoke(cmd_link, ['.extra'])
+
+        self.git_checkout(self.branch)
+        self.assertFalse(os.path.lexists(str(self.project_dir / '.extra')))
+        self.assertFalse(self.child_dir.joinpath('.extra').exists())
+
+        self.git_checkout('feature')
+        self.assertEqual('C=1', self.project_dir.joinpath('.extra').read_text())
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from unittest import mock
 
 from config import config
 from main import cmd_init
@@ -176,3 +177,54 @@ class TestInitCommand(BaseTestCase):
 
         self.assertNotEqual(0, result.exit_code, 'Expected command to fail validation')
         self.assertIn('Must not contain path delimiter', result.output)
+
+    def test_can_scan_a_tree(self):
+        """
+        `et init --scan` initializes every untracked repo under a directory,
+        skipping vendored repos and giving repos with the same name distinct child dirs
+        """
+        src_dir = Path(self.test_dir).joinpath('src')
+        for path in ['a/api', 'b/api', 'web', 'web/vendor/lib', 'node_modules/dep']:
+            src_dir.joinpath(path).mkdir(parents=True)
+            init_git_repo(src_dir.joinpath(path))
+
+        result = self.runner.invoke(cmd_init, ['--scan', str(src_dir), '-j', '2'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expected no errors')
+        self.assertIn('Initialized 3 projects', result.output)
+        for name, path in [('api', 'a/api'), ('b-api', 'b/api'), ('web', 'web')]:
+            self.assertTrue(self.ET_HOME.joinpath(name, config.PARENT_SYMLINK_NAME).samefile(src_dir / path))
+        self.assertEqual({'api', 'b-api', 'web'}, {path.name for path in self.ET_HOME.iterdir()} - {'.etconfig'})
+
+        result = self.runner.invoke(cmd_init, ['--scan', str(src_dir)])
+        self.assertIn('No untracked git repositories', result.output, 'Tracked repos should be skipped')
+
+    def make_template(self, *args) -> Path:
+        template_dir = Path(self.test_dir).joinpath('template')
+        template_dir.mkdir()
+        init_git_repo(template_dir)
+        result = self.runner.invoke(cmd_init, [str(template_dir), *args])
+        if result.exception:
+            raise result.exception
+        return self.ET_HOME / 'template'
+
+    def test_rejects_snapshot_templates(self):
+        template_child = self.make_template('--backend', 'snapshot')
+
+        result = self.runner.invoke(cmd_init, ['--template', 'template'])
+
+        self.assertNotEqual(0, result.exit_code)
+        self.assertIn('only git projects can be templates', result.output)
+        self.assertFalse(self.child_dir.exists(), 'Nothing should be created')
+        self.assertFalse(template_child.joinpath('.git').exists(), 'The template should be left untouched')
+
+    def test_failed_init_removes_the_child_dir(self):
+        self.make_template()
+
+        with mock.patch('main.start_from_template', side_effect=RuntimeError('checkout failed')):
+            result = self.runner.invoke(cmd_init, ['--template', 'template'])
+
+        self.assertNotEqual(0, result.exit_code)
+        self.assertFalse(self.child_dir.exists(), 'A half created child dir would block running init again')
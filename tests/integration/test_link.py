@@ -1,47 +1,184 @@
+from main import cmd_init, cmd_link
 from tests.helpers import BaseTestCase
 
 
 class TestLink(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+    def assertLinked(self, name):
+        parent_path = self.project_dir.joinpath(name)
+        child_path = self.child_dir.joinpath(name)
+        self.assertTrue(parent_path.is_symlink(), 'Parent path should be a symlink')
+        self.assertFalse(child_path.is_symlink(), 'Child path should not be a symlink')
+        self.assertTrue(parent_path.samefile(child_path), 'Parent path should point to the child path')
+
+    def child_commit_count(self):
+        from git import Repo
+        return len(list(Repo(str(self.child_dir)).iter_commits()))
+
     def test_can_link(self):
         """
         Default use case where user invokes `et link` with minimal parameters
         """
-        self.fail('Not Implemented')
+        self.project_dir.joinpath('.env').write_text('SECRET=1')
+
+        result = self.runner.invoke(cmd_link, ['.env'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertLinked('.env')
+        self.assertEqual('SECRET=1', self.project_dir.joinpath('.env').read_text())
 
     def test_requires_a_file_argument(self):
         """
         A user must pass a file argument
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_link, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error without a file argument')
+        self.assertIn('At least one path is required', result.output)
 
     def test_file_must_exist(self):
         """
         File argument must exist
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_link, ['does-not-exist'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for a missing file')
+        self.assertIn('does not exist', result.output)
 
     def test_file_argument_can_be_a_file(self):
         """
         File argument can be a file
         """
-        self.fail('Not Implemented')
+        self.project_dir.joinpath('settings.local.json').write_text('{}')
+
+        result = self.runner.invoke(cmd_link, ['settings.local.json'])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertLinked('settings.local.json')
 
     def test_file_argument_can_be_a_dir(self):
         """
         File argument can be a directory
         """
-        self.fail('Not Implemented')
+        fixtures = self.project_dir.joinpath('fixtures')
+        fixtures.mkdir()
+        fixtures.joinpath('data.json').write_text('{}')
+
+        result = self.runner.invoke(cmd_link, ['fixtures'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertLinked('fixtures')
+        self.assertTrue(self.child_dir.joinpath('fixtures', 'data.json').is_file())
 
     def test_file_argument_may_not_be_a_symlink(self):
         """
         Not sure what the use case of allowing symlinks would be...
         """
-        self.fail('Not Implemented')
+        target = self.project_dir.joinpath('target')
+        target.write_text('')
+        self.project_dir.joinpath('a-symlink').symlink_to(target)
+
+        result = self.runner.invoke(cmd_link, ['a-symlink'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error when linking a symlink')
+        self.assertIn('is already a symlink', result.output)
 
     def test_cannot_link_file_thats_already_linked(self):
         """
         Cannot link something that's already been linked
         """
-        self.fail('Not Implemented')
+        self.project_dir.joinpath('.env').write_text('')
+        self.runner.invoke(cmd_link, ['.env'])
+
+        result = self.runner.invoke(cmd_link, ['.env'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error when linking twice')
+        self.assertIn('is already linked', result.output)
+
+    def test_can_link_many_files_in_one_commit(self):
+        """
+        Multiple files and glob patterns are linked together in a single commit
+        """
+        self.project_dir.joinpath('.env').write_text('')
+        self.project_dir.joinpath('config.local.json').write_text('')
+        self.project_dir.joinpath('config.local.yml').write_text('')
+        commits_before = self.child_commit_count()
+
+        result = self.runner.invoke(cmd_link, ['.env', 'config.local.*'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        for name in ['.env', 'config.local.json', 'config.local.yml']:
+            self.assertLinked(name)
+        self.assertEqual(commits_before + 1, self.child_commit_count(), 'Expected a single commit')
+
+    def test_can_read_paths_from_stdin(self):
+        self.project_dir.joinpath('.env').write_text('')
+        self.project_dir.joinpath('.env.test').write_text('')
+
+        result = self.runner.invoke(cmd_link, ['--from-file', '-'], input='.env\n# a comment\n\n.env.test\n')
+        if result.exception:
+            raise result.exception
+
+        self.assertLinked('.env')
+        self.assertLinked('.env.test')
+
+    def test_nothing_is_linked_if_any_path_is_invalid(self):
+        """
+        All paths are validated before any of them are moved
+        """
+        self.project_dir.joinpath('.env').write_text('')
+        self.child_dir.joinpath('taken').write_text('')
+        self.project_dir.joinpath('taken').write_text('')
+
+        result = self.runner.invoke(cmd_link, ['.env', 'taken'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error when a destination exists')
+        self.assertIn('already exists', result.output)
+        self.assertFalse(self.project_dir.joinpath('.env').is_symlink(), 'Nothing should have been linked')
+
+    def test_glob_must_match(self):
+        result = self.runner.invoke(cmd_link, ['*.nothing'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for a pattern with no matches')
+        self.assertIn('No paths match', result.output)
+
+    def test_warns_about_paths_the_parent_tracks_or_does_not_ignore(self):
+        from git import Repo
+
+        for name in ['.env', 'config.yml', 'local.ini']:
+            self.project_dir.joinpath(name).write_text('A=1')
+        self.project_dir.joinpath('.gitignore').write_text('*.ini\n')
+        Repo(str(self.project_dir)).index.add(['config.yml'])
+
+        result = self.runner.invoke(cmd_link, ['.env', 'config.yml', 'local.ini'])
+        if result.exception:
+            raise result.exception
+
+        self.assertIn('"config.yml" is tracked by the parent repository', result.output)
+        self.assertIn('".env" is not ignored by the parent repository', result.output)
+        self.assertNotIn('local.ini', result.output)
+        self.assertLinked('config.yml')
+
+    def test_warns_about_dirs_only_ignored_as_dirs(self):
+        self.project_dir.joinpath('secrets').mkdir()
+        self.project_dir.joinpath('secrets', 'key').write_text('A=1')
+        self.project_dir.joinpath('.gitignore').write_text('secrets/\n')
 
+        result = self.runner.invoke(cmd_link, ['secrets'])
+        if result.exception:
+            raise result.exception
 
+        # Once linked it is a symlink, which git sees as a file the dir-only rule doesn't match
+        self.assertIn('"secrets" is not ignored by the parent repository', result.output)
+        self.assertLinked('secrets')
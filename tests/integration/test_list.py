@@ -0,0 +1,48 @@
+import json
+import os
+
+from main import cmd_init, cmd_link, cmd_list
+from tests.helpers import BaseTestCase
+
+
+class TestListCommand(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+        fixtures = self.project_dir.joinpath('fixtures')
+        fixtures.mkdir()
+        fixtures.joinpath('data.json').write_text('{}')
+        self.project_dir.joinpath('.env').write_text('')
+        result = self.runner.invoke(cmd_link, ['.env', 'fixtures'])
+        if result.exception:
+            raise result.exception
+
+    def test_can_list(self):
+        """
+        Default use case where user invokes `et list` with minimal parameters
+        """
+        result = self.runner.invoke(cmd_list, [])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertEqual(['.env', 'fixtures/data.json'], result.output.splitlines())
+
+    def test_can_list_all_as_json(self):
+        os.chdir(self.test_dir)
+
+        result = self.runner.invoke(cmd_list, ['--all', '--json'])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        entries = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(['.env', 'fixtures/data.json'], [entry['path'] for entry in entries])
+        self.assertEqual(str(self.child_dir / '.env'), entries[0]['child_path'])
+        self.assertEqual({self.child_dir.name}, {entry['project'] for entry in entries})
+
+    def test_does_not_work_outside_of_a_linked_project(self):
+        os.chdir(self.test_dir)
+
+        result = self.runner.invoke(cmd_list, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error outside of a project')
@@ -1,15 +1,55 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from main import cmd_init, cmd_other
 from tests.helpers import BaseTestCase
 
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+
 
 class TestOtherCommand(BaseTestCase):
+    def init_project(self):
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
     def test_can_other(self):
         """
         Default use case where user invokes `et other` with minimal parameters
         """
-        self.fail('Not Implemented')
+        self.init_project()
+
+        result = self.runner.invoke(cmd_other, [])
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertEqual(str(self.child_dir), result.output.strip())
+
+        os.chdir(str(self.child_dir))
+        result = self.runner.invoke(cmd_other, [])
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertTrue(Path(result.output.strip()).samefile(self.project_dir))
 
     def test_does_not_work_outside_of_a_linked_project(self):
         """
         The users cwd must be inside of a project
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_other, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for an unlinked project')
+        self.assertIn('Could not find an associated project', result.output)
+
+    def test_does_not_import_git(self):
+        """
+        `et other` is used in shell aliases and must not pay for importing GitPython
+        """
+        self.init_project()
+        code = 'import sys; from main import et\n' \
+               'try:\n    et(["other"])\nexcept SystemExit:\n    pass\n' \
+               'print("git" in sys.modules)'
+        env = dict(os.environ, ET_HOME=str(self.ET_HOME), PYTHONPATH=str(REPO_ROOT))
+
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=str(self.project_dir), env=env,
+                                         universal_newlines=True)
+
+        self.assertEqual([str(self.child_dir), 'False'], output.split())
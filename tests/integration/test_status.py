@@ -1,15 +1,78 @@
-from tests.helpers import BaseTestCase
+import json
+import os
+
+from git import Repo
+
+import prompt
+from main import cmd_init, cmd_link, cmd_status
+from tests.helpers import BaseTestCase, init_git_repo
 
 
 class TestStatusCommand(BaseTestCase):
+    def init_project(self, project_dir=None):
+        result = self.runner.invoke(cmd_init, [str(project_dir or self.project_dir)])
+        if result.exception:
+            raise result.exception
+
     def test_can_status(self):
         """
         Default use case where user invokes `et status` with minimal parameters
         """
-        self.fail('Not Implemented')
+        self.init_project()
+
+        result = self.runner.invoke(cmd_status, [])
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertIn(f'Showing git status for "{self.child_dir}"', result.output)
+
+    def test_shows_staged_changes(self):
+        self.init_project()
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.child_dir.joinpath('.env').write_text('A=2')
+        self.child_dir.joinpath('.new').write_text('B=1')
+        child_repo = Repo(str(self.child_dir))
+        child_repo.git.add('.env', '.new')
+
+        result = self.runner.invoke(cmd_status, [])
+
+        self.assertNotIn('Nothing to commit', result.output)
+        self.assertIn('.new', result.output)
+        self.assertEqual(prompt.DIRTY, prompt.get_status(self.project_dir, budget_ms=1000))
 
     def test_does_not_work_outside_of_a_linked_project(self):
         """
         The users cwd must be inside of a project
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_status, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for an unlinked project')
+        self.assertIn('Could not find an associated project', result.output)
+
+    def test_status_all_lists_dirty_projects(self):
+        """
+        `et status --all` only lists the projects with uncommitted changes
+        """
+        self.init_project()
+        clean_project_dir = self.project_dir.parent.joinpath('clean')
+        clean_project_dir.mkdir()
+        init_git_repo(clean_project_dir)
+        self.init_project(clean_project_dir)
+
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.project_dir.joinpath('.env').write_text('A=2')
+
+        os.chdir(self.test_dir)
+        result = self.runner.invoke(cmd_status, ['--all', '-j', '2'])
+        if result.exception:
+            raise result.exception
+
+        self.assertIn(self.child_dir.name, result.output)
+        self.assertNotIn('clean', result.output)
+        self.assertIn('1 of 2 projects have uncommitted changes', result.output)
+
+        result = self.runner.invoke(cmd_status, ['--all', '--json'])
+        statuses = {status['name']: status for status in json.loads(result.output)}
+        self.assertTrue(statuses[self.child_dir.name]['dirty'])
+        self.assertFalse(statuses['clean']['dirty'])
@@ -1,27 +1,90 @@
+from unittest import mock
+
+from main import cmd_init, cmd_link, cmd_unlink
 from tests.helpers import BaseTestCase
+from utils import PairedObject
 
 
 class TestUnlinkCommand(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+    def link(self, *names):
+        for name in names:
+            self.project_dir.joinpath(name).write_text(name)
+        result = self.runner.invoke(cmd_link, list(names))
+        if result.exception:
+            raise result.exception
+
     def test_can_unlink(self):
         """
         Default use case where user invokes `et unlink` with minimal parameters
         """
-        self.fail('Not Implemented')
+        self.link('.env')
+
+        result = self.runner.invoke(cmd_unlink, ['.env'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(0, result.exit_code, 'Expect no errors')
+        self.assertFalse(self.project_dir.joinpath('.env').is_symlink(), 'Parent path should not be a symlink')
+        self.assertEqual('.env', self.project_dir.joinpath('.env').read_text())
+        self.assertFalse(self.child_dir.joinpath('.env').exists(), 'Child path should be removed')
 
     def test_requires_the_file_argument(self):
         """
         A user must pass the file argument
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_unlink, [])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error without a file argument')
+        self.assertIn('At least one path is required', result.output)
 
     def test_file_must_exist(self):
         """
         A user must pass a file that exists
         """
-        self.fail('Not Implemented')
+        result = self.runner.invoke(cmd_unlink, ['does-not-exist'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error for a missing file')
+        self.assertIn('does not exist', result.output)
 
     def test_file_must_be_linked(self):
         """
         The file must be correctly linked between child dir and project dirs
         """
-        self.fail('Not Implemented')
+        self.project_dir.joinpath('.env').write_text('')
+
+        result = self.runner.invoke(cmd_unlink, ['.env'])
+
+        self.assertNotEqual(0, result.exit_code, 'Expected error when file is not linked')
+        self.assertIn('is not linked', result.output)
+
+    def test_can_unlink_many_files(self):
+        self.link('.env', '.env.test')
+
+        result = self.runner.invoke(cmd_unlink, ['.env*'])
+        if result.exception:
+            raise result.exception
+
+        self.assertFalse(self.project_dir.joinpath('.env').is_symlink())
+        self.assertFalse(self.project_dir.joinpath('.env.test').is_symlink())
+
+    def test_failed_unlink_is_rolled_back(self):
+        self.link('.env', 'b.txt')
+        unlink = PairedObject.unlink
+
+        def fail_on_second(obj_pair, progress=None):
+            if obj_pair.relative_path.name == 'b.txt':
+                raise OSError('Disk full')
+            unlink(obj_pair, progress)
+
+        with mock.patch.object(PairedObject, 'unlink', fail_on_second):
+            result = self.runner.invoke(cmd_unlink, ['.env', 'b.txt'])
+
+        self.assertNotEqual(0, result.exit_code)
+        self.assertTrue(self.project_dir.joinpath('.env').is_symlink(), '.env should be linked again')
+        self.assertEqual('.env', self.project_dir.joinpath('.env').read_text())
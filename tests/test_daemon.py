@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import daemon
+from main import cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestDaemon(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+
+    def start_daemon(self):
+        env = dict(os.environ, ET_HOME=str(self.ET_HOME))
+        subprocess.check_call([sys.executable, str(REPO_ROOT / 'main.py'), 'daemon', 'start', '--idle-timeout', '30'],
+                              cwd=str(self.project_dir), env=env, stdout=subprocess.DEVNULL)
+        self.addCleanup(daemon.request, {'command': 'stop'})
+
+    def test_falls_back_without_daemon(self):
+        self.assertIsNone(daemon.forward(['other'], str(self.project_dir)))
+
+    def test_forwards_read_only_commands(self):
+        self.start_daemon()
+
+        reply = daemon.forward(['other'], str(self.project_dir))
+        self.assertEqual(0, reply['exit_code'])
+        self.assertEqual(str(self.child_dir), reply['stdout'].strip())
+
+        self.child_dir.joinpath('.env').write_text('A=2')
+        reply = daemon.forward(['status'], str(self.project_dir))
+        self.assertIn('.env', reply['stdout'], 'Changes made after the daemon started should be seen')
+
+    def test_reports_errors(self):
+        self.start_daemon()
+
+        reply = daemon.forward(['other'], str(self.test_dir))
+
+        self.assertNotEqual(0, reply['exit_code'])
+        self.assertIn('Not in a git repository', reply['stderr'])
+
+    def test_does_not_forward_other_commands(self):
+        self.start_daemon()
+
+        self.assertIsNone(daemon.forward(['commit'], str(self.project_dir)))
+
+    def test_rejects_other_commands(self):
+        self.start_daemon()
+
+        reply = daemon.request({'command': 'run', 'argv': ['unlink', '.env'], 'cwd': str(self.project_dir),
+                                'et_home': str(self.ET_HOME)})
+        self.assertIn('error', reply)
+        self.assertTrue(self.project_dir.joinpath('.env').is_symlink(), 'The daemon must not unlink anything')
+
+    def test_status_does_not_write_the_index(self):
+        self.start_daemon()
+        index_path = self.child_dir / '.git' / 'index'
+        # Same content with new stat data, a refresh would rewrite the index
+        self.child_dir.joinpath('.env').write_text('A=1')
+        before = index_path.stat().st_mtime_ns
+
+        reply = daemon.forward(['status'], str(self.project_dir))
+        self.assertEqual(0, reply['exit_code'])
+        self.assertEqual(before, index_path.stat().st_mtime_ns)
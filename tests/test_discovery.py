@@ -0,0 +1,58 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+import discovery
+from exceptions import NotInRepository
+from tests.helpers import create_test_workspace, init_git_repo
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp(dir=str(create_test_workspace())))
+        self.repo_dir = self.test_dir / 'repo'
+        self.repo_dir.mkdir()
+        init_git_repo(self.repo_dir)
+        discovery.clear_cache()
+
+    def test_finds_working_tree_root(self):
+        nested = self.repo_dir / 'a' / 'b'
+        nested.mkdir(parents=True)
+
+        location = discovery.discover(nested / 'missing.txt')
+
+        self.assertEqual(self.repo_dir, location.working_dir)
+        self.assertEqual(self.repo_dir / '.git', location.git_dir)
+        self.assertEqual(self.repo_dir / '.git', location.common_dir)
+
+    def test_not_in_repository(self):
+        with self.assertRaises(NotInRepository):
+            discovery.discover(self.test_dir)
+
+    def test_follows_worktree_gitfile(self):
+        worktree = self.test_dir / 'worktree'
+        subprocess.check_call(['git', 'worktree', 'add', '-q', '-b', 'other', str(worktree)], cwd=str(self.repo_dir))
+
+        location = discovery.discover(worktree)
+
+        self.assertEqual(worktree, location.working_dir)
+        self.assertEqual(self.repo_dir / '.git' / 'worktrees' / 'worktree', location.git_dir)
+        self.assertEqual(self.repo_dir / '.git', location.common_dir)
+
+    def test_memoizes_visited_directories(self):
+        nested = self.repo_dir / 'a' / 'b'
+        nested.mkdir(parents=True)
+        discovery.discover(nested)
+
+        self.assertEqual(self.repo_dir, discovery._cache[str(self.repo_dir / 'a')].working_dir)
+
+    def test_discover_all(self):
+        other_dir = self.test_dir / 'other'
+        other_dir.mkdir()
+
+        locations = discovery.discover_all([self.repo_dir / 'x', other_dir, self.repo_dir])
+
+        self.assertEqual(self.repo_dir, locations[0].working_dir)
+        self.assertIsNone(locations[1])
+        self.assertIs(locations[0], locations[2])
@@ -0,0 +1,72 @@
+import os
+
+from git import Repo
+
+from index_stat import get_changed_paths, get_staged_paths, has_changes, has_staged_changes, hash_blob, \
+    read_index_entries
+from tests.helpers import BaseTestCase
+from utils import close_repos
+
+
+class TestIndexStat(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_repos)
+        self.repo = Repo(str(self.project_dir))
+        self.file = self.project_dir / 'tracked.txt'
+        self.file.write_text('original')
+        self.repo.index.add(['tracked.txt'])
+        self.repo.index.commit('Track a file')
+
+    def test_hash_blob_matches_git(self):
+        self.assertEqual(self.repo.git.hash_object(str(self.file)), hash_blob(self.file).hex())
+
+    def test_detects_modified_and_deleted_files(self):
+        self.assertEqual([], get_changed_paths(self.repo))
+
+        self.file.write_text('modified')
+        self.assertEqual(['tracked.txt'], get_changed_paths(self.repo))
+
+        os.remove(str(self.file))
+        self.assertEqual(['tracked.txt'], get_changed_paths(self.repo))
+
+    def test_refreshes_stat_data_of_unchanged_files(self):
+        """
+        GitPython writes zeroed stat data, a clean check should fill it in
+        """
+        self.assertEqual(0, self.repo.index.entries[('tracked.txt', 0)].size)
+
+        get_changed_paths(self.repo)
+
+        entry = self.repo.index.entries[('tracked.txt', 0)]
+        self.assertEqual(os.lstat(str(self.file)).st_size, entry.size)
+        self.assertEqual(os.lstat(str(self.file)).st_ino, entry.inode)
+
+    def test_detects_staged_changes(self):
+        git_dir = self.project_dir / '.git'
+        self.assertEqual([], get_staged_paths(self.repo))
+        self.assertFalse(has_staged_changes(git_dir), 'The answer should be remembered')
+
+        self.file.write_text('staged')
+        self.project_dir.joinpath('new.txt').write_text('new')
+        self.repo.git.add('tracked.txt', 'new.txt')
+        self.assertIsNone(has_staged_changes(git_dir))
+        self.assertEqual(['new.txt', 'tracked.txt'], get_staged_paths(self.repo))
+        self.assertTrue(has_staged_changes(git_dir))
+
+        self.repo.index.commit('Commit staged changes')
+        self.assertEqual([], get_staged_paths(self.repo))
+        self.repo.git.reset('--soft', 'HEAD~')
+        self.assertEqual(['new.txt', 'tracked.txt'], get_staged_paths(self.repo))
+
+    def test_has_changes(self):
+        index_path = self.project_dir / '.git' / 'index'
+        self.assertFalse(has_changes(self.project_dir, index_path))
+
+        self.file.write_text('modified')
+        self.assertTrue(has_changes(self.project_dir, index_path))
+
+    def test_reads_same_entries_as_gitpython(self):
+        entries = read_index_entries(self.project_dir / '.git' / 'index')
+
+        self.assertEqual([path for path, stage in self.repo.index.entries], [entry.path for entry in entries])
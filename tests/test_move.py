@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import move
+from tests.helpers import create_test_workspace, test_workspace
+
+
+class TestMovePath(unittest.TestCase):
+    def setUp(self):
+        create_test_workspace()
+        self.root = Path(tempfile.mkdtemp(dir=str(test_workspace)))
+        self.src_root = self.root / 'src'
+        self.dst_root = self.root / 'dst'
+        self.src_root.mkdir()
+        self.dst_root.mkdir()
+
+        # Pretend every move crosses a filesystem boundary
+        patcher = mock.patch('move._same_filesystem', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_tree(self, path: Path, file_count: int):
+        path.mkdir()
+        path.joinpath('nested').mkdir()
+        for i in range(file_count):
+            path.joinpath('nested', f'{i}.txt').write_text(f'content {i}')
+        path.joinpath('link').symlink_to('nested/0.txt')
+        os.chmod(str(path / 'nested' / '0.txt'), 0o600)
+
+    def assertTreeCopied(self, path: Path, file_count: int):
+        for i in range(file_count):
+            self.assertEqual(f'content {i}', path.joinpath('nested', f'{i}.txt').read_text())
+        self.assertEqual('nested/0.txt', os.readlink(str(path / 'link')))
+        self.assertEqual(0o600, os.stat(str(path / 'nested' / '0.txt')).st_mode & 0o777)
+
+    def test_moves_file(self):
+        src = self.src_root / '.env'
+        src.write_text('A=1')
+        progress = mock.Mock()
+
+        move.move_path(src, self.dst_root / '.env', progress)
+
+        self.assertFalse(os.path.lexists(str(src)))
+        self.assertEqual('A=1', self.dst_root.joinpath('.env').read_text())
+        progress.assert_called_with(3, 3)
+
+    def test_moves_directory_and_leaves_symlink(self):
+        src = self.src_root / 'fixtures'
+        dst = self.dst_root / 'fixtures'
+        self.make_tree(src, move.PARALLEL_COPY_THRESHOLD + 1)
+
+        move.move_path(src, dst, leave_symlink=True)
+
+        self.assertTrue(src.is_symlink())
+        self.assertTrue(src.samefile(dst))
+        self.assertTreeCopied(dst, move.PARALLEL_COPY_THRESHOLD + 1)
+        self.assertEqual([], [p.name for p in self.dst_root.iterdir() if p.name.startswith('.')],
+                         'No temporary files should be left behind')
+
+    def test_replaces_symlink_at_destination(self):
+        src = self.dst_root / 'fixtures'
+        dst = self.src_root / 'fixtures'
+        self.make_tree(src, 3)
+        dst.symlink_to(src)
+
+        move.move_path(src, dst)
+
+        self.assertFalse(dst.is_symlink())
+        self.assertTreeCopied(dst, 3)
+        self.assertFalse(os.path.lexists(str(src)))
+
+    def test_failed_copy_keeps_source(self):
+        src = self.src_root / '.env'
+        src.write_text('A=1')
+
+        with mock.patch('move._copy_data', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                move.move_path(src, self.dst_root / '.env')
+
+        self.assertEqual('A=1', src.read_text())
+        self.assertEqual([], list(self.dst_root.iterdir()))
@@ -0,0 +1,52 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from parent_status import PathChecker
+from tests.helpers import create_test_workspace, init_git_repo
+
+
+class TestPathChecker(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = Path(tempfile.mkdtemp(dir=str(create_test_workspace())))
+        self.repo = init_git_repo(self.repo_dir)
+
+    def write(self, relative_path, content=''):
+        path = self.repo_dir / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def git_ignored(self, paths):
+        result = subprocess.run(['git', 'check-ignore', '--no-index', *paths], cwd=str(self.repo_dir),
+                                stdout=subprocess.PIPE, universal_newlines=True)
+        return set(result.stdout.split())
+
+    def test_tracked(self):
+        for path in ['a-b', 'a/b', 'c']:
+            self.write(path)
+        self.repo.index.add(['a-b', 'a/b', 'c'])
+        self.repo.index.write()
+
+        checker = PathChecker(self.repo_dir)
+
+        self.assertTrue(checker.is_tracked('a'), 'A directory with tracked files is tracked')
+        self.assertTrue(checker.is_tracked('a/b'))
+        self.assertFalse(checker.is_tracked('a/c'))
+        self.assertFalse(checker.is_tracked('b'))
+
+    def test_ignored_matches_git(self):
+        self.write('.gitignore', '*.env\n!keep.env\n/build\nlogs/\ndocs/**/*.tmp\n\\#hash\n')
+        self.write('sub/.gitignore', 'local\n/anchored\n')
+        self.write('.git/info/exclude', 'secret?\n')
+        paths = ['.env', 'x.env', 'keep.env', 'sub/y.env', 'build', 'sub/build', 'logs/out', 'logs',
+                 'docs/a/b/c.tmp', 'docs/c.tmp', 'docs/c.txt', '#hash', 'sub/local', 'local',
+                 'sub/anchored', 'sub/deeper/anchored', 'secret1', 'sub/secret12']
+        for path in paths:
+            if path != 'logs':
+                self.write(path)
+
+        checker = PathChecker(self.repo_dir)
+
+        ignored = {path for path in paths if checker.is_ignored(path)}
+        self.assertEqual(self.git_ignored(paths), ignored)
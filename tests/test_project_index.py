@@ -0,0 +1,58 @@
+from config import config
+from main import cmd_init
+from project_index import ProjectIndex
+from tests.helpers import BaseTestCase
+from utils import PairedProject
+
+
+class TestProjectIndex(BaseTestCase):
+    def init_project(self, *args):
+        result = self.runner.invoke(cmd_init, list(args))
+        if result.exception:
+            raise result.exception
+
+    def test_init_adds_project_to_index(self):
+        self.init_project()
+
+        self.assertTrue(ProjectIndex.path().exists(), 'Init should write the index')
+        index = ProjectIndex.load()
+        self.assertEqual(index.get(self.project_dir), self.child_dir)
+
+    def test_index_is_not_a_project(self):
+        """
+        The config dir lives in ET_HOME but must never be treated as a child dir
+        """
+        self.init_project()
+
+        self.assertEqual(list(ProjectIndex.build().projects.values()), [self.child_dir.name])
+
+    def test_stale_index_is_rebuilt(self):
+        self.init_project()
+        saved_mtime = ProjectIndex.load().et_home_mtime_ns
+
+        # Renaming a child dir changes the ET_HOME mtime
+        renamed_child_dir = self.ET_HOME.joinpath('renamed')
+        self.child_dir.rename(renamed_child_dir)
+
+        index = ProjectIndex.load()
+        self.assertNotEqual(saved_mtime, index.et_home_mtime_ns)
+        self.assertEqual(index.get(self.project_dir), renamed_child_dir)
+        self.assertEqual(PairedProject.from_path(self.project_dir).child_dir, renamed_child_dir)
+
+    def test_retargeted_symlink_is_not_trusted(self):
+        self.init_project()
+        other_dir = self.project_dir.parent.joinpath('other')
+        other_dir.mkdir()
+
+        symlink = self.child_dir.joinpath(config.PARENT_SYMLINK_NAME)
+        symlink.unlink()
+        symlink.symlink_to(other_dir)
+
+        self.assertIsNone(ProjectIndex.load().get(self.project_dir))
+        self.assertEqual(PairedProject.from_path(self.child_dir).parent_dir, other_dir)
+
+    def test_missing_et_home_is_not_created(self):
+        self.ET_HOME.rmdir()
+
+        self.assertEqual(ProjectIndex.load().projects, {})
+        self.assertFalse(self.ET_HOME.exists())
@@ -0,0 +1,45 @@
+import os
+import time
+from unittest import mock
+
+import prompt
+from main import cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+
+class TestPrompt(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        self.snapshot_path = self.child_dir / '.git' / prompt.SNAPSHOT_NAME
+
+    def test_clean(self):
+        self.assertEqual(prompt.CLEAN, prompt.get_status(self.project_dir, budget_ms=1000))
+        self.assertEqual(prompt.CLEAN, prompt.get_status(self.child_dir, budget_ms=1000))
+
+    def test_untracked_dir(self):
+        self.assertIsNone(prompt.get_status(self.ET_HOME.parent, budget_ms=1000))
+
+    def test_dirty_after_snapshot(self):
+        # Backdate the file so the first check can save a snapshot
+        env_path = self.child_dir / '.env'
+        os.utime(str(env_path), ns=(int(time.time() * 10 ** 9) - 10 ** 9,) * 2)
+        self.assertEqual(prompt.CLEAN, prompt.get_status(self.project_dir, budget_ms=1000))
+        self.assertTrue(self.snapshot_path.exists())
+
+        env_path.write_text('A=22')
+        self.assertEqual(prompt.DIRTY, prompt.get_status(self.project_dir, budget_ms=1000))
+
+    def test_unknown_when_out_of_time(self):
+        self.assertEqual(prompt.UNKNOWN, prompt.get_status(self.project_dir, budget_ms=0))
+
+    def test_unknown_when_hashing_would_overrun(self):
+        # Same size, only hashing can tell
+        (self.child_dir / '.env').write_text('A=2')
+        with mock.patch.object(prompt, 'HASH_BYTES_PER_MS', 0):
+            self.assertEqual(prompt.UNKNOWN, prompt.get_status(self.project_dir, budget_ms=1000))
+        self.assertEqual(prompt.DIRTY, prompt.get_status(self.project_dir, budget_ms=1000))
@@ -0,0 +1,68 @@
+import time
+
+from git import Repo
+
+from main import cmd_compact, cmd_init
+from retention import DAY, RetentionPolicy, compact
+from tests.helpers import BaseTestCase
+from utils import close_repos
+
+
+class TestRetention(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_repos)
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.repo = Repo(str(self.child_dir))
+        self.now = time.time()
+
+    def commit_at(self, days_ago: float, content: str):
+        self.child_dir.joinpath('.env').write_text(content)
+        index = self.repo.index
+        index.add(['.env'])
+        date = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.now - days_ago * DAY))
+        index.commit(f'Set {content}', author_date=date, commit_date=date)
+
+    def messages(self):
+        return [commit.message.splitlines()[0] for commit in self.repo.iter_commits()]
+
+    def test_policy(self):
+        # Two commits on the same day, two years ago, an old day and recent commits
+        self.commit_at(800.5, 'a')
+        self.commit_at(800.4, 'b')
+        self.commit_at(30.5, 'c')
+        self.commit_at(30.4, 'd')
+        self.commit_at(1, 'e')
+        self.commit_at(0.9, 'f')
+        tip_tree = self.repo.head.commit.tree
+
+        result = compact(self.repo, RetentionPolicy(keep_all_days=7, daily_days=365), now=self.now)
+
+        self.assertEqual((7, 5), result)
+        self.assertEqual(['Set f', 'Set e', 'Set d', 'Set b', 'Link project to parent directory'],
+                         self.messages())
+        self.assertEqual(tip_tree, self.repo.head.commit.tree, 'The current files must not change')
+        self.assertEqual(b'd', self.repo.head.commit.parents[0].parents[0].tree['.env'].data_stream.read())
+
+    def test_nothing_to_compact(self):
+        self.commit_at(1, 'a')
+        head = self.repo.head.commit
+
+        self.assertEqual((2, 2), compact(self.repo, RetentionPolicy(), now=self.now))
+        self.assertEqual(head, self.repo.head.commit)
+
+    def test_compact_command(self):
+        self.commit_at(40.5, 'a')
+        self.commit_at(40.4, 'b')
+
+        result = self.runner.invoke(cmd_compact, ['--dry-run'])
+        self.assertIn('would keep 2 of 3 commits', result.output)
+        self.assertEqual(3, len(self.messages()))
+
+        result = self.runner.invoke(cmd_compact, [])
+        if result.exception:
+            raise result.exception
+        self.assertIn('kept 2 of 3 commits', result.output)
+        self.assertEqual(2, len(list(Repo(str(self.child_dir)).iter_commits())))
@@ -0,0 +1,65 @@
+from git import Repo
+
+import shared_objects
+from main import cmd_init, cmd_link
+from tests.helpers import BaseTestCase, init_git_repo
+from utils import close_repos
+
+
+class TestSharedObjects(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_repos)
+
+    def init_project(self, project_dir, *args):
+        result = self.runner.invoke(cmd_init, [str(project_dir), *args])
+        if result.exception:
+            raise result.exception
+
+    def make_project(self, name):
+        project_dir = self.project_dir.parent / name
+        project_dir.mkdir()
+        init_git_repo(project_dir)
+        return project_dir
+
+    def test_shared_init_attaches_store(self):
+        self.init_project(self.project_dir, '--shared')
+
+        self.assertTrue(shared_objects.is_shared(self.child_dir))
+
+    def test_identical_blobs_are_stored_once(self):
+        fork_dir = self.make_project('fork')
+        self.init_project(self.project_dir, '--shared')
+        self.init_project(fork_dir, '--shared')
+        for project_dir in (self.project_dir, fork_dir):
+            project_dir.joinpath('.env').write_text('SAME=1')
+            result = self.runner.invoke(cmd_link, [str(project_dir / '.env')])
+            if result.exception:
+                raise result.exception
+
+        self.assertEqual(0, shared_objects.share_objects(self.child_dir))
+        self.assertGreater(shared_objects.share_objects(self.ET_HOME / 'fork'), 0,
+                           'The shared .env blob should have been deduplicated')
+
+        for child_dir in (self.child_dir, self.ET_HOME / 'fork'):
+            repo = Repo(str(child_dir))
+            self.assertEqual(b'SAME=1', repo.head.commit.tree['.env'].data_stream.read())
+            self.assertEqual('', repo.git.fsck('--connectivity-only', '--no-dangling'))
+
+    def test_init_from_template(self):
+        self.init_project(self.project_dir)
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+        template_head = Repo(str(self.child_dir)).head.commit
+
+        worktree_dir = self.make_project('worktree')
+        self.init_project(worktree_dir, '-t', self.child_dir.name)
+
+        new_child_dir = self.ET_HOME / 'worktree'
+        repo = Repo(str(new_child_dir))
+        self.assertEqual(template_head, repo.head.commit.parents[0], 'History should start from the template')
+        self.assertEqual('A=1', new_child_dir.joinpath('.env').read_text())
+        self.assertTrue(new_child_dir.joinpath('.source').samefile(worktree_dir))
+        self.assertEqual([], list((new_child_dir / '.git' / 'objects' / 'pack').iterdir()),
+                         'No history should be copied')
+        self.assertTrue(Repo(str(self.child_dir)).head.commit.tree['.env'], 'The template should still work')
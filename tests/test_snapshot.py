@@ -0,0 +1,88 @@
+import os
+import stat
+import time
+
+from config import config
+from snapshot import SnapshotBackend, find_snapshot_child
+from tests.helpers import BaseTestCase
+
+
+class TestSnapshotBackend(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.child_dir.mkdir()
+        self.backend = SnapshotBackend.init(self.child_dir)
+
+    def write(self, name: str, content: str):
+        path = self.child_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        # Older than the index, so the stat data alone can tell the file is unchanged
+        os.utime(str(path), ns=(int(time.time() * 10 ** 9) - 10 ** 9,) * 2)
+
+    def test_commit_and_status(self):
+        self.write('.env', 'A=1')
+        self.backend.add(['.env'])
+        self.assertTrue(self.backend.commit('Track .env'))
+        self.assertEqual([], self.backend.status())
+        self.assertFalse(self.backend.commit('Nothing changed'))
+
+        # Same size and mtime, only the content hash tells them apart
+        self.write('.env', 'A=2')
+        self.assertEqual(['.env'], SnapshotBackend(self.child_dir).status())
+        self.assertTrue(self.backend.commit('Update .env'))
+        self.assertEqual([], SnapshotBackend(self.child_dir).status())
+
+        self.assertEqual(['Update .env', 'Track .env'], [revision.message for revision in self.backend.history()])
+
+    def test_identical_content_is_stored_once(self):
+        self.write('a', 'same')
+        self.write('config/b', 'same')
+        self.backend.add(['a', 'config'])
+        self.backend.commit('Track both')
+
+        self.assertEqual(['a', 'config/b'], list(self.backend.tracked_paths()))
+        blobs = [path for path in (self.child_dir / config.SNAPSHOT_DIR_NAME / 'objects').glob('*/*')]
+        self.assertEqual(1, len(blobs))
+
+    def test_remove_and_restore(self):
+        self.write('config/a', 'A')
+        self.write('config/b', 'B')
+        self.backend.add(['config'])
+        self.backend.commit('Track config')
+
+        (self.child_dir / 'config' / 'a').unlink()
+        self.assertEqual(['config/a'], self.backend.status())
+        self.backend.restore('config')
+        self.assertEqual('A', (self.child_dir / 'config' / 'a').read_text())
+        self.assertEqual([], self.backend.status())
+
+        self.backend.remove(['config'])
+        self.backend.commit('Stop tracking config')
+        self.assertEqual([], list(self.backend.tracked_paths()))
+        self.assertEqual(2, len((self.child_dir / config.SNAPSHOT_DIR_NAME / 'log').read_text().splitlines()))
+
+    def test_restore_follows_the_umask(self):
+        self.write('config/a', 'A')
+        self.backend.add(['config'])
+        self.backend.commit('Track config')
+        (self.child_dir / 'config' / 'a').unlink()
+
+        old_umask = os.umask(0o027)
+        try:
+            SnapshotBackend(self.child_dir).restore('config')
+        finally:
+            os.umask(old_umask)
+        self.assertEqual(0o640, stat.S_IMODE((self.child_dir / 'config' / 'a').stat().st_mode))
+
+    def test_status_gives_up_at_deadline(self):
+        self.write('.env', 'A=1')
+        self.backend.add(['.env'])
+        with self.assertRaises(TimeoutError):
+            self.backend.status(deadline=0)
+
+    def test_find_snapshot_child(self):
+        (self.child_dir / 'config').mkdir()
+        self.assertEqual(self.child_dir, find_snapshot_child(self.child_dir / 'config'))
+        self.assertIsNone(find_snapshot_child(self.project_dir))
+        self.assertIsNone(find_snapshot_child(self.ET_HOME))
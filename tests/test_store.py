@@ -0,0 +1,118 @@
+import io
+import os
+import shlex
+import shutil
+import sys
+from pathlib import Path
+from unittest import mock
+
+from git import Repo
+
+import store
+from config import config
+from main import cmd_commit, cmd_init, cmd_link, cmd_status, cmd_unlink
+from tests.helpers import BaseTestCase
+from utils import PairedProject, close_repos
+
+
+class TestLargeFileStore(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_repos)
+        self.addCleanup(setattr, config, 'LARGE_FILE_THRESHOLD', config.LARGE_FILE_THRESHOLD)
+        self.addCleanup(setattr, store, 'CHUNK_SIZE', store.CHUNK_SIZE)
+        config.LARGE_FILE_THRESHOLD = 1024
+        store.CHUNK_SIZE = 512
+
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+
+        self.content = os.urandom(2000)
+        self.project_dir.joinpath('dev.sqlite3').write_bytes(self.content)
+        self.project_dir.joinpath('.env').write_text('A=1')
+        result = self.runner.invoke(cmd_link, ['dev.sqlite3', '.env'])
+        if result.exception:
+            raise result.exception
+        self.child_repo = Repo(str(self.child_dir))
+
+    def committed(self, path) -> bytes:
+        return self.child_repo.head.commit.tree[path].data_stream.read()
+
+    def test_large_files_are_committed_as_pointers(self):
+        pointer = self.committed('dev.sqlite3')
+
+        self.assertEqual(4, len(store.parse_pointer(pointer)), 'Expected 2000 bytes in 512 byte chunks')
+        self.assertEqual(b'A=1', self.committed('.env'), 'Small files are committed as they are')
+
+        restored = io.BytesIO()
+        store.restore_stream(pointer, restored)
+        self.assertEqual(self.content, restored.getvalue())
+
+    def test_stored_files_are_not_dirty(self):
+        self.assertFalse(PairedProject.from_path(self.project_dir).is_dirty)
+        # git itself goes through the filter and agrees
+        self.assertEqual('', self.child_repo.git.status('--porcelain'))
+
+    def test_changes_are_stored_and_deduplicated(self):
+        chunk_count = len(list(store.store_dir().glob('*/*')))
+        # Only the last chunk changes
+        self.project_dir.joinpath('dev.sqlite3').write_bytes(self.content[:-10] + b'0123456789')
+
+        result = self.runner.invoke(cmd_commit, [])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual(chunk_count + 1, len(list(store.store_dir().glob('*/*'))))
+        restored = io.BytesIO()
+        store.restore_stream(self.committed('dev.sqlite3'), restored)
+        self.assertEqual(self.content[:-10] + b'0123456789', restored.getvalue())
+
+    def test_checkout_restores_content(self):
+        os.remove(str(self.child_dir / 'dev.sqlite3'))
+
+        self.child_repo.git.checkout('HEAD', '--', 'dev.sqlite3')
+
+        self.assertEqual(self.content, self.project_dir.joinpath('dev.sqlite3').read_bytes())
+
+    def test_filter_config_is_stable(self):
+        command = self.child_repo.config_reader().get_value('filter "et-store"', 'clean')
+        store_path = Path(store.__file__).resolve()
+        self.assertEqual(f'{shlex.quote(sys.executable)} {shlex.quote(str(store_path))} --chunk-size 512 clean', command)
+
+    def test_filter_does_not_need_et_on_the_path(self):
+        # Git runs the filter from cron or GUI clients too, which may not have `et` on the PATH
+        with mock.patch.dict(os.environ, {'PATH': os.path.dirname(shutil.which('git'))}):
+            os.remove(str(self.child_dir / 'dev.sqlite3'))
+            self.child_repo.git.checkout('HEAD', '--', 'dev.sqlite3')
+
+        self.assertEqual(self.content, self.project_dir.joinpath('dev.sqlite3').read_bytes())
+
+    def test_status_reports_a_failing_filter(self):
+        with self.child_repo.config_writer() as writer:
+            writer.set_value('filter "et-store"', 'clean', 'false')
+        self.project_dir.joinpath('dev.sqlite3').write_bytes(self.content[:-1] + b'x')
+
+        result = self.runner.invoke(cmd_status, [])
+
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('git status failed', result.output)
+        self.assertIn("clean filter 'et-store' failed", result.output)
+
+    def test_unlink_removes_attributes(self):
+        attributes_path = self.child_dir / '.git' / 'info' / 'attributes'
+        self.assertIn('/dev.sqlite3 filter=et-store', attributes_path.read_text())
+
+        result = self.runner.invoke(cmd_unlink, ['dev.sqlite3'])
+        if result.exception:
+            raise result.exception
+
+        self.assertEqual('', attributes_path.read_text())
+
+    def test_sweep_deletes_unreferenced_chunks(self):
+        referenced = set(store.store_dir().glob('*/*'))
+        store.store_stream(io.BytesIO(os.urandom(1000)))
+        self.assertEqual(0, store.sweep([self.child_dir]), 'New chunks are kept for the grace period')
+
+        self.assertEqual(2, store.sweep([self.child_dir], grace=0))
+        self.assertEqual(referenced, set(store.store_dir().glob('*/*')))
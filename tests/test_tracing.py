@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import tracing
+from main import cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestTracing(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.trace_path = Path(self.test_dir).joinpath('trace.json')
+
+    def run_et(self, *args, **env):
+        env = dict(os.environ, ET_HOME=str(self.ET_HOME), PYTHONPATH=str(REPO_ROOT), **env)
+        subprocess.check_call([sys.executable, str(REPO_ROOT / 'main.py'), *args], cwd=str(self.project_dir),
+                              env=env, stdout=subprocess.DEVNULL)
+        with self.trace_path.open() as f:
+            return json.load(f)
+
+    def test_span_is_noop_when_disabled(self):
+        self.assertFalse(tracing.is_enabled())
+        with tracing.span('discover') as s:
+            pass
+        self.assertIs(tracing._NULL_SPAN, s)
+
+    def test_link_phases_are_traced(self):
+        trace = self.run_et('--trace', str(self.trace_path), 'link', '.env')
+
+        names = {event['name'] for event in trace['traceEvents']}
+        self.assertTrue({'discover', 'project_index.load', 'move', 'stage', 'index.write', 'commit'} <= names)
+        self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in trace['traceEvents']))
+        self.assertEqual(1, trace['otherData']['move']['count'])
+
+    def test_git_subprocesses_are_counted(self):
+        self.runner.invoke(cmd_link, ['.env'])
+        self.child_dir.joinpath('.env').write_text('A=2')
+
+        trace = self.run_et('status', ET_TRACE=str(self.trace_path))
+
+        git_calls = [event for event in trace['traceEvents'] if event['name'] == 'git']
+        self.assertTrue(any('status' in event['args']['argv'] for event in git_calls))
+        self.assertEqual(len(git_calls), trace['otherData']['git']['count'])
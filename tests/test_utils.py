@@ -0,0 +1,28 @@
+from main import cmd_init
+from tests.helpers import BaseTestCase
+from utils import PairedProject, close_repos, open_repo
+
+
+class TestRepoCache(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.addCleanup(close_repos)
+
+    def test_repo_handles_are_reused(self):
+        project = PairedProject.from_path(self.project_dir)
+
+        self.assertIs(project.child_repo, project.child_repo)
+        self.assertIs(project.parent_repo, open_repo(self.project_dir))
+        # Keyed by resolved path, so different spellings share a handle
+        self.assertIs(project.child_repo, open_repo(self.child_dir / 'subdir' / '..'))
+
+    def test_close_releases_handles(self):
+        project = PairedProject.from_path(self.project_dir)
+        child_repo = project.child_repo
+
+        project.close()
+
+        self.assertIsNot(child_repo, project.child_repo)
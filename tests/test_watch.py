@@ -0,0 +1,49 @@
+import time
+
+from git import Repo
+
+from main import cmd_init, cmd_link
+from tests.helpers import BaseTestCase
+from utils import PairedProject
+from watch import Watcher
+
+
+class TestWatcher(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        result = self.runner.invoke(cmd_init, [])
+        if result.exception:
+            raise result.exception
+        self.project_dir.joinpath('.env').write_text('A=1')
+        self.runner.invoke(cmd_link, ['.env'])
+
+        self.child_repo = Repo(str(self.child_dir))
+        self.watcher = Watcher([PairedProject.from_path(self.project_dir)], debounce=0.2)
+        self.addCleanup(self.watcher.close)
+
+    def poll_for(self, seconds):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.watcher.poll(timeout=0.05)
+
+    def test_burst_is_committed_once(self):
+        head = self.child_repo.head.commit
+
+        for value in range(5):
+            self.child_dir.joinpath('.env').write_text(f'A={value}')
+            self.watcher.poll(timeout=0.01)
+        self.assertEqual(head, self.child_repo.head.commit, 'Nothing should be committed during the burst')
+
+        self.poll_for(0.5)
+
+        commits = list(self.child_repo.iter_commits(f'{head.hexsha}..HEAD'))
+        self.assertEqual(1, len(commits), 'Expected exactly one commit for the burst')
+        self.assertEqual(b'A=4', commits[0].tree['.env'].data_stream.read())
+
+    def test_untracked_files_do_not_commit(self):
+        head = self.child_repo.head.commit
+
+        self.child_dir.joinpath('.env.swp').write_text('editor state')
+        self.poll_for(0.5)
+
+        self.assertEqual(head, self.child_repo.head.commit)
@@ -0,0 +1,142 @@
+"""
+Opt-in instrumentation: `et --trace PATH ...` or `ET_TRACE=PATH`.
+
+Records a span for each phase of a command (project discovery, the ET_HOME scan,
+moves, staging, index writes, commits) and for every subprocess, mostly git.
+The spans are written as a Chrome trace (load it in chrome://tracing or Perfetto),
+with per-span counts and totals under "otherData".
+
+When tracing is off, span() returns a shared no-op context manager.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+_events: Optional[List[dict]] = None
+_output: Optional[str] = None
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+def span(name: str, **args):
+    """
+    Context manager timing a phase, e.g. `with span('move', path=...):`
+    """
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def is_enabled() -> bool:
+    return _events is not None
+
+
+def record(name: str, start: float, end: float, args: Optional[dict] = None):
+    if _events is None:
+        return
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': round((start - _origin) * 1e6, 1),
+        'dur': round((end - start) * 1e6, 1),
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'args': {key: str(value) for key, value in (args or {}).items()},
+    }
+    with _lock:
+        _events.append(event)
+
+
+def enable(output: str):
+    """
+    Starts recording and writes the trace to output when the process exits
+    """
+    global _events, _output
+    if _events is not None:
+        return
+    _events = []
+    _output = output
+    _trace_subprocesses()
+    atexit.register(dump)
+
+
+def _trace_subprocesses():
+    """
+    Times every subprocess from its creation until it is waited for.
+    Patches the Popen class itself, because GitPython imports the name directly.
+    """
+    import subprocess
+
+    original_init = subprocess.Popen.__init__
+    original_wait = subprocess.Popen.wait
+
+    def traced_init(self, args, *rest, **kwargs):
+        self._et_trace_start = time.perf_counter()
+        self._et_trace_args = args
+        original_init(self, args, *rest, **kwargs)
+
+    def traced_wait(self, *rest, **kwargs):
+        result = original_wait(self, *rest, **kwargs)
+        start = self.__dict__.pop('_et_trace_start', None)
+        if start is not None:
+            args = self._et_trace_args
+            argv = [args] if isinstance(args, (str, bytes)) else [str(arg) for arg in args]
+            name = 'git' if os.path.basename(str(argv[0])) == 'git' else 'subprocess'
+            record(name, start, time.perf_counter(), {'argv': ' '.join(argv[:6])})
+        return result
+
+    subprocess.Popen.__init__ = traced_init
+    subprocess.Popen.wait = traced_wait
+
+
+def summary() -> Dict[str, dict]:
+    """
+    :return: count and total milliseconds per span name
+    """
+    totals = {}
+    for event in _events or []:
+        total = totals.setdefault(event['name'], {'count': 0, 'total_ms': 0.0})
+        total['count'] += 1
+        total['total_ms'] = round(total['total_ms'] + event['dur'] / 1000, 3)
+    return totals
+
+
+def dump():
+    global _output
+    if _events is None or _output is None:
+        return
+    output, _output = _output, None
+    with _lock:
+        events = list(_events)
+    with open(output, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': summary()}, f, indent=1)
@@ -1,10 +1,23 @@
+import os
+import stat
+import threading
 from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, TYPE_CHECKING
 
 import click
-from git import Repo, InvalidGitRepositoryError, Git
 
 from config import config
-from exceptions import UnknownProject
+from discovery import discover, discover_all
+from exceptions import NotInRepository, UnknownProject
+from move import Progress, move_path
+from project_index import ProjectIndex, iter_child_dirs
+from snapshot import find_snapshot_child
+from storage import Backend, get_backend
+from tracing import span
+
+if TYPE_CHECKING:
+    # GitPython is slow to import, only load it for commands that actually use git
+    from git import IndexFile, Repo
 
 
 class PairedProject(object):
@@ -20,6 +33,7 @@ class PairedProject(object):
         self.parent_dir = parent_dir
         self.child_dir = child_dir
         self.working_from_parent = working_from_parent
+        self._backend: Optional[Backend] = None
 
     @classmethod
     def from_path(cls, input_path: Path) -> 'PairedProject':
@@ -28,13 +42,47 @@ class PairedProject(object):
         An error will be raised if the input_path is not in a valid
          project directory
         """
-        try:
-            repo = Repo(input_path, search_parent_directories=True)
-        except InvalidGitRepositoryError:
-            raise
+        # Snapshot child dirs aren't git working trees
+        child_dir = find_snapshot_child(input_path)
+        if child_dir is not None:
+            return cls.from_child_dir(child_dir)
 
-        working_repo = Path(repo.working_dir)
+        with span('discover', path=input_path):
+            working_repo = find_working_dir(input_path)
+        return cls.from_working_dir(working_repo)
+
+    @classmethod
+    def from_paths(cls, input_paths: Iterable[Path]) -> List['PairedProject']:
+        """
+        Resolves the projects of many paths at once, paths of the same project share an instance.
+
+        :raises NotInRepository: if a path is not in a git working tree
+        """
+        input_paths = list(input_paths)
+        with span('discover', paths=len(input_paths)):
+            locations = discover_all(input_paths)
+
+        projects = {}
+        result = []
+        for input_path, location in zip(input_paths, locations):
+            snapshot_child = find_snapshot_child(input_path)
+            if snapshot_child is not None:
+                if snapshot_child not in projects:
+                    projects[snapshot_child] = cls.from_child_dir(snapshot_child)
+                result.append(projects[snapshot_child])
+                continue
+            if location is None:
+                raise NotInRepository(f'Not a git repository: "{input_path}"')
+            if location.working_dir not in projects:
+                projects[location.working_dir] = cls.from_working_dir(location.working_dir)
+            result.append(projects[location.working_dir])
+        return result
 
+    @classmethod
+    def from_working_dir(cls, working_repo: Path) -> 'PairedProject':
+        """
+        Build a PairedProject from the root of either the parent or the child working tree
+        """
         if config.ET_HOME in working_repo.parents:
             # We are in a child directory
             parent_dir = (working_repo / config.PARENT_SYMLINK_NAME).resolve()
@@ -44,13 +92,66 @@ class PairedProject(object):
             child_dir = find_child_dir(working_repo)
             return cls(parent_dir=working_repo, child_dir=child_dir, working_from_parent=True)
 
+    @classmethod
+    def from_child_dir(cls, child_dir: Path) -> 'PairedProject':
+        """
+        Build a PairedProject for a child dir in ET_HOME, e.g. one yielded by iter_child_dirs
+        """
+        parent_dir = (child_dir / config.PARENT_SYMLINK_NAME).resolve()
+        return cls(parent_dir=parent_dir, child_dir=child_dir, working_from_parent=False)
+
+    @property
+    def parent_repo(self) -> 'Repo':
+        return open_repo(self.parent_dir)
+
     @property
-    def parent_repo(self):
-        return Repo(str(self.parent_dir))
+    def child_repo(self) -> 'Repo':
+        return open_repo(self.child_dir)
+
+    @property
+    def backend(self) -> Backend:
+        """
+        The storage backend of the child dir, git unless the project was initialized with another one
+        """
+        if self._backend is None:
+            self._backend = get_backend(self.child_dir)
+        return self._backend
+
+    def changed_paths(self, refresh: bool = True) -> List[str]:
+        """
+        :param refresh: let the backend save the stat data of files found unchanged
+        :return: tracked paths in the child dir with uncommitted changes,
+         checked in-process using the stat data the backend recorded
+        """
+        return self.backend.status(refresh=refresh)
 
     @property
-    def child_repo(self):
-        return Repo(str(self.child_dir))
+    def is_dirty(self) -> bool:
+        return bool(self.changed_paths())
+
+    def commit_changes(self, message: str) -> bool:
+        """
+        Commits every change to tracked files in the child dir, like `git add -u && git commit`
+
+        :return: False if there was nothing to commit
+        """
+        return self.backend.commit(message)
+
+    def iter_tracked_paths(self) -> Iterator[str]:
+        """
+        Yields the paths tracked in the child dir, read straight from the backend's index
+        instead of walking the parent dir looking for symlinks
+        """
+        for path in self.backend.tracked_paths():
+            if path != config.PARENT_SYMLINK_NAME:
+                yield path
+
+    def close(self):
+        """
+        Release the cached repo handles of both directories
+        """
+        close_repo(self.parent_dir)
+        close_repo(self.child_dir)
 
 
 class PairedObject(object):
@@ -99,26 +200,143 @@ class PairedObject(object):
             - parent path exists
             - parent path is a symlink to the child
         """
-        return self.parent_path.is_symlink() \
-               and (not self.child_path.is_symlink()) \
-               and self.child_path.samefile(self.parent_path)
-
-    def link(self):
+        try:
+            return self.parent_path.is_symlink() \
+                   and (not self.child_path.is_symlink()) \
+                   and self.child_path.samefile(self.parent_path)
+        except FileNotFoundError:
+            # Either the child path or the symlink target is missing
+            return False
+
+    def link(self, progress: Optional[Progress] = None):
         """
         1. Moves the file/directory from the parent dir into
         the same relative location in the child dir.
         2. Symlink the file/directory back to its original location
+
+        :param progress: called with (bytes copied, total bytes) when the move has to copy across filesystems
         """
-        self.parent_path.replace(self.child_path)
-        self.parent_path.symlink_to(self.child_path)
+        self.child_path.parent.mkdir(parents=True, exist_ok=True)
+        with span('move', path=self.relative_path):
+            move_path(self.parent_path, self.child_path, progress, leave_symlink=True)
 
-    def unlink(self):
+    def unlink(self, progress: Optional[Progress] = None):
         """
         Completely reverts changes made by PairedPath.link.
         """
-        # No special case needed for file vs dir types, since this is always a symlink
-        self.parent_path.unlink()
-        self.child_path.replace(self.parent_path)
+        # The symlink at the parent path is replaced once the child path has been moved
+        with span('move', path=self.relative_path):
+            move_path(self.child_path, self.parent_path, progress)
+
+
+def stage_paths(index: 'IndexFile', relative_paths: Iterable[str]):
+    """
+    Adds files and directories to a child index without writing it.
+    Files above the large file threshold are put in the chunk store and staged as pointers.
+    """
+    with span('stage'):
+        _stage_paths(index, relative_paths)
+
+
+def _stage_paths(index: 'IndexFile', relative_paths: Iterable[str]):
+    from io import BytesIO
+
+    from git import BaseIndexEntry, Blob
+    from gitdb import IStream
+
+    import store
+    from index_stat import index_mode, refresh_entries
+
+    working_dir = Path(index.repo.working_dir)
+    small = []
+    large = []
+    for relative_path in relative_paths:
+        for path in iter_files(working_dir / relative_path):
+            st = os.lstat(str(path))
+            relative_file = str(path.relative_to(working_dir))
+            if stat.S_ISREG(st.st_mode) and store.is_large(st.st_size):
+                large.append((relative_file, st))
+            else:
+                small.append(relative_file)
+
+    if small:
+        index.add(small, write=False)
+
+    if large:
+        store.configure_repo(working_dir)
+        store.mark_large(working_dir, [relative_file for relative_file, st in large])
+        entries = []
+        for relative_file, st in large:
+            pointer = store.store_file(working_dir / relative_file)
+            istream = index.repo.odb.store(IStream(Blob.type, len(pointer), BytesIO(pointer)))
+            entries.append(BaseIndexEntry((index_mode(st), istream.binsha, 0, relative_file)))
+        index.add(entries, write=False)
+
+    refresh_entries(index, small + [relative_file for relative_file, st in large])
+
+
+def write_and_commit(index: 'IndexFile', message: str):
+    """
+    Writes a staged child index and commits it
+    """
+    from index_stat import save_staged_state
+
+    with span('index.write', repo=index.repo.working_dir):
+        index.write()
+    with span('commit', repo=index.repo.working_dir):
+        index.commit(message)
+    save_staged_state(Path(index.repo.git_dir), False)
+
+
+def iter_files(path: Path) -> Iterator[Path]:
+    """
+    Yields path itself, or every file and symlink below it if it is a directory
+    """
+    if not path.is_dir() or path.is_symlink():
+        yield path
+        return
+
+    for root, dirs, files in os.walk(str(path)):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            yield Path(root) / name
+
+
+_repo_cache: Dict[str, 'Repo'] = {}
+_repo_cache_lock = threading.Lock()
+
+
+def open_repo(path: Path) -> 'Repo':
+    """
+    Returns a Repo for path, reusing the handle (and its persistent
+    git cat-file helpers) for the rest of the process.
+    Handles are keyed by resolved path and released with close_repo/close_repos.
+    """
+    key = os.path.realpath(str(path))
+    with _repo_cache_lock:
+        repo = _repo_cache.get(key)
+        if repo is None:
+            from git import Repo
+            repo = _repo_cache[key] = Repo(key)
+        return repo
+
+
+def close_repo(path: Path):
+    with _repo_cache_lock:
+        repo = _repo_cache.pop(os.path.realpath(str(path)), None)
+    if repo is not None:
+        repo.close()
+
+
+def close_repos():
+    """
+    Closes every cached repo handle, terminating their git helper processes
+    """
+    with _repo_cache_lock:
+        repos = list(_repo_cache.values())
+        _repo_cache.clear()
+    for repo in repos:
+        repo.close()
 
 
 def get_relative_path(project: PairedProject, input_path: Path) -> Path:
@@ -145,25 +363,94 @@ def get_relative_path(project: PairedProject, input_path: Path) -> Path:
                      f'or "{project.child_dir}"')
 
 
+def find_working_dir(input_path: Path) -> Path:
+    """
+    Finds the root of the git working tree containing input_path
+    by walking up the filesystem, without loading GitPython.
+
+    :raises NotInRepository: if no parent directory contains a .git entry
+    """
+    return discover(input_path).working_dir
+
+
 def find_child_dir(parent_dir: Path) -> Path:
     """
-    Browse the ET_HOME directory to find the directory
-     that symlinks to the parent dir
+    Find the directory in ET_HOME that symlinks to the parent dir.
+
+    Uses the project index when possible, and falls back to browsing
+    the ET_HOME directory in case the index missed a retargeted symlink.
     """
-    for child_dir in config.ET_HOME.iterdir():
-        parent_path = (child_dir / config.PARENT_SYMLINK_NAME).resolve()
-        if parent_dir == parent_path:
-            return child_dir
+    with span('project_index.load'):
+        child_dir = ProjectIndex.load().get(parent_dir)
+    if child_dir is not None:
+        return child_dir
+
+    with span('et_home.scan'):
+        for child_dir in iter_child_dirs():
+            parent_path = (child_dir / config.PARENT_SYMLINK_NAME).resolve()
+            if parent_dir == parent_path:
+                return child_dir
 
     # User needs to run `et init` on the parent directory.
     raise UnknownProject('Could not find an associated project '
                        'for the current directory')
 
 
+def get_changes(child_dir: Path) -> List[str]:
+    """
+    :return: `git status --porcelain` lines for a child dir, empty if it is clean
+    """
+    from git import Git
+    # Without refreshing the index, so nothing is written while checking
+    output = Git(str(child_dir)).execute(['git', '--no-optional-locks', 'status', '--porcelain'])
+    return [line for line in output.splitlines() if line]
+
+
+def get_all_statuses(jobs: int, refresh: bool = True) -> List[dict]:
+    """
+    Checks every project in ET_HOME for uncommitted changes using a bounded thread pool.
+    Clean projects are detected from their index stat data, and only dirty
+    git projects spawn a `git status` subprocess for the details.
+
+    :param jobs: maximum number of projects checked at the same time
+    :param refresh: save the stat data of files found unchanged in the child indexes
+    :return: one dict per project, sorted by name
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def check(child_dir: Path) -> dict:
+        status = {
+            'name': child_dir.name,
+            'child_dir': str(child_dir),
+            'parent_dir': os.path.realpath(str(child_dir / config.PARENT_SYMLINK_NAME)),
+        }
+        try:
+            backend = get_backend(child_dir)
+            # Only clean projects are common, so only dirty ones pay for `git status`
+            with span('status.stat', project=child_dir.name):
+                changed = backend.status(refresh=refresh)
+            if backend.name != 'git':
+                status['changes'] = [f' {"M" if os.path.lexists(str(child_dir / path)) else "D"} {path}'
+                                     for path in changed]
+            else:
+                status['changes'] = get_changes(child_dir) if changed else []
+        except Exception as e:
+            status['changes'] = []
+            status['error'] = str(e).strip()
+        finally:
+            close_repo(child_dir)
+        status['dirty'] = bool(status['changes'])
+        return status
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        statuses = list(executor.map(check, iter_child_dirs()))
+    return sorted(statuses, key=lambda status: status['name'])
+
+
 def get_current_project():
     try:
         return PairedProject.from_path(Path('.'))
-    except InvalidGitRepositoryError:
+    except NotInRepository:
         raise click.BadParameter('Not in a git repository')
     except UnknownProject as e:
         raise click.BadParameter(e)
@@ -178,13 +465,53 @@ class PathType(click.Path):
         return Path(super().convert(value, param, ctx))
 
 
-# TODO: I forget what I was going to use this for... should this be a method on PairedObject?
-def file_is_git_tracked(repo: Repo, file: Path) -> bool:
+def expand_paths(patterns: Iterable[str], path_type: click.Path) -> List[Path]:
+    """
+    Expands glob patterns and validates every resulting path with path_type.
+
+    :param patterns: paths or glob patterns, e.g. "config/*.local.*" or "**/.env"
+    :param path_type: click parameter type each path must satisfy
+    :raises click.BadParameter: if a pattern matches nothing or a path fails validation
+    :return: unique paths in the order they were given
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        # The same check as the private glob.has_magic
+        if any(c in pattern for c in '*?['):
+            import glob
+
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                raise click.BadParameter(f'No paths match "{pattern}"', param_hint=['files'])
+        else:
+            matches = [pattern]
+
+        for match in matches:
+            path = Path(path_type.convert(match, None, None))
+            key = path.absolute()
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+    return paths
+
+
+def read_path_list(file: IO) -> Iterator[str]:
+    """
+    Reads one path per line, skipping blank lines and # comments
+    """
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def file_is_git_tracked(repo: 'Repo', file: Path) -> bool:
     """
     :param repo: any git Repo instance
     :param file: path must be relative to the repo
-    :return: Whether git is tracking the file in question
+    :return: Whether git is tracking the file, or files under the directory, in question.
+     Use parent_status.PathChecker directly to check many paths with a single index read.
     """
-    # TODO: is there a more canonical way of doing this?
-    # Git knows about this file
-    return bool(Git(repo.working_dir).ls_files(file))
+    from parent_status import PathChecker
+    return PathChecker(Path(repo.working_dir)).is_tracked(Path(file).as_posix())
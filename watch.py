@@ -0,0 +1,178 @@
+"""
+Watches child dirs with Linux inotify and commits each burst of changes once.
+
+A single inotify file descriptor covers every watched project. Pending work is
+one deadline per project, so memory stays bounded no matter how many events
+editors generate (temp files, rename-over, repeated writes).
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from config import config
+from logger import logger
+from utils import PairedProject
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE \
+             | IN_DELETE_SELF | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+# Written to by every commit
+IGNORED_DIRS = {'.git', config.SNAPSHOT_DIR_NAME}
+
+
+class Inotify(object):
+    """
+    Thin ctypes wrapper around the inotify syscalls
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+
+    def read_events(self) -> Iterable[tuple]:
+        """
+        :return: (wd, mask, name) for every queued event
+        """
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher(object):
+    """
+    Commits changes to the tracked files of many projects,
+    once per burst of filesystem events.
+    """
+
+    def __init__(self, projects: List[PairedProject], debounce: float):
+        """
+        :param projects: projects whose child dirs are watched
+        :param debounce: seconds without events before a burst is committed
+        """
+        self.debounce = debounce
+        self.inotify = Inotify()
+        # watch descriptor -> (project, watched directory)
+        self._watches: Dict[int, tuple] = {}
+        # child dir -> time at which the burst is committed
+        self._deadlines: Dict[Path, float] = {}
+        self._projects = {project.child_dir: project for project in projects}
+
+        for project in projects:
+            self._watch_tree(project, project.child_dir)
+
+    def _watch_tree(self, project: PairedProject, directory: Path):
+        for root, dirs, files in os.walk(str(directory)):
+            # Commits would retrigger the watcher
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            try:
+                wd = self.inotify.add_watch(Path(root), WATCH_MASK)
+            except OSError as e:
+                logger.warning(f'Could not watch "{root}": {e}')
+                continue
+            self._watches[wd] = (project, Path(root))
+
+    def poll(self, timeout: float):
+        """
+        Waits up to timeout seconds for events, then commits every burst whose debounce window has passed
+        """
+        now = time.monotonic()
+        if self._deadlines:
+            timeout = max(0.0, min(timeout, min(self._deadlines.values()) - now))
+
+        readable, _, _ = select.select([self.inotify.fd], [], [], timeout)
+        if readable:
+            self._handle_events(self.inotify.read_events())
+
+        now = time.monotonic()
+        for child_dir, deadline in list(self._deadlines.items()):
+            if deadline <= now:
+                del self._deadlines[child_dir]
+                self._commit(self._projects[child_dir])
+
+    def _handle_events(self, events: Iterable[tuple]):
+        now = time.monotonic()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, check every project
+                for child_dir in self._projects:
+                    self._deadlines[child_dir] = now + self.debounce
+                continue
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            watch = self._watches.get(wd)
+            if watch is None:
+                continue
+            project, directory = watch
+
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and name not in IGNORED_DIRS:
+                self._watch_tree(project, directory / name)
+
+            # Every new event pushes the commit back, so a burst ends up as one commit
+            self._deadlines[project.child_dir] = now + self.debounce
+
+    def _commit(self, project: PairedProject):
+        try:
+            if project.commit_changes('Auto-commit changes to tracked files'):
+                logger.info(f'Committed changes in "{project.child_dir}"')
+        except Exception as e:
+            logger.error(f'Could not commit changes in "{project.child_dir}": {e}')
+        finally:
+            # Hundreds of projects may be watched, don't hold on to their repo handles
+            project.close()
+
+    def run(self):
+        while True:
+            self.poll(timeout=60.0)
+
+    def close(self):
+        self.inotify.close()